@@ -0,0 +1,259 @@
+import hmac
+import io
+import json
+from datetime import datetime, date
+import dateutil.parser
+from flask import Blueprint, Response, abort, jsonify, request, stream_with_context
+from models import app, db, Venue, Artist, Show, ShowFeed
+from queries import VENUE_KEY, ARTIST_KEY, SHOW_KEY
+from search import search
+from http_cache import conditional, venue_version, artist_version
+from importer import import_rows, MODELS
+from exporter import export_stream, FORMATS
+from deletion import KINDS, delete
+
+#----------------------------------------------------------------------------#
+# JSON API.
+#----------------------------------------------------------------------------#
+
+# Mirrors the HTML views under /api/v1. Every query selects plain columns, so
+# no ORM objects are built, and collections are streamed from a server-side
+# cursor as a JSON array (default) or NDJSON (?format=ndjson).
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+VENUE_FIELDS = [Venue.id, Venue.name, Venue.genres, Venue.address, Venue.city,
+                Venue.state, Venue.phone, Venue.website, Venue.facebook_link,
+                Venue.seeking_talent, Venue.seeking_description, Venue.image_link]
+ARTIST_FIELDS = [Artist.id, Artist.name, Artist.genres, Artist.city, Artist.state,
+                 Artist.phone, Artist.website, Artist.facebook_link,
+                 Artist.seeking_venue, Artist.seeking_description, Artist.image_link]
+
+
+def encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(repr(value))
+
+
+def dumps(row):
+    return json.dumps(row, default=encode_value)
+
+
+def stream(query):
+    # rows are fetched and written in chunks, so memory stays flat no matter
+    # how many rows the query returns
+    chunk_size = app.config.get('API_STREAM_CHUNK_SIZE', 1000)
+    rows = query.execution_options(stream_results=True).yield_per(chunk_size)
+    ndjson = request.args.get('format') == 'ndjson'
+
+    def generate():
+        chunk = []
+        first = True
+        if not ndjson:
+            yield '['
+        for row in rows:
+            line = dumps(row._asdict())
+            if ndjson:
+                chunk.append(line + '\n')
+            else:
+                chunk.append(line if first else ',' + line)
+            first = False
+            if len(chunk) >= chunk_size:
+                yield ''.join(chunk)
+                chunk = []
+        if chunk:
+            yield ''.join(chunk)
+        if not ndjson:
+            yield ']'
+
+    return Response(stream_with_context(generate()),
+                    mimetype='application/x-ndjson' if ndjson else 'application/json')
+
+
+def detail_shows(foreign_key, entity_id, counterpart, counterpart_key, prefix, now=None):
+    now = now or datetime.now()
+    rows = db.session.query(
+        counterpart.id.label(prefix + '_id'),
+        counterpart.name.label(prefix + '_name'),
+        counterpart.image_link.label(prefix + '_image_link'),
+        Show.start_time
+    ).join(counterpart, counterpart_key == counterpart.id).filter(
+        foreign_key == entity_id, counterpart.deleted_at.is_(None)).order_by(Show.start_time).all()
+    past_shows = [row._asdict() for row in rows if row.start_time <= now]
+    upcoming_shows = [row._asdict() for row in rows if row.start_time > now]
+    return {
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": len(past_shows),
+        "upcoming_shows_count": len(upcoming_shows)
+    }
+
+
+def json_response(data):
+    return Response(dumps(data), mimetype='application/json')
+
+#  Venues
+#  ----------------------------------------------------------------
+
+
+@api.route('/venues')
+def venues():
+    query = db.session.query(
+        Venue.id, Venue.name, Venue.city, Venue.state,
+        Venue.upcoming_shows_count.label('num_upcoming_shows')
+    ).filter(Venue.deleted_at.is_(None)).order_by(*VENUE_KEY)
+    return stream(query)
+
+
+@api.route('/venues/<int:venue_id>')
+@conditional(venue_version)
+def venue(venue_id):
+    row = db.session.query(*VENUE_FIELDS).filter(
+        Venue.id == venue_id, Venue.deleted_at.is_(None)).first()
+    if row is None:
+        abort(404)
+    data = row._asdict()
+    data.update(detail_shows(Show.venue_id, venue_id,
+                             Artist, Show.artist_id, 'artist'))
+    return json_response(data)
+
+#  Artists
+#  ----------------------------------------------------------------
+
+
+@api.route('/artists')
+def artists():
+    query = db.session.query(
+        Artist.id, Artist.name, Artist.city, Artist.state).filter(
+            Artist.deleted_at.is_(None)).order_by(*ARTIST_KEY)
+    return stream(query)
+
+
+@api.route('/artists/<int:artist_id>')
+@conditional(artist_version)
+def artist(artist_id):
+    row = db.session.query(*ARTIST_FIELDS).filter(
+        Artist.id == artist_id, Artist.deleted_at.is_(None)).first()
+    if row is None:
+        abort(404)
+    data = row._asdict()
+    data.update(detail_shows(Show.artist_id, artist_id,
+                             Venue, Show.venue_id, 'venue'))
+    return json_response(data)
+
+#  Shows
+#  ----------------------------------------------------------------
+
+
+@api.route('/shows')
+def shows():
+    # upcoming shows, from the feed table like /shows
+    query = db.session.query(
+        ShowFeed.show_id.label('id'),
+        ShowFeed.start_time,
+        ShowFeed.venue_id,
+        ShowFeed.venue_name,
+        ShowFeed.artist_id,
+        ShowFeed.artist_name,
+        ShowFeed.artist_image_link
+    ).filter(ShowFeed.start_time > datetime.now()).order_by(*SHOW_KEY)
+    return stream(query)
+
+#  Search
+#  ----------------------------------------------------------------
+
+
+@api.route('/search/<any(venues, artists):kind>')
+def search_entities(kind):
+    results = search(Venue if kind == 'venues' else Artist,
+                     request.args.get('q', ''),
+                     page=request.args.get('page', 1, type=int))
+    results["data"] = [{"id": row.id, "name": row.name}
+                       for row in results["data"]]
+    return jsonify(results)
+
+
+#  Import
+#  ----------------------------------------------------------------
+
+
+def require_admin():
+    # only for ADMIN_TOKEN holders, and not there at all without one
+    token = app.config.get('ADMIN_TOKEN')
+    if not token:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token):
+        abort(403)
+
+
+@api.route('/import/<kind>', methods=['POST'])
+def import_entities(kind):
+    # the request body is a CSV or NDJSON file, read as it arrives
+    require_admin()
+    if kind not in MODELS:
+        abort(404)
+    format = request.args.get('format', 'csv')
+    if format not in ('csv', 'ndjson'):
+        abort(400)
+    max_errors = app.config.get('IMPORT_MAX_REPORTED_ERRORS', 1000)
+    errors = []
+
+    def on_error(line_number, row_errors):
+        if len(errors) < max_errors:
+            errors.append({"line": line_number, "errors": row_errors})
+
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+    summary = import_rows(kind, stream, format,
+                          request.args.get('chunk_size', type=int), on_error=on_error)
+    summary["errors"] = errors
+    return jsonify(summary)
+
+
+#  Export
+#  ----------------------------------------------------------------
+
+
+@api.route('/export/<kind>')
+def export_entities(kind):
+    # a gzip compressed dump, compressed and sent as the rows are read;
+    # ?since= limits it to rows changed after that UTC timestamp
+    require_admin()
+    format = request.args.get('format', 'ndjson')
+    if kind not in MODELS:
+        abort(404)
+    if format not in FORMATS:
+        abort(400)
+    since = request.args.get('since')
+    try:
+        since = dateutil.parser.parse(since) if since else None
+    except ValueError:
+        abort(400)
+    extension = 'columnar.ndjson' if format == 'columnar' else format
+    return Response(stream_with_context(export_stream(kind, format, since)),
+                    mimetype='application/gzip',
+                    headers={'Content-Disposition': 'attachment; filename={}.{}.gz'.format(kind, extension)})
+
+
+#  Bulk delete
+#  ----------------------------------------------------------------
+
+
+@api.route('/<any(venues, artists):kind>/bulk-delete', methods=['POST'])
+def bulk_delete(kind):
+    # {"ids": [...], "soft": false}; soft defaults to SOFT_DELETE
+    require_admin()
+    body = request.get_json(silent=True) or {}
+    ids = body.get('ids')
+    if not isinstance(ids, list) or not all(
+            isinstance(row_id, int) and not isinstance(row_id, bool) for row_id in ids):
+        abort(400)
+    soft = body.get('soft')
+    deleted = delete(KINDS[kind], ids, soft)
+    return jsonify({"requested": len(set(ids)), "deleted": deleted,
+                    "soft": app.config.get('SOFT_DELETE', False) if soft is None else bool(soft)})
+
+
+@api.errorhandler(404)
+def not_found_error(error):
+    return jsonify({"error": "not found"}), 404
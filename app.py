@@ -4,46 +4,67 @@
 
 import json
 import dateutil.parser
-import babel
 from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
-import logging
-from logging import Formatter, FileHandler
 from flask_wtf import Form
+from werkzeug.exceptions import NotFound
+from sqlalchemy.exc import IntegrityError
 from forms import *
 from flask_migrate import Migrate
 import sys
 from models import *
+from queries import *
+from instrumentation import init_instrumentation
+from logs import init_logging
+from profiling import init_profiling
+from rendering import init_rendering
+from assets import init_assets
+from images import init_images, warm_later
+from pool import init_health
+from search import search
+from scheduling import ShowConflict, find_conflict, is_exclusion_violation
+# register the show counter and feed events, their jobs and flask commands
+import counters
+import feed
+import jobs
+import deletion
+from pagination import InvalidCursor
+from http_cache import conditional, venues_version, venue_version, artists_version, artist_version, shows_version
+from api import api
+from cache import cached_venue_areas, cached_artist_list, cached_show_list, invalidate_later, invalidate_venue, invalidate_artist, invalidate_venue_shows
 
 
 #----------------------------------------------------------------------------#
-# Filters.
+# Extensions.
 #----------------------------------------------------------------------------#
 
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
+# JSON log lines, written to stderr or LOG_FILE from a background thread
+init_logging(app)
 
+# memoised date formatting, cached show tiles and templates compiled up front
+init_rendering(app)
 
-app.jinja_env.filters['datetime'] = format_datetime
+# fingerprinted, precompressed static files once "flask assets build" has run
+init_assets(app)
 
-#----------------------------------------------------------------------------#
+# venue and artist images through a local thumbnail cache
+init_images(app)
 
+# per-request query counts and timings, exposed as Server-Timing and /_metrics
+init_instrumentation(app)
 
-def convert_date(date_time_value):
+# database and connection pool status for load balancers
+init_health(app, db)
 
-    stringified_date = date_time_value = (
-        date_time_value).strftime("%m/%d/%Y, %H:%M:%S")
+# on-demand and sampled cProfile traces, shown as flamegraphs under /_profiles
+init_profiling(app)
 
-    return stringified_date
-#----------------------------------------------------------------------------#
+# JSON mirror of the pages under /api/v1
+app.register_blueprint(api)
 
+#----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
@@ -57,38 +78,20 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@conditional(venues_version)
 def venues():
     # (Done): replace with real venues data.
     #       num_shows should be aggregated based on number of upcoming shows per venue.
-    data = []
-    venues_by_area = Venue.query.group_by(
-        Venue.id, Venue.city, Venue.state).all()
-
-    areas = set()
-    for venue_area in venues_by_area:
-        areas.add((venue_area.city, venue_area.state))
-
-    venues = Venue.query.all()
-    # for each area (state, city), append all venues which share those same two values
-    for area in areas:
-        # list to store venues related to the current itration of area (city, state)
-        current_venues = []
-        for venue in venues:
-            if(venue.state == area[1] and venue.city == area[0]):
-                upcoming_shows_count = len(venue.query.filter(
-                    Show.start_time > datetime.now()).all())
-                current_venues.append({
-                    "id": venue.id,
-                    "name": venue.name,
-                    "num_upcoming_shows": upcoming_shows_count
-                })
-        data.append({
-            "city": area[0],
-            "state": area[1],
-            "venues": current_venues
-        })
-
-    return render_template('pages/venues.html', areas=data)
+    # areas and their upcoming show counts are grouped in a single query, one
+    # page of venues at a time
+    try:
+        data, next_cursor, prev_cursor = cached_venue_areas(
+            after=request.args.get('after'), before=request.args.get('before'))
+    except InvalidCursor:
+        abort(400)
+
+    return render_template('pages/venues.html', areas=data,
+                           next_cursor=next_cursor, prev_cursor=prev_cursor)
 
 
 @app.route('/venues/search', methods=['POST'])
@@ -99,16 +102,15 @@ def search_venues():
 
     try:
         search_term = request.form.get('search_term', '')
-        search_query = Venue.name.ilike("%{}%".format(search_term))
-        search_results = Venue.query.filter(search_query).all()
-        if len(search_results) == 0:
+        # ranked by the trigram index, one page at a time
+        response = search(Venue, search_term,
+                          page=request.values.get('page', 1, type=int))
+        if response["count"] == 0:
             abort(404)
-        response = {
-            "count": len(search_results),
-            "data": search_results
-        }
     except:
-        print('an error occured')
+        # abort(404) above lands here too, when nothing matched
+        if not isinstance(sys.exc_info()[1], NotFound):
+            app.logger.exception('search failed')
         flash('Your search did not yeild any results', 'danger')
         abort(404)
 
@@ -116,54 +118,17 @@ def search_venues():
 
 
 @app.route('/venues/<int:venue_id>')
+@conditional(venue_version)
 def show_venue(venue_id):
     # shows the venue page with the given venue_id
     # (Done): replace with real venue data from the venues table, using venue_id
 
-    venueData = Venue.query.get(venue_id)
+    # the venue, its shows and their artists are loaded together
+    venueData = venue_detail(venue_id)
 
     if not venueData:
         abort(404)
 
-    pastShows = []
-    upcomingShows = []
-
-    # shows = venueData.shows
-    upcoming_shows = db.session.query(Show).join(Venue, Show.venue_id == venue_id).join(
-        Artist).filter(Show.start_time > datetime.now()).all()
-    for show in upcoming_shows:
-        showDetails = {
-            "artist_id": show.artist_id,
-            "artist_name": show.Artist.name,
-            "artist_image_link": show.Artist.image_link,
-            # Convert show's start time to string to ve able to render it in the html file
-            "start_time": convert_date(show.start_time)
-
-        }
-        upcomingShows.append(showDetails)
-
-    # shows=Show.query.filter_by(venue_id=venue_id).all
-    past_shows = db.session.query(Show).join(Venue, Show.venue_id == venue_id).join(
-        Artist).filter(Show.start_time <= datetime.now()).all()
-    for show in past_shows:
-        showDetails = {
-            "artist_id": show.artist_id,
-            "artist_name": show.Artist.name,
-            "artist_image_link": show.Artist.image_link,
-            # Convert show's start time to string to ve able to render it in the html file
-            "start_time": convert_date(show.start_time)
-
-        }
-        if show.start_time > datetime.now():
-            upcomingShows.append(showDetails)
-        else:
-            pastShows.append(showDetails)
-
-    venueData.upcoming_shows = upcomingShows
-    venueData.past_shows = pastShows
-    venueData.past_shows_count = len(pastShows)
-    venueData.upcoming_shows_count = len(upcomingShows)
-
     return render_template('pages/show_venue.html', venue=venueData)
 
 #  Create Venue
@@ -197,9 +162,11 @@ def create_venue_submission():
         newVenue = Venue(name=venue_name, city=city, state=state, address=address, phone=phone_number, genres=genres, facebook_link=facebook_link, website=website,
                          image_link=image_link, seeking_talent=eval(seeking_talent), seeking_description=seeking_description)
 
-        print(request.form['name'], file=sys.stderr)
         db.session.add(newVenue)
         db.session.commit()
+        # drop the cached listing pages of the venue's area
+        invalidate_later(invalidate_venue, newVenue.id, city, state)
+        warm_later(image_link)
         # on successful db insert, flash success
         flash('Venue ' + request.form['name'] +
               ' was successfully listed!')
@@ -207,8 +174,7 @@ def create_venue_submission():
     except:
         error = True
         db.session.rollback()
-        print('an error occured')
-        print(sys.exc_info(), file=sys.stderr)
+        app.logger.exception('venue could not be created')
 
     finally:
         db.session.close()
@@ -217,7 +183,6 @@ def create_venue_submission():
         # (Done): on unsuccessful db insert, flash an error instead.
         flash('An error occurred. Artist ' +
               request.form['name'] + ' could not be listed.')
-        print(sys.exc_info())
 
     return render_template('pages/home.html')
 
@@ -228,16 +193,14 @@ def delete_venue(venue_id):
     # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
     error = False
     try:
-        venue = Venue.query.get(venue_id)
-        # delete all shows which this venue is associated with
-        for show in venue.shows:
-            db.session.delete(show)
-        db.session.delete(venue)
-        db.session.commit()
+        # its shows go with it (ON DELETE CASCADE), or it is hidden until the
+        # purge with SOFT_DELETE
+        if not deletion.delete(Venue, [venue_id]):
+            raise LookupError('no venue {}'.format(venue_id))
     except:
         db.session.rollback()
         error = True
-        print(sys.exc_info(), file=sys.stderr)
+        app.logger.exception('venue %s could not be deleted', venue_id)
     finally:
         db.session.close()
        # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
@@ -250,12 +213,18 @@ def delete_venue(venue_id):
 
 
 @app.route('/artists')
+@conditional(artists_version)
 def artists():
     # (Done): replace with real data returned from querying the database
 
-    data = Artist.query.all()
+    try:
+        data, next_cursor, prev_cursor = cached_artist_list(
+            after=request.args.get('after'), before=request.args.get('before'))
+    except InvalidCursor:
+        abort(400)
 
-    return render_template('pages/artists.html', artists=data)
+    return render_template('pages/artists.html', artists=data,
+                           next_cursor=next_cursor, prev_cursor=prev_cursor)
 
 
 @app.route('/artists/search', methods=['POST'])
@@ -266,16 +235,15 @@ def search_artists():
 
     try:
         search_term = request.form.get('search_term', '')
-        search_query = Artist.name.ilike("%{}%".format(search_term))
-        search_results = Artist.query.filter(search_query).all()
-        if len(search_results) == 0:
+        # ranked by the trigram index, one page at a time
+        response = search(Artist, search_term,
+                          page=request.values.get('page', 1, type=int))
+        if response["count"] == 0:
             abort(404)
-        response = {
-            "count": len(search_results),
-            "data": search_results
-        }
     except:
-        print('an error occured')
+        # abort(404) above lands here too, when nothing matched
+        if not isinstance(sys.exc_info()[1], NotFound):
+            app.logger.exception('search failed')
         flash('Your search did not yeild any results', 'danger')
         abort(404)
 
@@ -283,37 +251,16 @@ def search_artists():
 
 
 @app.route('/artists/<int:artist_id>')
+@conditional(artist_version)
 def show_artist(artist_id):
     # shows the venue page with the given artist_id
     # (Done): replace with real venue data from the venues table, using venue_id
-    artistData = Artist.query.get(artist_id)
+    # the artist, its shows and their venues are loaded together
+    artistData = artist_detail(artist_id)
 
     if not artistData:
         abort(404)
 
-    pastShows = []
-    upcomingShows = []
-
-    shows = artistData.shows
-    for show in shows:
-        showDetails = {
-            "venue_id": show.venue_id,
-            "venue_name": show.Venue.name,
-            "venue_image_link": show.Venue.image_link,
-            # Convert show's start time to string to ve able to render it in the html file
-            "start_time": convert_date(show.start_time)
-
-        }
-        if show.start_time > datetime.now():
-            upcomingShows.append(showDetails)
-        else:
-            pastShows.append(showDetails)
-
-    artistData.upcoming_shows = upcomingShows
-    artistData.past_shows = pastShows
-    artistData.past_shows_count = len(pastShows)
-    artistData.upcoming_shows_count = len(upcomingShows)
-
     return render_template('pages/show_artist.html', artist=artistData)
 
 #  Update
@@ -343,6 +290,7 @@ def edit_artist_submission(artist_id):
     # (Done): insert form data as a new Artist record in the db, instead
     try:
         artist = Artist.query.get(artist_id)
+        renamed = artist.name != request.form['name']
         artist.name = request.form['name']
         artist.city = request.form['city']
         artist.state = request.form['state']
@@ -354,6 +302,8 @@ def edit_artist_submission(artist_id):
         artist.seeking_description = request.form['seeking_description']
         artist.facebook_link = request.form['facebook_link']
         db.session.commit()
+        invalidate_later(invalidate_artist, artist_id, renamed)
+        warm_later(artist.image_link)
         # on successful db insert, flash success
         flash('Artist ' + request.form['name'] + ' was successfully updated!')
         # (Done): modify data to be the data object returned from db insertion
@@ -361,13 +311,13 @@ def edit_artist_submission(artist_id):
     except:
         error = True
         db.session.rollback()
+        app.logger.exception('artist %s could not be updated', artist_id)
 
     finally:
         db.session.close()
 
     if error:
         flash('Unable to update infomation for ' + request.form['name'])
-        print(sys.exc_info())
 
     return redirect(url_for('show_artist', artist_id=artist_id))
 
@@ -390,6 +340,7 @@ def edit_venue_submission(venue_id):
     error = False
     try:
         venue = Venue.query.get(venue_id)
+        old_city, old_state = venue.city, venue.state
         venue.name = request.form['name']
         venue.city = request.form['city']
         venue.state = request.form['state']
@@ -403,6 +354,9 @@ def edit_venue_submission(venue_id):
         venue.facebook_link = request.form['facebook_link']
 
         db.session.commit()
+        invalidate_later(invalidate_venue, venue_id, venue.city, venue.state,
+                         old_city, old_state)
+        warm_later(venue.image_link)
         # on successful db insert, flash success
         flash('Venue ' + request.form['name'] + ' was successfully updated!')
         # (Done): modify data to be the data object returned from db insertion
@@ -410,13 +364,13 @@ def edit_venue_submission(venue_id):
     except:
         error = True
         db.session.rollback()
+        app.logger.exception('venue %s could not be updated', venue_id)
 
     finally:
         db.session.close()
 
     if error:
         flash('Unable to update infomation for ' + request.form['name'])
-        print(sys.exc_info())
 
     # venue record with ID <venue_id> using the new attributes
     return redirect(url_for('show_venue', venue_id=venue_id))
@@ -451,9 +405,10 @@ def create_artist_submission():
         newArtist = Artist(name=artist_name, city=city, state=state, phone=phone_number, genres=genres, facebook_link=facebook_link, website=website,
                            image_link=image_link, seeking_venue=eval(seeking_venue), seeking_description=seeking_description)
 
-        print(request.form['name'], file=sys.stderr)
         db.session.add(newArtist)
         db.session.commit()
+        invalidate_later(invalidate_artist)
+        warm_later(image_link)
         # on successful db insert, flash success
         flash('Artist ' + request.form['name'] + ' was successfully listed!')
         # (Done): modify data to be the data object returned from db insertion
@@ -461,8 +416,7 @@ def create_artist_submission():
     except:
         error = True
         db.session.rollback()
-        print('an error occured')
-        print(sys.exc_info(), file=sys.stderr)
+        app.logger.exception('artist could not be created')
 
     finally:
         db.session.close()
@@ -471,33 +425,43 @@ def create_artist_submission():
         # (Done): on unsuccessful db insert, flash an error instead.
         flash('An error occurred. Artist ' +
               request.form['name'] + ' could not be listed.')
-        print(sys.exc_info())
 
     return render_template('pages/home.html')
 
 
+@app.route('/artists/<artist_id>', methods=['DELETE'])
+def delete_artist(artist_id):
+    error = False
+    try:
+        if not deletion.delete(Artist, [artist_id]):
+            raise LookupError('no artist {}'.format(artist_id))
+    except:
+        db.session.rollback()
+        error = True
+        app.logger.exception('artist %s could not be deleted', artist_id)
+    finally:
+        db.session.close()
+    return render_template('pages/home.html')
+
+
 #  Shows
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@conditional(shows_version)
 def shows():
     # displays list of shows at /shows
     # (Done): replace with real shows data.
     #       num_shows should be aggregated based on number of upcoming shows per venue.
-    shows = Show.query.all()
-    allShows = []
-    for show in shows:
-        showData = {
-            "venue_id": show.venue_id,
-            "venue_name": show.Venue.name,
-            "artist_id": show.artist_id,
-            "artist_name": show.Artist.name,
-            "artist_image_link": show.Artist.image_link,
-            "start_time": convert_date(show.start_time)
-        }
-        allShows.append(showData)
-
-    return render_template('pages/shows.html', shows=allShows)
+    # one page of upcoming shows, read from the feed table without joins
+    try:
+        allShows, next_cursor, prev_cursor = cached_show_list(
+            after=request.args.get('after'), before=request.args.get('before'))
+    except InvalidCursor:
+        abort(400)
+
+    return render_template('pages/shows.html', shows=allShows,
+                           next_cursor=next_cursor, prev_cursor=prev_cursor)
 
 
 @app.route('/shows/create')
@@ -516,21 +480,45 @@ def create_show_submission():
     try:
         venue_id = request.form['venue_id']
         artist_id = request.form['artist_id']
-        start_time = request.form['start_time']
+        # parsed here so the counter events can compare it
+        start_time = dateutil.parser.parse(request.form['start_time'])
+        if request.form.get('end_time'):
+            end_time = dateutil.parser.parse(request.form['end_time'])
+        else:
+            end_time = show_end(start_time)
+        if end_time <= start_time:
+            raise ValueError('show {} ends before it starts'.format(start_time))
+        # an index seek per venue and artist, however many shows they have
+        conflict = find_conflict(venue_id, artist_id, start_time, end_time)
+        if conflict is not None:
+            raise conflict
 
         newShow = Show(venue_id=venue_id, artist_id=artist_id,
-                       start_time=start_time)
+                       start_time=start_time, end_time=end_time)
 
         db.session.add(newShow)
         db.session.commit()
+        invalidate_later(invalidate_venue_shows, venue_id)
         # on successful db insert, flash success
         flash('Show was successfully listed!')
 
+    except ShowConflict as conflict:
+        db.session.rollback()
+        flash('Show could not be listed. {}.'.format(conflict))
+
+    except IntegrityError as e:
+        db.session.rollback()
+        # a concurrent booking got there first (PostgreSQL exclusion constraints)
+        if is_exclusion_violation(e):
+            flash('Show could not be listed. The venue or the artist is already booked then.')
+        else:
+            error = True
+            app.logger.exception('show could not be created')
+
     except:
         error = True
         db.session.rollback()
-        print('an error occured')
-        print(sys.exc_info(), file=sys.stderr)
+        app.logger.exception('show could not be created')
 
     finally:
         db.session.close()
@@ -538,7 +526,6 @@ def create_show_submission():
     if error:
         # (Done): on unsuccessful db insert, flash an error instead.
         flash('An error occurred. Show could not be listed.')
-        print(sys.exc_info())
 
     return render_template('pages/home.html')
 
@@ -553,17 +540,6 @@ def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
-
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
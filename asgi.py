@@ -0,0 +1,324 @@
+import asyncio
+import re
+from datetime import datetime
+from functools import partial
+from http.cookies import SimpleCookie
+from asgiref.wsgi import WsgiToAsgi
+from flask import g, render_template
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine.url import make_url
+from werkzeug.http import http_date, parse_date, parse_etags, quote_etag
+from app import app
+from models import db, Venue, Artist, Show
+from api import dumps, VENUE_FIELDS, ARTIST_FIELDS
+from http_cache import artist_version, cache_control, is_fresh, venue_version, version_etag
+from replicas import choose_replica
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+try:
+    import aiosqlite
+except ImportError:
+    aiosqlite = None
+
+#----------------------------------------------------------------------------#
+# Async database access.
+#----------------------------------------------------------------------------#
+
+# SQLAlchemy 1.3 has no asyncio support, so statements are built with the Core
+# as usual, compiled for the target dialect and run on asyncpg (PostgreSQL) or
+# aiosqlite (SQLite) connections. Results go through the column types' result
+# processors so rows look the same as they do in the WSGI app.
+
+
+def compile_statement(statement, dialect):
+    compiled = statement.compile(dialect=dialect)
+    params = [compiled.params[name] for name in compiled.positiontup]
+    return str(compiled), params
+
+
+def process_rows(statement, dialect, rows):
+    processors = [(column.key, column.type.dialect_impl(dialect).result_processor(dialect, None))
+                  for column in statement.c]
+    return [dict((key, process(row[i]) if process else row[i])
+                 for i, (key, process) in enumerate(processors))
+            for row in rows]
+
+
+class PostgresPool(object):
+    # numeric placeholders (:1) are rewritten to asyncpg's ($1)
+    dialect = postgresql.dialect(paramstyle='numeric')
+
+    def __init__(self, url, config):
+        url = make_url(url)
+        url.drivername = 'postgresql'
+        self.dsn = str(url)
+        self.size = config.get('DB_POOL_SIZE', 5) + config.get('DB_MAX_OVERFLOW', 10)
+        self.pgbouncer = config.get('DB_PGBOUNCER')
+        self.settings = {}
+        if config.get('DB_STATEMENT_TIMEOUT') and not self.pgbouncer:
+            self.settings['statement_timeout'] = str(config['DB_STATEMENT_TIMEOUT'])
+        self.pool = None
+
+    async def open(self):
+        if asyncpg is None:
+            raise RuntimeError('the async server needs asyncpg for PostgreSQL')
+        self.pool = await asyncpg.create_pool(
+            self.dsn, min_size=1, max_size=self.size, server_settings=self.settings,
+            # PgBouncer in transaction pooling mode breaks prepared statements
+            statement_cache_size=0 if self.pgbouncer else 100)
+
+    async def fetch(self, statement):
+        sql, params = compile_statement(statement, self.dialect)
+        sql = re.sub(r':(\d+)', r'$\1', sql)
+        async with self.pool.acquire() as connection:
+            rows = await connection.fetch(sql, *params)
+        return process_rows(statement, self.dialect, rows)
+
+    async def close(self):
+        await self.pool.close()
+
+
+class SQLitePool(object):
+    dialect = sqlite.dialect()
+
+    def __init__(self, url, config):
+        self.path = make_url(url).database or ':memory:'
+        self.size = config.get('DB_POOL_SIZE', 5)
+        self.connections = None
+
+    async def open(self):
+        if aiosqlite is None:
+            raise RuntimeError('the async server needs aiosqlite for SQLite')
+        self.connections = asyncio.Queue()
+        for _ in range(self.size):
+            self.connections.put_nowait(await aiosqlite.connect(self.path))
+
+    async def fetch(self, statement):
+        sql, params = compile_statement(statement, self.dialect)
+        connection = await self.connections.get()
+        try:
+            async with connection.execute(sql, params) as cursor:
+                rows = await cursor.fetchall()
+        finally:
+            self.connections.put_nowait(connection)
+        return process_rows(statement, self.dialect, rows)
+
+    async def close(self):
+        while not self.connections.empty():
+            await self.connections.get_nowait().close()
+
+#----------------------------------------------------------------------------#
+# Detail pages.
+#----------------------------------------------------------------------------#
+
+# The entity and its past and upcoming shows are independent queries, so each
+# runs on its own connection at the same time. Templates are rendered in a
+# thread so that they do not hold up the event loop.
+
+
+async def in_thread(function, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, partial(function, *args))
+
+
+def shows_statement(foreign_key, entity_id, counterpart, counterpart_key, prefix, upcoming, now):
+    return select([
+        counterpart.id.label(prefix + '_id'),
+        counterpart.name.label(prefix + '_name'),
+        counterpart.image_link.label(prefix + '_image_link'),
+        Show.start_time
+    ]).select_from(
+        Show.__table__.join(counterpart.__table__, counterpart_key == counterpart.id)
+    ).where(foreign_key == entity_id).where(counterpart.deleted_at.is_(None)).where(
+        Show.start_time > now if upcoming else Show.start_time <= now
+    ).order_by(Show.start_time)
+
+
+async def load_detail(pool, fields, model, entity_id, foreign_key, counterpart, counterpart_key, prefix):
+    now = datetime.now()
+    entity, past_shows, upcoming_shows = await asyncio.gather(
+        pool.fetch(select(fields).where(model.id == entity_id).where(
+            model.deleted_at.is_(None))),
+        pool.fetch(shows_statement(foreign_key, entity_id, counterpart, counterpart_key,
+                                   prefix, False, now)),
+        pool.fetch(shows_statement(foreign_key, entity_id, counterpart, counterpart_key,
+                                   prefix, True, now)))
+    if not entity:
+        return None
+    data = entity[0]
+    data.update({
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": len(past_shows),
+        "upcoming_shows_count": len(upcoming_shows)
+    })
+    return data
+
+
+async def venue_detail(pool, venue_id):
+    return await load_detail(pool, VENUE_FIELDS, Venue, venue_id,
+                             Show.venue_id, Artist, Show.artist_id, 'artist')
+
+
+async def artist_detail(pool, artist_id):
+    return await load_detail(pool, ARTIST_FIELDS, Artist, artist_id,
+                             Show.artist_id, Venue, Show.venue_id, 'venue')
+
+
+def render_page(path, template, **context):
+    with app.test_request_context(path):
+        return render_template(template, **context).encode()
+
+
+async def venue_page(pool, path, venue_id):
+    data = await venue_detail(pool, venue_id)
+    return data and ('text/html; charset=utf-8',
+                     await in_thread(partial(render_page, path, 'pages/show_venue.html', venue=data)))
+
+
+async def artist_page(pool, path, artist_id):
+    data = await artist_detail(pool, artist_id)
+    return data and ('text/html; charset=utf-8',
+                     await in_thread(partial(render_page, path, 'pages/show_artist.html', artist=data)))
+
+
+async def venue_json(pool, path, venue_id):
+    data = await venue_detail(pool, venue_id)
+    return data and ('application/json', dumps(data).encode())
+
+
+async def artist_json(pool, path, artist_id):
+    data = await artist_detail(pool, artist_id)
+    return data and ('application/json', dumps(data).encode())
+
+
+ROUTES = [
+    (re.compile(r'^/venues/(\d+)$'), 'show_venue', venue_page, venue_version),
+    (re.compile(r'^/artists/(\d+)$'), 'show_artist', artist_page, artist_version),
+    (re.compile(r'^/api/v1/venues/(\d+)$'), 'api.venue', venue_json, venue_version),
+    (re.compile(r'^/api/v1/artists/(\d+)$'), 'api.artist', artist_json, artist_version),
+]
+
+
+def detail_version(version, entity_id, replica):
+    # the validators of the WSGI app (http_cache.py), read in a thread with
+    # the same database the page is read from
+    with app.app_context():
+        g.replica = replica
+        try:
+            return version(entity_id)
+        finally:
+            db.session.remove()
+
+#----------------------------------------------------------------------------#
+# ASGI application.
+#----------------------------------------------------------------------------#
+
+# Run with e.g. "uvicorn asgi:application --workers 4". The detail pages are
+# served by the async handlers above, with the ETag and Last-Modified the WSGI
+# app would send, so a conditional GET is answered before the page is read.
+# Every other request, any request carrying a Flask session (which may hold
+# flashed messages) and profiled requests are passed to the WSGI app in a
+# thread. Async responses are not counted in /_metrics.
+
+
+class Application(object):
+    def __init__(self, flask_app):
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.pools = {}
+        self.lock = asyncio.Lock()
+
+    async def pool(self, url):
+        if url not in self.pools:
+            async with self.lock:
+                if url not in self.pools:
+                    pool_class = SQLitePool if make_url(url).drivername == 'sqlite' else PostgresPool
+                    pool = pool_class(url, app.config)
+                    await pool.open()
+                    self.pools[url] = pool
+        return self.pools[url]
+
+    def replica(self, endpoint, cookies):
+        # the same choice the WSGI app makes in replicas.route_request
+        config = app.config
+        if (endpoint in config.get('REPLICA_ENDPOINTS', []) and
+                config.get('REPLICA_STICKY_COOKIE', 'primary') not in cookies):
+            return choose_replica(app)
+        return None
+
+    def database_url(self, replica):
+        if replica is not None:
+            return app.config['SQLALCHEMY_REPLICA_URIS'][int(replica.split('_')[1])]
+        return app.config['SQLALCHEMY_DATABASE_URI']
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            headers = dict((name.decode('latin-1'), value.decode('latin-1'))
+                           for name, value in scope['headers'])
+            cookies = SimpleCookie(headers.get('cookie', ''))
+            if (app.config['SESSION_COOKIE_NAME'] not in cookies and
+                    b'__profile=' not in scope['query_string']):
+                for pattern, endpoint, handler, version in ROUTES:
+                    match = pattern.match(scope['path'])
+                    if match:
+                        if await self.serve(scope, send, headers, cookies, endpoint, handler,
+                                            version, int(match.group(1))):
+                            return
+                        # unknown ids get the WSGI app's 404 page
+                        break
+        await self.wsgi(scope, receive, send)
+
+    async def serve(self, scope, send, headers, cookies, endpoint, handler, version, entity_id):
+        # False when there is no such entity
+        replica = self.replica(endpoint, cookies)
+        response_headers = []
+        if app.config.get('HTTP_CACHE_ENABLED', True):
+            current = await in_thread(detail_version, version, entity_id, replica)
+            if current is None:
+                return False
+            last_modified, parts = current
+            etag = version_etag(parts)
+            response_headers += [('etag', quote_etag(etag)),
+                                 ('cache-control', cache_control(endpoint))]
+            if last_modified is not None:
+                response_headers.append(('last-modified', http_date(last_modified)))
+            if is_fresh(etag, last_modified, parse_etags(headers.get('if-none-match')),
+                        parse_date(headers.get('if-modified-since'))):
+                await self.respond(scope, send, 304, response_headers, b'')
+                return True
+        pool = await self.pool(self.database_url(replica))
+        result = await handler(pool, scope['path'], entity_id)
+        if result is None:
+            return False
+        content_type, body = result
+        await self.respond(scope, send, 200, [('content-type', content_type)] + response_headers, body)
+        return True
+
+    async def respond(self, scope, send, status, response_headers, body):
+        response_headers = response_headers + [('content-length', str(len(body)))]
+        if scope['method'] == 'HEAD':
+            body = b''
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(name.encode('latin-1'), value.encode('latin-1'))
+                                for name, value in response_headers]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for pool in self.pools.values():
+                    await pool.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+application = Application(app)
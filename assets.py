@@ -0,0 +1,226 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+import click
+from flask import current_app, request, send_from_directory, url_for
+from models import app
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+#----------------------------------------------------------------------------#
+# Static asset pipeline.
+#----------------------------------------------------------------------------#
+
+# "flask assets build" copies every file under static/ to static/dist/ with a
+# content hash in its name, concatenates (and minifies) the ASSET_BUNDLES,
+# rewrites url() references in stylesheets to the hashed files, writes .gz
+# (and, with the brotli package, .br) variants of text files next to them,
+# and records the logical to hashed names in static/dist/manifest.json.
+#
+# With a manifest, url_for('static', filename=...) and bundle_urls() return
+# the hashed names, and those are served precompressed per Accept-Encoding
+# with an immutable Cache-Control. Without one (no build step, e.g. in
+# development) the source files are linked and served as before.
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.eot', '.otf', '.ttf')
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+CSS_COMMENT = re.compile(r'/\*(?!!).*?\*/', re.S)
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def fingerprinted(path, content):
+    root, extension = posixpath.splitext(path)
+    return '{}.{}{}'.format(root, hashlib.sha256(content).hexdigest()[:12], extension)
+
+
+def minify_css(text):
+    # comments (but not /*! licences */) and runs of whitespace
+    text = CSS_COMMENT.sub('', text)
+    text = re.sub(r'\s+', ' ', text)
+    return re.sub(r'\s*([{};,>])\s*', r'\1', text).strip()
+
+
+def minify_js(text):
+    # JavaScript is only minified with rjsmin; the bundled libraries already are
+    return rjsmin.jsmin(text) if rjsmin is not None else text
+
+
+def rewrite_css_urls(text, source, output, manifest):
+    # url()s in a stylesheet are relative to it: point them at the hashed files
+    def replace(match):
+        quote, target = match.group(1), match.group(2)
+        if re.match(r'^([a-z]+:|/|#)', target):
+            return match.group(0)
+        path, _, suffix = target.partition('?')
+        path, _, fragment = path.partition('#')
+        logical = posixpath.normpath(posixpath.join(posixpath.dirname(source), path))
+        if logical not in manifest:
+            return match.group(0)
+        relative = posixpath.relpath(manifest[logical],
+                                     posixpath.dirname(posixpath.join(DIST, output)))
+        return 'url({0}{1}{2}{0})'.format(
+            quote, relative, ('?' + suffix if suffix else '') + ('#' + fragment if fragment else ''))
+    return CSS_URL.sub(replace, text)
+
+
+def write(dist, path, content):
+    target = os.path.join(dist, path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, 'wb') as f:
+        f.write(content)
+    if path.endswith(COMPRESSIBLE):
+        # mtime=0 keeps the .gz files identical across builds
+        with open(target + '.gz', 'wb') as f:
+            with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=9, mtime=0) as compressed:
+                compressed.write(content)
+        if brotli is not None:
+            with open(target + '.br', 'wb') as f:
+                f.write(brotli.compress(content))
+
+
+def build_assets(static_folder, bundles):
+    # returns the manifest: logical name -> hashed name, relative to static/
+    dist = os.path.join(static_folder, DIST)
+    if os.path.isdir(dist):
+        shutil.rmtree(dist)
+    sources = {}
+    for directory, subdirectories, files in os.walk(static_folder):
+        subdirectories[:] = [name for name in subdirectories
+                             if os.path.join(directory, name) != dist]
+        for name in files:
+            if name.startswith('.'):
+                continue
+            path = os.path.join(directory, name)
+            logical = os.path.relpath(path, static_folder).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                sources[logical] = f.read()
+
+    manifest = {}
+    # stylesheets last, so that the files they refer to are already hashed
+    for logical in sorted(sources, key=lambda name: (name.endswith('.css'), name)):
+        content = sources[logical]
+        if logical.endswith('.css'):
+            content = rewrite_css_urls(content.decode('utf-8'), logical, logical,
+                                       manifest).encode('utf-8')
+        manifest[logical] = posixpath.join(DIST, fingerprinted(logical, content))
+        write(static_folder, manifest[logical], content)
+
+    for name, files in bundles.items():
+        parts = []
+        for logical in files:
+            text = sources[logical].decode('utf-8')
+            if name.endswith('.css'):
+                text = minify_css(rewrite_css_urls(text, logical, name, manifest))
+            elif not logical.endswith('.min.js'):
+                text = minify_js(text)
+            parts.append(text)
+        # a script without a final semicolon must not run into the next one
+        content = ('\n' if name.endswith('.css') else '\n;\n').join(parts).encode('utf-8')
+        manifest[name] = posixpath.join(DIST, fingerprinted(name, content))
+        write(static_folder, manifest[name], content)
+
+    with open(os.path.join(dist, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(app):
+    try:
+        with open(os.path.join(app.static_folder, DIST, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+#----------------------------------------------------------------------------#
+# URLs and serving.
+#----------------------------------------------------------------------------#
+
+
+def hashed_static_url(endpoint, values):
+    # url_defaults hook: url_for('static', filename=...) links the hashed file
+    if endpoint == 'static':
+        manifest = current_app.extensions.get('assets', {})
+        filename = values.get('filename')
+        if filename in manifest:
+            values['filename'] = manifest[filename]
+
+
+def bundle_urls(name):
+    # the bundle's hashed file once built, its source files until then
+    if name in current_app.extensions.get('assets', {}):
+        return [url_for('static', filename=name)]
+    return [url_for('static', filename=logical)
+            for logical in current_app.config['ASSET_BUNDLES'][name]]
+
+
+def serve_static(filename):
+    if not filename.startswith(DIST + '/'):
+        return current_app.send_static_file(filename)
+    directory = current_app.static_folder
+    served = filename
+    encoding = None
+    for name, suffix in ENCODINGS:
+        if (request.accept_encodings[name] and
+                os.path.isfile(os.path.join(directory, filename + suffix))):
+            served, encoding = filename + suffix, name
+            break
+    # the type of the file itself, not of its compressed variant
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = send_from_directory(directory, served, mimetype=mimetype)
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    if filename.endswith(COMPRESSIBLE):
+        response.headers['Vary'] = 'Accept-Encoding'
+    # hashed names change with their content, so they never need revalidating
+    response.headers['Cache-Control'] = IMMUTABLE
+    return response
+
+
+def init_assets(app):
+    manifest = load_manifest(app)
+    app.extensions['assets'] = manifest
+    app.jinja_env.globals['bundle_urls'] = bundle_urls
+    if manifest:
+        app.url_defaults(hashed_static_url)
+        app.view_functions['static'] = serve_static
+
+#----------------------------------------------------------------------------#
+# Command line.
+#----------------------------------------------------------------------------#
+
+
+@app.cli.group('assets')
+def assets_command():
+    """Build fingerprinted, minified and precompressed static assets."""
+
+
+@assets_command.command('build')
+def build_command():
+    """Write static/dist/ and its manifest."""
+    manifest = build_assets(app.static_folder, app.config.get('ASSET_BUNDLES', {}))
+    click.echo('built {} assets into {}'.format(
+        len(manifest), os.path.join(app.static_folder, DIST)))
+    if brotli is None:
+        click.echo('brotli is not installed: only .gz variants were written', err=True)
+
+
+@assets_command.command('clean')
+def clean_command():
+    """Remove static/dist/, so the source files are served again."""
+    shutil.rmtree(os.path.join(app.static_folder, DIST), ignore_errors=True)
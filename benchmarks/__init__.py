@@ -0,0 +1,15 @@
+# Benchmarks for the Fyyur pages. Each module is runnable with
+# "python -m benchmarks.<module>" and expects FYYUR_BENCH_DATABASE_URL to point
+# at a throwaway database, since the tables are dropped and re-seeded.
+from sqlalchemy import event
+
+
+def count_queries(engine):
+    # returns a list that collects every statement executed on `engine`
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    return statements
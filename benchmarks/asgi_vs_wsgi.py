@@ -0,0 +1,122 @@
+import http.client
+import os
+import subprocess
+import sys
+import threading
+import time
+from models import app
+from benchmarks.seed import use_bench_database, reset_database, seed
+
+#----------------------------------------------------------------------------#
+# WSGI vs ASGI server benchmark.
+#----------------------------------------------------------------------------#
+
+# Serves the benchmark database with gunicorn (sync workers) and uvicorn
+# (asgi.py) at the same worker count and drives both with the same closed-loop
+# load on the venue and artist detail pages: CONNECTIONS keep-alive clients
+# each sending one request after another for DURATION seconds.
+
+WORKERS = 4
+CONNECTIONS = 32
+WARMUP = 2
+DURATION = 10
+VENUES = 200
+SERVERS = [
+    ('wsgi', 8101, ['gunicorn', '--workers', str(WORKERS), '--bind', '127.0.0.1:8101',
+                    'benchmarks.serve:wsgi_app']),
+    ('asgi', 8102, ['uvicorn', '--workers', str(WORKERS), '--port', '8102', '--no-access-log',
+                    'benchmarks.serve:asgi_app']),
+]
+
+
+def pages():
+    # detail pages of venues and artists that exist in the seeded catalog
+    return (['/venues/{}'.format(i + 1) for i in range(0, VENUES, 7)] +
+            ['/artists/{}'.format(i + 1) for i in range(0, VENUES // 2, 7)])
+
+
+def wait_until_up(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/_health')
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit('server on port {} did not start'.format(port))
+
+
+def client(port, paths, offset, stop, latencies, errors):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    i = offset
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            connection.request('GET', paths[i % len(paths)])
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(repr(e))
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - started)
+        i += 1
+    connection.close()
+
+
+def load(port, paths, duration):
+    stop = threading.Event()
+    latencies = []
+    errors = []
+    threads = [threading.Thread(target=client, args=(port, paths, n, stop, latencies, errors))
+               for n in range(CONNECTIONS)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return latencies, errors
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0
+
+
+def main():
+    use_bench_database()
+    with app.app_context():
+        reset_database()
+        seed(venues=VENUES, shows_per_venue=20)
+
+    paths = pages()
+    failures = []
+    print('{:>6} {:>8} {:>10} {:>10} {:>8}'.format('server', 'req/s', 'p50 ms', 'p99 ms', 'errors'))
+    for name, port, command in SERVERS:
+        server = subprocess.Popen(command, env=os.environ.copy(),
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_until_up(port)
+            load(port, paths, WARMUP)
+            latencies, errors = load(port, paths, DURATION)
+        finally:
+            server.terminate()
+            server.wait()
+        print('{:>6} {:>8.0f} {:>10.1f} {:>10.1f} {:>8}'.format(
+            name, len(latencies) / DURATION, percentile(latencies, 0.5) * 1000,
+            percentile(latencies, 0.99) * 1000, len(errors)))
+        if errors:
+            failures.append(name)
+
+    if failures:
+        sys.exit('requests failed on {}'.format(', '.join(failures)))
+
+
+if __name__ == '__main__':
+    main()
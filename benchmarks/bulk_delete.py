@@ -0,0 +1,81 @@
+import sys
+import time
+from models import app, db, Venue, Artist, Show, ShowFeed
+from counters import check_counters
+from deletion import delete_entities, soft_delete, purge_deleted
+from benchmarks.seed import use_bench_database, reset_database, seed
+
+#----------------------------------------------------------------------------#
+# Deleting venues with their shows.
+#----------------------------------------------------------------------------#
+
+# DELETED of VENUES venues are deleted one ORM object at a time, as the venue
+# page did (every show loaded and deleted by its own statement), then through
+# delete_entities (a few statements per DELETE_CHUNK_SIZE venues), then soft
+# deleted and purged. Each way must leave no shows or feed rows behind and
+# the artists' counters right, and the set-based delete must be at least
+# MIN_SPEEDUP times faster than the ORM loop.
+
+VENUES = 1000
+DELETED = 200
+SHOWS_PER_VENUE = 20
+MIN_SPEEDUP = 5
+
+
+def orm_delete(ids):
+    for venue_id in ids:
+        venue = Venue.query.get(venue_id)
+        for show in venue.shows:
+            db.session.delete(show)
+        db.session.delete(venue)
+        db.session.commit()
+
+
+def purge(ids):
+    soft_delete(Venue, ids)
+    purge_deleted('venues')
+
+
+def leftovers(ids):
+    # what a delete of these venues must not leave behind
+    problems = []
+    if Venue.query.filter(Venue.id.in_(ids)).count():
+        problems.append('venues')
+    if Show.query.filter(Show.venue_id.in_(ids)).count():
+        problems.append('shows')
+    if ShowFeed.query.filter(ShowFeed.venue_id.in_(ids)).count():
+        problems.append('feed rows')
+    if check_counters(Artist):
+        problems.append('artist counters')
+    return problems
+
+
+def main():
+    use_bench_database()
+    failures = []
+    timings = {}
+    ids = list(range(1, DELETED + 1))
+    print('{:>12} {:>10} {:>12}'.format('delete', 'seconds', 'venues/s'))
+    with app.app_context():
+        for name, delete in (('orm', orm_delete),
+                             ('set-based', lambda ids: delete_entities(Venue, ids)),
+                             ('soft+purge', purge)):
+            reset_database()
+            seed(venues=VENUES, shows_per_venue=SHOWS_PER_VENUE)
+            started = time.perf_counter()
+            delete(ids)
+            timings[name] = time.perf_counter() - started
+            print('{:>12} {:>10.2f} {:>12.0f}'.format(
+                name, timings[name], DELETED / timings[name]))
+            problems = leftovers(ids)
+            if problems:
+                failures.append('{} delete left {}'.format(name, ', '.join(problems)))
+    if timings['orm'] < MIN_SPEEDUP * timings['set-based']:
+        failures.append('set-based delete is only {:.1f} times faster'.format(
+            timings['orm'] / timings['set-based']))
+    if failures:
+        sys.exit('\n'.join(failures))
+
+
+if __name__ == '__main__':
+    main()
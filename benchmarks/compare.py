@@ -0,0 +1,65 @@
+import argparse
+import json
+import sys
+
+#----------------------------------------------------------------------------#
+# Benchmark suite comparison.
+#----------------------------------------------------------------------------#
+
+# Compares two benchmarks/suite.py result files route by route and exits
+# non-zero when the current run regressed against the baseline: p99 latency
+# or throughput worse by more than the given fraction, or more queries per
+# request. Latency differences under MIN_LATENCY_MS are noise and ignored.
+
+LATENCY = 0.25
+THROUGHPUT = 0.20
+QUERIES = 0.5
+MIN_LATENCY_MS = 2.0
+
+
+def regressions(baseline, current, latency=LATENCY, throughput=THROUGHPUT):
+    # yields (mode, route, metric, baseline value, current value)
+    for mode, result in current['modes'].items():
+        routes = baseline['modes'].get(mode, {}).get('routes', {})
+        for endpoint, route in result['routes'].items():
+            before = routes.get(endpoint)
+            if before is None:
+                continue
+            if (route['p99_ms'] > before['p99_ms'] * (1 + latency) and
+                    route['p99_ms'] - before['p99_ms'] > MIN_LATENCY_MS):
+                yield mode, endpoint, 'p99_ms', before['p99_ms'], route['p99_ms']
+            if route['throughput'] < before['throughput'] * (1 - throughput):
+                yield mode, endpoint, 'throughput', before['throughput'], route['throughput']
+            if route['queries'] > before['queries'] + QUERIES:
+                yield mode, endpoint, 'queries', before['queries'], route['queries']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--latency', type=float, default=LATENCY,
+                        help='allowed p99 latency increase, as a fraction')
+    parser.add_argument('--throughput', type=float, default=THROUGHPUT,
+                        help='allowed throughput decrease, as a fraction')
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    if baseline['dataset'] != current['dataset']:
+        sys.exit('the runs used different datasets: {} and {}'.format(
+            baseline['dataset'], current['dataset']))
+
+    found = list(regressions(baseline, current, args.latency, args.throughput))
+    print('{} -> {}'.format(baseline.get('commit'), current.get('commit')))
+    for mode, endpoint, metric, before, after in found:
+        print('{:>12} {:>26} {:>10} {:>10} -> {}'.format(mode, endpoint, metric, before, after))
+    if found:
+        sys.exit('{} regressions'.format(len(found)))
+    print('no regressions')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+import sys
+import time
+from models import app, db
+from benchmarks import count_queries
+from benchmarks.seed import use_bench_database, reset_database, seed
+
+#----------------------------------------------------------------------------#
+# Venue and artist detail page query budget.
+#----------------------------------------------------------------------------#
+
+# two aggregate statements for the ETag, then one for the entity and one for
+# its shows joined with the counterpart
+MAX_QUERIES = 4
+SHOWS_PER_VENUE = [1, 10, 100]
+REPEAT = 5
+
+
+def main():
+    use_bench_database()
+    client = app.test_client()
+    failures = []
+    print('{:>8} {:>10} {:>8} {:>10}'.format('shows', 'page', 'queries', 'ms/page'))
+    with app.app_context():
+        statements = count_queries(db.engine)
+        for shows_per_venue in SHOWS_PER_VENUE:
+            reset_database()
+            seed(venues=10, artists=1, shows_per_venue=shows_per_venue)
+            for page in ['/venues/1', '/artists/1']:
+                del statements[:]
+                started = time.perf_counter()
+                for _ in range(REPEAT):
+                    response = client.get(page)
+                    assert response.status_code == 200
+                elapsed = (time.perf_counter() - started) / REPEAT
+                queries = len(statements) // REPEAT
+                print('{:>8} {:>10} {:>8} {:>10.1f}'.format(
+                    shows_per_venue, page, queries, elapsed * 1000))
+                if queries > MAX_QUERIES:
+                    failures.append(page)
+
+    if failures:
+        sys.exit('query budget of {} exceeded for {}'.format(
+            MAX_QUERIES, ', '.join(sorted(set(failures)))))
+
+
+if __name__ == '__main__':
+    main()
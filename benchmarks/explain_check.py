@@ -0,0 +1,72 @@
+import sys
+from sqlalchemy import event
+from models import app, db
+from benchmarks.seed import use_bench_database, reset_database, seed
+
+#----------------------------------------------------------------------------#
+# EXPLAIN check for the hot route queries (PostgreSQL only).
+#----------------------------------------------------------------------------#
+
+# routes whose statements must be able to use an index
+ROUTES = ['/venues', '/venues/1', '/artists/1']
+# tables that must never be read with a sequential scan by those routes
+CHECKED_TABLES = ['Show']
+
+
+def capture_statements(client, engine, route):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(route)
+        assert response.status_code == 200
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return statements
+
+
+def explain(engine, statement, parameters):
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        # with sequential scans priced out, a remaining Seq Scan means no
+        # usable index exists for the predicate
+        cursor.execute('SET enable_seqscan = off')
+        cursor.execute('EXPLAIN ' + statement, parameters)
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        connection.close()
+
+
+def main():
+    use_bench_database()
+    client = app.test_client()
+    failures = []
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name != 'postgresql':
+            sys.exit('the EXPLAIN check needs a PostgreSQL database')
+        reset_database()
+        seed(venues=5000)
+        engine.execute('ANALYZE')
+
+        for route in ROUTES:
+            for statement, parameters in capture_statements(client, engine, route):
+                plan = explain(engine, statement, parameters)
+                for table in CHECKED_TABLES:
+                    if any('Seq Scan on "{}"'.format(table) in line for line in plan):
+                        failures.append((route, statement, plan))
+
+    for route, statement, plan in failures:
+        print('{}: sequential scan in\n{}\n{}\n'.format(
+            route, statement, '\n'.join(plan)))
+    if failures:
+        sys.exit('{} statements fell back to sequential scans'.format(len(failures)))
+    print('all hot queries can use an index')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from models import app
+import images
+
+#----------------------------------------------------------------------------#
+# Image proxy benchmark against a local HTTP stub.
+#----------------------------------------------------------------------------#
+
+# A stub server hands out static/img/front-splash.jpg under SOURCES different
+# URLs. Every URL is requested through the proxy twice, as a browser
+# accepting WebP would; the stub must see each URL once and the cache must
+# hold one original. Then SOURCES different pictures (the same JPEG with a
+# different trailer) go through a cache of SMALL_CACHE bytes, which must stay
+# under its limit.
+
+SOURCES = 50
+SMALL_CACHE = 8 * 1024 * 1024
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    hits = []
+    with open(os.path.join(app.static_folder, 'img', 'front-splash.jpg'), 'rb') as f:
+        body = f.read()
+
+    def do_GET(self):
+        self.hits.append(self.path)
+        body = self.body
+        if self.path.startswith('/unique/'):
+            # decoders stop at the end of image marker
+            body += self.path.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def request_all(client, port, kind='same', accept='image/webp,*/*'):
+    sent = 0
+    started = time.perf_counter()
+    with app.test_request_context():
+        urls = [images.thumbnail_url('http://127.0.0.1:{}/{}/{}.jpg'.format(port, kind, i))
+                for i in range(SOURCES)]
+    for url in urls:
+        response = client.get(url, headers={'Accept': accept})
+        assert response.status_code == 200, (url, response.status_code)
+        sent += len(response.data)
+        content_type = response.headers['Content-Type']
+    return (time.perf_counter() - started) / SOURCES, sent, content_type
+
+
+def cache_size(directory):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(directory) for name in names)
+
+
+def main():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    app.config['IMAGE_ALLOW_PRIVATE'] = True
+    app.config['IMAGE_PROXY_KEY'] = 'benchmark'
+    client = app.test_client()
+    failures = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        app.config['IMAGE_CACHE_DIR'] = directory
+        print('{:>8} {:>10} {:>12} {:>14}'.format('pass', 'ms/image', 'bytes/image', 'type'))
+        for name in ('cold', 'warm'):
+            seconds, sent, content_type = request_all(client, port)
+            print('{:>8} {:>10.1f} {:>12} {:>14}'.format(
+                name, seconds * 1000, sent // SOURCES, content_type))
+        print('source bytes/image {}, stub requests {}'.format(
+            len(StubHandler.body), len(StubHandler.hits)))
+        if len(StubHandler.hits) != SOURCES:
+            failures.append('the stub served {} requests for {} sources'.format(
+                len(StubHandler.hits), SOURCES))
+        originals = [name for _, _, names in os.walk(os.path.join(directory, 'originals'))
+                     for name in names]
+        if len(originals) != 1:
+            failures.append('{} originals stored for one picture'.format(len(originals)))
+
+    with tempfile.TemporaryDirectory() as directory:
+        app.config['IMAGE_CACHE_DIR'] = directory
+        app.config['IMAGE_CACHE_MAX_BYTES'] = SMALL_CACHE
+        del StubHandler.hits[:]
+        request_all(client, port, 'unique', 'image/jpeg')
+        size = cache_size(directory)
+        print('cache limited to {} bytes holds {} bytes'.format(SMALL_CACHE, size))
+        if size > SMALL_CACHE:
+            failures.append('the cache grew to {} bytes'.format(size))
+
+    server.shutdown()
+    if failures:
+        sys.exit('\n'.join(failures))
+
+
+if __name__ == '__main__':
+    main()
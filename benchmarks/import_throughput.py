@@ -0,0 +1,46 @@
+import csv
+import io
+import time
+from models import app
+from importer import import_rows
+from benchmarks.seed import use_bench_database, reset_database, STATES
+
+#----------------------------------------------------------------------------#
+# Bulk import throughput.
+#----------------------------------------------------------------------------#
+
+ROWS = 20000
+CHUNK_SIZES = [1, 100, 1000, 5000]
+
+
+def venue_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['name', 'city', 'state', 'address', 'phone', 'genres',
+                     'image_link', 'facebook_link', 'website', 'seeking_talent',
+                     'seeking_description'])
+    for i in range(rows):
+        writer.writerow(['Venue {}'.format(i), 'City {}'.format(i % 100),
+                         STATES[i % len(STATES)], '{} Main St'.format(i),
+                         '555-0100', 'Jazz;Blues', 'https://example.com/{}.jpg'.format(i),
+                         'https://facebook.com/venue{}'.format(i), '', 'False', ''])
+    return buffer.getvalue()
+
+
+def main():
+    use_bench_database()
+    data = venue_csv(ROWS)
+    print('{:>8} {:>10} {:>10}'.format('chunk', 'rows', 'rows/s'))
+    with app.app_context():
+        for chunk_size in CHUNK_SIZES:
+            reset_database()
+            started = time.perf_counter()
+            summary = import_rows('venues', io.StringIO(data), 'csv', chunk_size)
+            elapsed = time.perf_counter() - started
+            assert summary['failed'] == 0, summary
+            print('{:>8} {:>10} {:>10.0f}'.format(
+                chunk_size, summary['imported'], summary['imported'] / elapsed))
+
+
+if __name__ == '__main__':
+    main()
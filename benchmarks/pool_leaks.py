@@ -0,0 +1,98 @@
+import sys
+import threading
+import time
+from sqlalchemy import event
+from models import app, db
+from pool import pool_status
+from benchmarks.seed import use_bench_database, reset_database, seed
+
+#----------------------------------------------------------------------------#
+# Connection leak load test.
+#----------------------------------------------------------------------------#
+
+# Several threads hit the pages and the submission handlers, including
+# submissions that fail inside their try/except/finally blocks, with more
+# threads than the pool allows connections. Afterwards every connection taken
+# from the pool must have been returned to it.
+
+THREADS = 20
+ROUNDS = 25
+
+VENUE = {
+    'name': 'Leak Test Hall', 'city': 'San Francisco', 'state': 'CA',
+    'address': '1 Main St', 'phone': '123-123-1234', 'genres': 'Jazz',
+    'website': '', 'image_link': '', 'facebook_link': '',
+    'seeking_talent': 'False', 'seeking_description': '',
+}
+
+REQUESTS = [
+    ('get', '/venues', None),
+    ('get', '/artists', None),
+    ('get', '/shows', None),
+    ('get', '/venues/1', None),
+    ('get', '/artists/1', None),
+    ('get', '/_health', None),
+    # succeeds
+    ('post', '/venues/create', VENUE),
+    # missing form fields: fails before the commit
+    ('post', '/venues/create', {'name': 'Incomplete'}),
+    # unknown venue and artist: fails at the commit on PostgreSQL
+    ('post', '/shows/create', {'venue_id': '999999', 'artist_id': '999999',
+                               'start_time': '2030-01-01 20:00:00'}),
+    # unknown venue: fails on the lookup
+    ('delete', '/venues/999999', None),
+]
+
+
+def worker(errors):
+    client = app.test_client()
+    for _ in range(ROUNDS):
+        for method, path, data in REQUESTS:
+            response = getattr(client, method)(path, data=data)
+            if response.status_code >= 500 and path != '/_health':
+                errors.append('{} {} -> {}'.format(method.upper(), path, response.status_code))
+
+
+def main():
+    use_bench_database()
+    with app.app_context():
+        reset_database()
+        seed(venues=20)
+        db.session.remove()
+
+        outstanding = [0]
+        lock = threading.Lock()
+
+        def checkout(dbapi_connection, connection_record, connection_proxy):
+            with lock:
+                outstanding[0] += 1
+
+        def checkin(dbapi_connection, connection_record):
+            with lock:
+                outstanding[0] -= 1
+
+        event.listen(db.engine.pool, 'checkout', checkout)
+        event.listen(db.engine.pool, 'checkin', checkin)
+
+        errors = []
+        threads = [threading.Thread(target=worker, args=(errors,)) for _ in range(THREADS)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        status = pool_status(db.engine)
+        print('{} requests in {:.1f}s; pool {}'.format(
+            THREADS * ROUNDS * len(REQUESTS), elapsed, status))
+
+    if errors:
+        sys.exit('server errors:\n' + '\n'.join(sorted(set(errors))))
+    if outstanding[0] or status.get('checkedout'):
+        sys.exit('{} connections were not returned to the pool'.format(
+            outstanding[0] or status['checkedout']))
+
+
+if __name__ == '__main__':
+    main()
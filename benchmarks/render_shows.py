@@ -0,0 +1,68 @@
+import time
+from datetime import datetime, timedelta
+from flask import render_template
+from app import app
+from rendering import format_datetime, fragments
+
+#----------------------------------------------------------------------------#
+# /shows template rendering benchmark.
+#----------------------------------------------------------------------------#
+
+# Renders pages/shows.html with TILES show tiles, without a database: first
+# with the fragment cache off and the date formatter's memo cleared before
+# every render, then with both caches cold, then warm. The app comes from
+# app.py so that the layout's url_for targets and template globals exist.
+
+TILES = 10000
+REPEAT = 5
+
+
+def shows(count):
+    start = datetime(2030, 1, 1, 20, 0)
+    return [{
+        "id": i + 1,
+        # a few hundred distinct start times, like a real upcoming feed
+        "start_time": start + timedelta(hours=i % 500),
+        "venue_id": i % 200 + 1,
+        "venue_name": "Venue {}".format(i % 200),
+        "artist_id": i % 300 + 1,
+        "artist_name": "Artist {}".format(i % 300),
+        "artist_image_link": "https://example.com/artists/{}.jpg".format(i % 300)
+    } for i in range(count)]
+
+
+def render(data):
+    with app.test_request_context('/shows'):
+        started = time.perf_counter()
+        html = render_template('pages/shows.html', shows=data,
+                               next_cursor=None, prev_cursor=None)
+        return time.perf_counter() - started, len(html)
+
+
+def main():
+    data = shows(TILES)
+    print('{:>14} {:>10} {:>10}'.format('mode', 'ms/page', 'bytes'))
+
+    app.config['FRAGMENT_CACHE_ENABLED'] = False
+    elapsed = 0
+    for _ in range(REPEAT):
+        format_datetime.cache_clear()
+        seconds, size = render(data)
+        elapsed += seconds
+    print('{:>14} {:>10.1f} {:>10}'.format('uncached', elapsed / REPEAT * 1000, size))
+
+    app.config['FRAGMENT_CACHE_ENABLED'] = True
+    format_datetime.cache_clear()
+    fragments.clear()
+    seconds, size = render(data)
+    print('{:>14} {:>10.1f} {:>10}'.format('cold caches', seconds * 1000, size))
+
+    elapsed = 0
+    for _ in range(REPEAT):
+        seconds, size = render(data)
+        elapsed += seconds
+    print('{:>14} {:>10.1f} {:>10}'.format('warm caches', elapsed / REPEAT * 1000, size))
+
+
+if __name__ == '__main__':
+    main()
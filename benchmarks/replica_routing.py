@@ -0,0 +1,88 @@
+import os
+import shutil
+import sys
+from sqlalchemy.engine.url import make_url
+from models import app, db
+from replicas import register_replicas, replica_names
+from benchmarks import count_queries
+from benchmarks.seed import use_bench_database, reset_database, seed
+
+#----------------------------------------------------------------------------#
+# Read replica routing check.
+#----------------------------------------------------------------------------#
+
+# Runs against the benchmark database as primary and the comma separated
+# FYYUR_BENCH_REPLICA_URLS as replicas. SQLite stand-ins are made by copying
+# the seeded primary file; real replicas are expected to be replicating it.
+# Counts the statements each database runs for pages, writes and the reads
+# right after a write.
+
+VENUE = {
+    'name': 'Replica Test Hall', 'city': 'San Francisco', 'state': 'CA',
+    'address': '1 Main St', 'phone': '123-123-1234', 'genres': 'Jazz',
+    'website': '', 'image_link': '', 'facebook_link': '',
+    'seeking_talent': 'False', 'seeking_description': '',
+}
+PAGES = ['/venues', '/artists', '/shows', '/venues/1', '/artists/1']
+
+
+def use_replicas():
+    urls = [url for url in os.environ.get('FYYUR_BENCH_REPLICA_URLS', '').split(',') if url]
+    if len(urls) < 2:
+        raise SystemExit('FYYUR_BENCH_REPLICA_URLS needs at least two URLs')
+    app.config['SQLALCHEMY_REPLICA_URIS'] = urls
+    register_replicas(app)
+
+
+def copy_sqlite(primary, replicas):
+    for url in replicas:
+        if make_url(url).drivername == 'sqlite':
+            shutil.copyfile(make_url(primary).database, make_url(url).database)
+
+
+def main():
+    use_bench_database()
+    use_replicas()
+    failures = []
+    with app.app_context():
+        reset_database()
+        seed(venues=20)
+        db.session.remove()
+        copy_sqlite(app.config['SQLALCHEMY_DATABASE_URI'], app.config['SQLALCHEMY_REPLICA_URIS'])
+
+        names = ['primary'] + replica_names(app)
+        engines = [db.engine] + [db.get_engine(app, bind=name) for name in names[1:]]
+        statements = dict((name, count_queries(engine)) for name, engine in zip(names, engines))
+
+        def run(label, requests, expected):
+            for statement_list in statements.values():
+                del statement_list[:]
+            for request in requests:
+                response = request()
+                assert response.status_code < 500, (label, response.status_code)
+            used = sorted(name for name in names if statements[name])
+            print('{:<28} {}'.format(label, ', '.join(
+                '{}={}'.format(name, len(statements[name])) for name in names)))
+            if used != sorted(expected):
+                failures.append('{}: used {}, expected {}'.format(label, used, sorted(expected)))
+
+        # least_lag keeps choosing the first of equally fresh replicas
+        replicas = names[1:2] if app.config['REPLICA_SELECTION'] == 'least_lag' else names[1:]
+        reader = app.test_client()
+        writer = app.test_client()
+        run('reads', [lambda page=page: reader.get(page)
+                      for page in PAGES for _ in names[1:]], replicas)
+        run('search', [lambda: reader.post('/venues/search', data={'search_term': 'venue'})
+                       for _ in names[1:]], replicas)
+        run('write', [lambda: writer.post('/venues/create', data=VENUE)], ['primary'])
+        run('reads after the write', [lambda page=page: writer.get(page) for page in PAGES],
+            ['primary'])
+        run('reads by another client', [lambda page=page: reader.get(page)
+                                        for page in PAGES for _ in names[1:]], replicas)
+
+    if failures:
+        sys.exit('\n'.join(failures))
+
+
+if __name__ == '__main__':
+    main()
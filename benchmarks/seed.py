@@ -0,0 +1,121 @@
+import os
+import random
+from types import SimpleNamespace
+from datetime import datetime, timedelta
+from itertools import accumulate
+from models import app, db, Venue, Artist, Show
+from search import build_search_text, indexes
+from counters import refresh_counters
+from feed import refresh_feed
+from importer import sync_sequence
+from scheduling import IntervalIndex
+
+#----------------------------------------------------------------------------#
+# Synthetic catalog.
+#----------------------------------------------------------------------------#
+
+POWER_LAW_EXPONENT = 1.2
+# shows start within this many minutes of now, either way
+SHOW_SPAN = 365 * 24 * 60
+STATES = ['CA', 'NY', 'TX', 'WA', 'IL', 'FL', 'MA', 'CO', 'GA', 'OR']
+
+
+def use_bench_database():
+    # point the app at the benchmark database before the engine is created
+    url = os.environ.get('FYYUR_BENCH_DATABASE_URL')
+    if not url:
+        raise SystemExit('FYYUR_BENCH_DATABASE_URL is not set')
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['WTF_CSRF_ENABLED'] = False
+    # measure the queries, not the listing cache
+    app.config['CACHE_ENABLED'] = False
+
+
+def reset_database():
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    # the in-memory search indexes describe the old tables
+    indexes.clear()
+
+
+def with_search_text(row):
+    row["search_text"] = build_search_text(SimpleNamespace(**row))
+    return row
+
+
+def power_law(rng, count, k):
+    # k draws from range(count), where item i is picked with a weight of
+    # 1 / (i + 1) ** POWER_LAW_EXPONENT: a few venues and artists get most shows
+    weights = list(accumulate(1.0 / (i + 1) ** POWER_LAW_EXPONENT for i in range(count)))
+    return rng.choices(range(count), cum_weights=weights, k=k)
+
+
+def schedule(rng, show_venues, show_artists, now):
+    # (start, end) per show, drawn until neither its venue nor its artist is
+    # booked then, as the exclusion constraints on Show require
+    duration = timedelta(seconds=app.config.get('SHOW_DEFAULT_DURATION', 3 * 3600))
+    venues, artists = IntervalIndex(), IntervalIndex()
+    times = []
+    for venue, artist in zip(show_venues, show_artists):
+        while True:
+            start = now + timedelta(minutes=rng.randint(-SHOW_SPAN, SHOW_SPAN))
+            end = start + duration
+            if venues.find(venue, start, end) is None and artists.find(artist, start, end) is None:
+                break
+        venues.add(venue, start, end)
+        artists.add(artist, start, end)
+        times.append((start, end))
+    return times
+
+
+def seed(venues=50, artists=None, shows_per_venue=4, cities=None, seed=0,
+         distribution='uniform'):
+    # seeds a deterministic catalog of `venues` venues spread over `cities` areas
+    # with venues * shows_per_venue shows, either shows_per_venue at every
+    # venue ('uniform') or power law distributed over venues and artists
+    rng = random.Random(seed)
+    artists = artists or max(venues // 2, 1)
+    cities = cities or max(venues // 25, 1)
+    now = datetime.now()
+    shows = venues * shows_per_venue
+    if distribution == 'power':
+        show_venues = power_law(rng, venues, shows)
+        show_artists = power_law(rng, artists, shows)
+    else:
+        show_venues = [i // shows_per_venue for i in range(shows)]
+        show_artists = [rng.randrange(artists) for _ in range(shows)]
+    times = schedule(rng, show_venues, show_artists, now)
+
+    # bulk inserts skip the mapper events, so search_text is filled in here
+    # and the show counters and feed are recomputed at the end
+    db.session.bulk_insert_mappings(Venue, [with_search_text({
+        "id": i + 1,
+        "name": "Venue {}".format(i),
+        "city": "City {}".format(i % cities),
+        "state": STATES[i % cities % len(STATES)],
+        "address": "{} Main St".format(i),
+        "genres": ["Jazz"],
+        "seeking_talent": False
+    }) for i in range(venues)])
+    db.session.bulk_insert_mappings(Artist, [with_search_text({
+        "id": i + 1,
+        "name": "Artist {}".format(i),
+        "city": "City {}".format(i % cities),
+        "state": STATES[i % cities % len(STATES)],
+        "genres": ["Jazz"],
+        "seeking_venue": False
+    }) for i in range(artists)])
+    db.session.bulk_insert_mappings(Show, [{
+        "venue_id": show_venues[i] + 1,
+        "artist_id": show_artists[i] + 1,
+        "start_time": times[i][0],
+        "end_time": times[i][1]
+    } for i in range(shows)])
+    refresh_counters(Venue)
+    refresh_counters(Artist)
+    refresh_feed()
+    db.session.commit()
+    # the explicit ids did not advance the sequences new rows are drawn from
+    sync_sequence(Venue)
+    sync_sequence(Artist)
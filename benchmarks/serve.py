@@ -0,0 +1,8 @@
+# Entry points for the server benchmarks: the app on the benchmark database,
+# e.g. "gunicorn benchmarks.serve:wsgi_app" or "uvicorn benchmarks.serve:asgi_app".
+from benchmarks.seed import use_bench_database
+
+use_bench_database()
+
+from app import app as wsgi_app
+from asgi import application as asgi_app
@@ -0,0 +1,100 @@
+import csv
+import io
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from models import app, db, Venue, Artist, Show
+from importer import import_rows
+from scheduling import find_conflict
+from benchmarks.seed import use_bench_database, reset_database
+
+#----------------------------------------------------------------------------#
+# Double-booking checks against busy venues.
+#----------------------------------------------------------------------------#
+
+# One venue is booked back to back with BOOKED shows. A conflict check must
+# cost the same for every size (an index seek, not a scan of the venue's
+# shows), so the slowest size may take at most MAX_GROWTH times the fastest.
+# Then IMPORT_ROWS shows are scheduled through the bulk import, every tenth
+# overlapping the existing bookings, and exactly those must be rejected.
+
+BOOKED = [100, 1000, 10000, 30000]
+CHECKS = 1000
+IMPORT_ROWS = 5000
+MAX_GROWTH = 3
+DURATION = timedelta(hours=3)
+START = datetime(2030, 1, 1, 20, 0)
+
+
+def book(count, artists):
+    db.session.execute(Venue.__table__.insert(), [{
+        'id': 1, 'name': 'Busy Venue', 'city': 'San Francisco', 'state': 'CA'}])
+    db.session.execute(Artist.__table__.insert(), [
+        {'id': i + 1, 'name': 'Artist {}'.format(i)} for i in range(artists)])
+    # adjacent, not overlapping: [start, end) intervals
+    db.session.execute(Show.__table__.insert(), [{
+        'venue_id': 1, 'artist_id': i + 1, 'start_time': START + i * DURATION,
+        'end_time': START + (i + 1) * DURATION, 'updated_at': datetime.utcnow()
+    } for i in range(count)])
+    db.session.commit()
+
+
+def check_conflicts(count, rng):
+    # returns the seconds per check; half the candidates overlap a booking
+    candidates = []
+    for i in range(CHECKS):
+        if i % 2:
+            start = START + rng.randrange(count * 180) * timedelta(minutes=1)
+        else:
+            start = START + count * DURATION + rng.randrange(1000) * DURATION
+        candidates.append((start, i % 2 == 1))
+    started = time.perf_counter()
+    for start, overlaps in candidates:
+        conflict = find_conflict(1, count + 1, start, start + DURATION)
+        assert (conflict is not None) == overlaps, (start, conflict)
+    return (time.perf_counter() - started) / CHECKS
+
+
+def import_csv(count):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['venue_id', 'artist_id', 'start_time'])
+    for i in range(IMPORT_ROWS):
+        if i % 10 == 0:
+            start = START + (i % count) * DURATION + timedelta(minutes=30)
+        else:
+            start = START + (count + i) * DURATION
+        writer.writerow([1, count + i + 1, start.strftime('%Y-%m-%d %H:%M:%S')])
+    return buffer.getvalue()
+
+
+def main():
+    use_bench_database()
+    rng = random.Random(0)
+    failures = []
+    timings = []
+    print('{:>8} {:>12} {:>12}'.format('booked', 'us/check', 'import/s'))
+    with app.app_context():
+        for count in BOOKED:
+            reset_database()
+            book(count, count + IMPORT_ROWS)
+            per_check = check_conflicts(count, rng)
+            timings.append(per_check)
+            started = time.perf_counter()
+            summary = import_rows('shows', io.StringIO(import_csv(count)), 'csv')
+            elapsed = time.perf_counter() - started
+            print('{:>8} {:>12.1f} {:>12.0f}'.format(
+                count, per_check * 1e6, IMPORT_ROWS / elapsed))
+            if summary['failed'] != IMPORT_ROWS // 10:
+                failures.append('{} booked: {} of {} overlapping rows rejected'.format(
+                    count, summary['failed'], IMPORT_ROWS // 10))
+    if max(timings) > MAX_GROWTH * min(timings):
+        failures.append('conflict checks slowed from {:.1f} to {:.1f} us'.format(
+            min(timings) * 1e6, max(timings) * 1e6))
+    if failures:
+        sys.exit('\n'.join(failures))
+
+
+if __name__ == '__main__':
+    main()
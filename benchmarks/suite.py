@@ -0,0 +1,289 @@
+import argparse
+import http.client
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+from werkzeug.serving import WSGIRequestHandler, make_server
+from models import app
+from benchmarks.seed import STATES, use_bench_database, reset_database, seed
+import app as views
+
+#----------------------------------------------------------------------------#
+# Route benchmark suite.
+#----------------------------------------------------------------------------#
+
+# Seeds a deterministic catalog (power law distributed shows by default) and
+# drives every route in app.py, first through the Flask test client and then
+# over real HTTP against a threaded werkzeug server with CONNECTIONS clients.
+# For each route it reports throughput, latency percentiles and the queries
+# per request taken from the Server-Timing header, plus the peak RSS of the
+# process, as JSON that benchmarks/compare.py checks against a baseline.
+
+REQUESTS = 200
+CONNECTIONS = 8
+VENUES = 500
+ARTISTS = 500
+SHOWS_PER_VENUE = 20
+CITIES = 20
+# venues above VENUES - DELETED (artists above ARTISTS - DELETED) are only
+# ever requested by delete_venue (delete_artist)
+DELETED = 2 * REQUESTS
+
+
+def venue_form(n):
+    return {
+        'name': 'Bench Venue {}'.format(n), 'city': 'City 0', 'state': 'CA',
+        'address': '{} Bench St'.format(n), 'phone': '555-555-5555',
+        'genres': ['Jazz', 'Folk'], 'website': 'https://example.com',
+        'image_link': 'https://example.com/venue.jpg', 'seeking_talent': 'False',
+        'seeking_description': '', 'facebook_link': 'https://facebook.com/bench'
+    }
+
+
+def artist_form(n):
+    form = venue_form(n)
+    del form['address'], form['seeking_talent']
+    form.update(name='Bench Artist {}'.format(n), seeking_venue='False')
+    return form
+
+
+def venue_id(n):
+    return n % (VENUES - DELETED) + 1
+
+
+def artist_id(n):
+    return n % (ARTISTS - DELETED) + 1
+
+
+def show_time(n):
+    # a day apart, so that no two of them double-book an artist
+    return (datetime(2035, 1, 1, 20) + timedelta(days=n)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def edited_venue(n):
+    # keeps the seeded name and area, so every pass sees the same catalog
+    form = venue_form(n)
+    i = venue_id(n) - 1
+    form.update(name='Venue {}'.format(i), city='City {}'.format(i % CITIES),
+                state=STATES[i % CITIES % len(STATES)])
+    return form
+
+
+def edited_artist(n):
+    form = artist_form(n)
+    i = artist_id(n) - 1
+    form.update(name='Artist {}'.format(i), city='City {}'.format(i % CITIES),
+                state=STATES[i % CITIES % len(STATES)])
+    return form
+
+
+# (endpoint, method, path for request n, form for request n); delete_venue
+# and delete_artist run last, on the venues and artists reserved for them
+SCENARIOS = [
+    ('index', 'GET', lambda n: '/', None),
+    ('venues', 'GET', lambda n: '/venues', None),
+    ('search_venues', 'POST', lambda n: '/venues/search',
+     lambda n: {'search_term': 'venue {}'.format(n % 50)}),
+    ('show_venue', 'GET', lambda n: '/venues/{}'.format(venue_id(n)), None),
+    ('create_venue_form', 'GET', lambda n: '/venues/create', None),
+    ('create_venue_submission', 'POST', lambda n: '/venues/create', venue_form),
+    ('edit_venue', 'GET', lambda n: '/venues/{}/edit'.format(venue_id(n)), None),
+    ('edit_venue_submission', 'POST', lambda n: '/venues/{}/edit'.format(venue_id(n)),
+     edited_venue),
+    ('artists', 'GET', lambda n: '/artists', None),
+    ('search_artists', 'POST', lambda n: '/artists/search',
+     lambda n: {'search_term': 'artist {}'.format(n % 50)}),
+    ('show_artist', 'GET', lambda n: '/artists/{}'.format(artist_id(n)), None),
+    ('edit_artist', 'GET', lambda n: '/artists/{}/edit'.format(artist_id(n)), None),
+    ('edit_artist_submission', 'POST', lambda n: '/artists/{}/edit'.format(artist_id(n)),
+     edited_artist),
+    ('create_artist_form', 'GET', lambda n: '/artists/create', None),
+    ('create_artist_submission', 'POST', lambda n: '/artists/create', artist_form),
+    ('shows', 'GET', lambda n: '/shows', None),
+    ('create_shows', 'GET', lambda n: '/shows/create', None),
+    ('create_show_submission', 'POST', lambda n: '/shows/create', lambda n: {
+        'venue_id': venue_id(n), 'artist_id': artist_id(n),
+        'start_time': show_time(n)}),
+    ('delete_venue', 'DELETE', lambda n: '/venues/{}'.format(VENUES - n), None),
+    ('delete_artist', 'DELETE', lambda n: '/artists/{}'.format(ARTISTS - n), None),
+]
+QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def check_coverage():
+    # every view defined in app.py needs a scenario
+    routes = set(endpoint for endpoint, view in app.view_functions.items()
+                 if view.__module__ == views.__name__ and endpoint != 'static')
+    missing = routes - set(scenario[0] for scenario in SCENARIOS)
+    if missing:
+        raise SystemExit('no scenario for {}'.format(', '.join(sorted(missing))))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0
+
+
+def queries(server_timing):
+    match = QUERIES.search(server_timing or '')
+    return int(match.group(1)) if match else 0
+
+
+def summarize(latencies, statements, errors, elapsed):
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'throughput': round(len(latencies) / elapsed, 1) if elapsed else 0,
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 2),
+        'p90_ms': round(percentile(latencies, 0.9) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'queries': round(sum(statements) / len(statements), 2) if statements else 0,
+    }
+
+
+def ok(status):
+    # form submissions answer with a page or a redirect
+    return status < 400
+
+#----------------------------------------------------------------------------#
+# Drivers.
+#----------------------------------------------------------------------------#
+
+
+def run_test_client(scenario, count):
+    endpoint, method, path, form = scenario
+    client = app.test_client()
+    latencies, statements, errors = [], [], []
+    started = time.perf_counter()
+    for n in range(count):
+        request_started = time.perf_counter()
+        response = client.open(path(n), method=method, data=form(n) if form else None)
+        latencies.append(time.perf_counter() - request_started)
+        statements.append(queries(response.headers.get('Server-Timing')))
+        if not ok(response.status_code):
+            errors.append(response.status_code)
+    return summarize(latencies, statements, errors, time.perf_counter() - started)
+
+
+def http_client(port, scenario, numbers, latencies, statements, errors):
+    endpoint, method, path, form = scenario
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    for n in numbers:
+        body = urlencode(form(n), doseq=True) if form else None
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'} if form else {}
+        started = time.perf_counter()
+        try:
+            connection.request(method, path(n), body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(repr(e))
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - started)
+        statements.append(queries(response.getheader('Server-Timing')))
+        if not ok(response.status):
+            errors.append(response.status)
+    connection.close()
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def run_http(port, scenario, count):
+    latencies, statements, errors = [], [], []
+    threads = [threading.Thread(target=http_client, args=(
+        port, scenario, range(offset, count, CONNECTIONS), latencies, statements, errors))
+        for offset in range(CONNECTIONS)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, statements, errors, time.perf_counter() - started)
+
+
+def peak_rss():
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(dataset, requests=REQUESTS):
+    # returns the results of both modes, reseeding before each so that the
+    # create and delete scenarios start from the same catalog
+    results = {'commit': git_commit(), 'dataset': dataset, 'requests': requests, 'modes': {}}
+    for mode in ('test_client', 'http'):
+        with app.app_context():
+            reset_database()
+            seed(**dataset)
+        if mode == 'http':
+            server = make_server('127.0.0.1', 0, app, threaded=True,
+                                 request_handler=QuietHandler)
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+        routes = {}
+        try:
+            for scenario in SCENARIOS:
+                if mode == 'http':
+                    routes[scenario[0]] = run_http(server.server_port, scenario, requests)
+                else:
+                    routes[scenario[0]] = run_test_client(scenario, requests)
+        finally:
+            if mode == 'http':
+                server.shutdown()
+        results['modes'][mode] = {'routes': routes, 'peak_rss_kb': peak_rss()}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output', help='write the JSON results to this file')
+    parser.add_argument('--distribution', choices=['uniform', 'power'], default='power')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    use_bench_database()
+    check_coverage()
+    dataset = {'venues': VENUES, 'artists': ARTISTS, 'shows_per_venue': SHOWS_PER_VENUE, 'cities': CITIES,
+               'distribution': args.distribution, 'seed': args.seed}
+    results = run_suite(dataset)
+
+    for mode, result in results['modes'].items():
+        print('{} (peak RSS {} kB)'.format(mode, result['peak_rss_kb']))
+        print('{:>26} {:>8} {:>8} {:>8} {:>8} {:>8} {:>7}'.format(
+            'route', 'req/s', 'p50 ms', 'p90 ms', 'p99 ms', 'queries', 'errors'))
+        for endpoint, route in result['routes'].items():
+            print('{:>26} {throughput:>8.0f} {p50_ms:>8.1f} {p90_ms:>8.1f} {p99_ms:>8.1f} '
+                  '{queries:>8.1f} {errors:>7}'.format(endpoint, **route))
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    failed = [endpoint for result in results['modes'].values()
+              for endpoint, route in result['routes'].items() if route['errors']]
+    if failed:
+        sys.exit('requests failed on {}'.format(', '.join(sorted(set(failed)))))
+
+
+if __name__ == '__main__':
+    main()
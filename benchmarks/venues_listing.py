@@ -0,0 +1,35 @@
+import time
+from models import app, db
+from benchmarks import count_queries
+from benchmarks.seed import use_bench_database, reset_database, seed
+
+#----------------------------------------------------------------------------#
+# /venues scaling benchmark.
+#----------------------------------------------------------------------------#
+
+SIZES = [50, 500, 5000, 50000]
+REPEAT = 5
+
+
+def main():
+    use_bench_database()
+    client = app.test_client()
+    print('{:>8} {:>8} {:>10}'.format('venues', 'queries', 'ms/page'))
+    with app.app_context():
+        statements = count_queries(db.engine)
+        for size in SIZES:
+            reset_database()
+            seed(venues=size)
+            client.get('/venues')  # warm up
+            del statements[:]
+            started = time.perf_counter()
+            for _ in range(REPEAT):
+                response = client.get('/venues')
+                assert response.status_code == 200
+            elapsed = (time.perf_counter() - started) / REPEAT
+            print('{:>8} {:>8} {:>10.1f}'.format(
+                size, len(statements) // REPEAT, elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()
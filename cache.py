@@ -0,0 +1,281 @@
+import pickle
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+from flask import has_request_context, request
+from models import app, Venue
+from pagination import decode_cursor
+from queries import VENUE_KEY, venue_areas, artist_list, show_list
+from jobs import enqueue, job
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+#----------------------------------------------------------------------------#
+# Backends.
+#----------------------------------------------------------------------------#
+
+# Entries are stored with a set of tags (e.g. the areas a /venues page shows)
+# so that a write can drop exactly the entries it affects.
+
+
+class MemoryCache(object):
+    # in-process LRU with per-entry expiry; an entry leaves its tag sets with
+    # it, however it goes, so the tag index stays as small as the cache
+
+    def __init__(self, max_entries=1024, default_timeout=300):
+        self.max_entries = max_entries
+        self.default_timeout = default_timeout
+        self.lock = Lock()
+        # key -> (value, expires, tags)
+        self.entries = OrderedDict()
+        self.tags = {}
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires, _ = entry
+            if expires < time.time():
+                self.remove_locked(key)
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None, tags=()):
+        timeout = timeout or self.default_timeout
+        tags = frozenset(tags)
+        with self.lock:
+            self.remove_locked(key)
+            self.entries[key] = (value, time.time() + timeout, tags)
+            for tag in tags:
+                self.tags.setdefault(tag, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self.remove_locked(next(iter(self.entries)))
+
+    def invalidate(self, *tags):
+        with self.lock:
+            for tag in tags:
+                for key in list(self.tags.get(tag, ())):
+                    self.remove_locked(key)
+
+    def remove_locked(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tags.clear()
+
+
+class RedisCache(object):
+    # any client with the redis-py interface works, e.g. a fakeredis instance
+
+    def __init__(self, client, prefix='fyyur:', default_timeout=300):
+        self.client = client
+        self.prefix = prefix
+        self.default_timeout = default_timeout
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else pickle.loads(value)
+
+    def set(self, key, value, timeout=None, tags=()):
+        timeout = timeout or self.default_timeout
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + key, pickle.dumps(value), ex=timeout)
+        for tag in tags:
+            tag_key = self.prefix + 'tag:' + tag
+            pipe.sadd(tag_key, key)
+            pipe.expire(tag_key, timeout)
+        pipe.execute()
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            tag_key = self.prefix + 'tag:' + tag
+            keys = [self.prefix + key.decode() if isinstance(key, bytes) else self.prefix + key
+                    for key in self.client.smembers(tag_key)]
+            self.client.delete(tag_key, *keys)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+def create_cache(app):
+    backend = app.config.get('CACHE_BACKEND', 'memory')
+    timeout = app.config.get('CACHE_DEFAULT_TIMEOUT', 300)
+    if backend == 'redis':
+        if redis is None:
+            raise RuntimeError('CACHE_BACKEND is redis but redis is not installed')
+        return RedisCache(redis.Redis.from_url(app.config['CACHE_REDIS_URL']),
+                          default_timeout=timeout)
+    return MemoryCache(app.config.get('CACHE_MAX_ENTRIES', 1024), timeout)
+
+
+cache = create_cache(app)
+
+#----------------------------------------------------------------------------#
+# Listing pages.
+#----------------------------------------------------------------------------#
+
+
+def area_tag(city, state):
+    return 'area:{}:{}'.format(state, city)
+
+
+# An entry is stored as (value, version), the version being the UTC time it
+# was computed and a random token. http_cache.py takes a listing page's
+# validators from the entry the page is rendered from, so the ETag always
+# names the body sent, even while an invalidation is still queued or another
+# process holds a newer entry.
+
+
+def listing_key(name, after=None, before=None):
+    return '{}:{}:{}'.format(name, after, before)
+
+
+def cache_entry(key):
+    # fetched once per request, for the validators and the view
+    if not has_request_context():
+        return cache.get(key)
+    entries = request_entries()
+    if key not in entries:
+        entries[key] = cache.get(key)
+    return entries[key]
+
+
+def request_entries():
+    entries = getattr(request, 'cache_entries', None)
+    if entries is None:
+        entries = request.cache_entries = {}
+    return entries
+
+
+def cached(key, compute, tags):
+    # tags is a function of the computed value
+    if not app.config.get('CACHE_ENABLED', True):
+        return compute()
+    entry = cache_entry(key)
+    if entry is None:
+        value = compute()
+        entry = (value, (datetime.utcnow(), uuid.uuid4().hex))
+        cache.set(key, entry, tags=tags(value))
+        if has_request_context():
+            request_entries()[key] = entry
+    return entry[0]
+
+
+def cached_version(key):
+    # (computed_at, token) of the entry for key, or None when there is none
+    if not app.config.get('CACHE_ENABLED', True):
+        return None
+    entry = cache_entry(key)
+    return None if entry is None else entry[1]
+
+
+def cached_venue_areas(after=None, before=None):
+    def tags(value):
+        areas = value[0]
+        tags = ['venues'] + [area_tag(area['city'], area['state']) for area in areas]
+        # a venue's shows change the upcoming count it is listed with
+        tags += ['venue:{}'.format(venue['id']) for area in areas for venue in area['venues']]
+        # a venue added at the end of the previous page's last area lands here
+        if after:
+            state, city = decode_cursor(after, VENUE_KEY)[:2]
+            tags.append(area_tag(city, state))
+        return tags
+    return cached(listing_key('venues', after, before),
+                  lambda: venue_areas(after=after, before=before), tags)
+
+
+def cached_artist_list(after=None, before=None):
+    return cached(listing_key('artists', after, before),
+                  lambda: artist_list(after=after, before=before),
+                  lambda value: ['artists'])
+
+
+def cached_show_list(after=None, before=None):
+    def tags(value):
+        shows = value[0]
+        return (['shows'] +
+                ['venue:{}'.format(show['venue_id']) for show in shows] +
+                ['artist:{}'.format(show['artist_id']) for show in shows])
+    return cached(listing_key('shows', after, before),
+                  lambda: show_list(after=after, before=before), tags)
+
+#----------------------------------------------------------------------------#
+# Invalidation.
+#----------------------------------------------------------------------------#
+
+
+def invalidate_later(function, *args):
+    # the request returns before the invalidation runs only when the cache is
+    # shared: a worker cannot reach the web processes' in-memory caches
+    if app.config.get('CACHE_BACKEND', 'memory') == 'redis':
+        enqueue(function, *args)
+    else:
+        function(*args)
+
+
+def invalidate_area(city, state):
+    # an area that just appeared or emptied moves the page boundaries around
+    # it, so only then are all /venues pages dropped
+    tags = [area_tag(city, state)]
+    if Venue.query.filter_by(city=city, state=state).count() <= 1:
+        tags.append('venues')
+    cache.invalidate(*tags)
+
+
+@job
+def invalidate_venue(venue_id, city, state, old_city=None, old_state=None):
+    invalidate_area(city, state)
+    if (old_city, old_state) != (None, None) and (old_city, old_state) != (city, state):
+        invalidate_area(old_city, old_state)
+    cache.invalidate('venue:{}'.format(venue_id))
+
+
+@job
+def invalidate_artist(artist_id=None, renamed=True):
+    # a new or renamed artist moves within the name-ordered listing
+    tags = ['artist:{}'.format(artist_id)] if artist_id else []
+    if renamed:
+        tags.append('artists')
+    cache.invalidate(*tags)
+
+
+@job
+def invalidate_deleted(kind, ids, counterpart_ids):
+    # deleted venues leave the /venues pages and their artists' pages; deleted
+    # artists also change the upcoming counts on /venues
+    singular, other = ('venue', 'artist') if kind == 'venues' else ('artist', 'venue')
+    tags = [kind, 'venues', 'shows'] + ['{}:{}'.format(singular, row_id) for row_id in ids]
+    tags += ['{}:{}'.format(other, row_id) for row_id in counterpart_ids]
+    cache.invalidate(*set(tags))
+
+
+@job
+def invalidate_imported(kind):
+    # imported rows can land on any page of their listing; imported shows
+    # change the upcoming counts on /venues and the /shows pages
+    cache.invalidate(*{'venues': ['venues'], 'artists': ['artists'],
+                       'shows': ['venues', 'shows']}[kind])
+
+
+@job
+def invalidate_venue_shows(venue_id):
+    # a show changes its venue's upcoming count on /venues and the /shows pages
+    cache.invalidate('venue:{}'.format(venue_id), 'shows')
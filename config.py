@@ -10,5 +10,183 @@ DEBUG = True
 
 
 # (Done) IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgres://postgres@localhost:5432/fyyur'
+SQLALCHEMY_DATABASE_URI = os.environ.get(
+    'DATABASE_URL', 'postgres://postgres@localhost:5432/fyyur')
 SQLALCHEMY_TRACK_MODIFICATIONS = False #hides warnings
+
+# Per-request SQL/template timing (Server-Timing header and Prometheus metrics)
+INSTRUMENTATION_ENABLED = True
+METRICS_URL = '/_metrics'
+
+# Number of results per page for venue and artist search
+SEARCH_PAGE_SIZE = 20
+
+# Number of venues, artists or shows per listing page
+LISTING_PAGE_SIZE = 50
+
+# Seconds a show books its venue and artist for when it is listed without an
+# end time; overlapping bookings are refused
+SHOW_DEFAULT_DURATION = 3 * 3600
+
+# Listing page cache: 'memory' (per process LRU) or 'redis'
+CACHE_ENABLED = True
+CACHE_BACKEND = 'memory'
+CACHE_REDIS_URL = 'redis://localhost:6379/0'
+CACHE_DEFAULT_TIMEOUT = 300
+CACHE_MAX_ENTRIES = 1024
+
+# ETag/Last-Modified validators on the listing and detail pages, and the
+# Cache-Control policy sent with them per endpoint
+HTTP_CACHE_ENABLED = True
+HTTP_CACHE_CONTROL = {
+    'default': 'no-cache',
+    'venues': 'public, max-age=60',
+    'artists': 'public, max-age=60',
+    'shows': 'public, max-age=60',
+}
+
+# Rows fetched and written per chunk by the streaming /api/v1 collections
+API_STREAM_CHUNK_SIZE = 1000
+
+# Bulk import (flask import / POST /api/v1/import/<kind>)
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_USE_COPY = True
+IMPORT_MAX_REPORTED_ERRORS = 1000
+
+# Export (flask export / GET /api/v1/export/<kind>)
+EXPORT_CHUNK_SIZE = 5000
+EXPORT_SAFETY_LAG = 60
+
+# Connection pool (PostgreSQL). Pre-ping replaces connections dropped by a
+# server restart; recycle is in seconds, the statement timeout in ms.
+# DB_PGBOUNCER leaves pooling to PgBouncer in transaction pooling mode.
+DB_POOL_SIZE = 5
+DB_MAX_OVERFLOW = 10
+DB_POOL_TIMEOUT = 30
+DB_POOL_RECYCLE = 1800
+DB_POOL_PRE_PING = True
+DB_STATEMENT_TIMEOUT = 5000
+DB_PGBOUNCER = False
+HEALTH_URL = '/_health'
+
+# Read replicas for the listing, detail, search and export endpoints, picked
+# per request by 'round_robin' or 'least_lag' (either way, replicas that are
+# unreachable or further behind than REPLICA_MAX_LAG seconds, checked every
+# REPLICA_LAG_CHECK_INTERVAL seconds, are skipped). Clients that wrote within
+# the last REPLICA_STICKY_SECONDS read from the primary. Listing cache entries
+# filled from a replica can be as old as its lag.
+SQLALCHEMY_REPLICA_URIS = []
+REPLICA_SELECTION = 'round_robin'
+REPLICA_MAX_LAG = 30
+REPLICA_LAG_CHECK_INTERVAL = 5
+REPLICA_STICKY_SECONDS = 10
+REPLICA_STICKY_COOKIE = 'fyyur_primary'
+REPLICA_ENDPOINTS = [
+    'venues', 'artists', 'shows', 'show_venue', 'show_artist',
+    'search_venues', 'search_artists',
+    'api.venues', 'api.venue', 'api.artists', 'api.artist', 'api.shows',
+    'api.search_entities', 'api.export_entities',
+]
+
+# Template rendering: memoised date formatting, cached show tiles (keyed by
+# their content) and templates compiled at startup. With DEBUG on, Jinja also
+# checks every template file for changes on each render.
+DATETIME_FORMAT_CACHE_SIZE = 8192
+FRAGMENT_CACHE_ENABLED = True
+FRAGMENT_CACHE_SIZE = 20000
+FRAGMENT_CACHE_TIMEOUT = 3600
+PRECOMPILE_TEMPLATES = True
+
+# Per-request profiling. A request with ?__profile=1 (=cprofile, =sampling)
+# and the token in an X-Profile-Token header or a __token argument is
+# profiled, as is a PROFILING_SAMPLE_RATE fraction of all requests. Traces are
+# kept in PROFILING_DIR (instance/profiles by default), the newest
+# PROFILING_KEEP of them, and shown under PROFILES_URL with the same token.
+PROFILING_ENABLED = False
+PROFILING_TOKEN = os.environ.get('FYYUR_PROFILING_TOKEN')
+PROFILING_MODE = 'cprofile'
+PROFILING_SAMPLE_RATE = 0.0
+PROFILING_SAMPLE_INTERVAL = 0.005
+PROFILING_DIR = None
+PROFILING_KEEP = 50
+PROFILES_URL = '/_profiles'
+
+# Logging: JSON lines written by a background thread to stderr, or to LOG_FILE
+# (e.g. os.path.join(basedir, 'logs', 'fyyur.log')) when set. The file is
+# reopened when logrotate moves it; LOG_MAX_BYTES or LOG_ROTATE_WHEN (e.g.
+# 'midnight') rotate it in-process instead, which is only safe when a single
+# process writes it. Events in LOG_SAMPLE_RATES are kept at that rate; failed
+# and slow requests are logged as 'request_failed' and 'slow_request' and
+# never sampled.
+LOG_ENABLED = True
+LOG_LEVEL = 'INFO'
+LOG_FILE = os.environ.get('FYYUR_LOG_FILE')
+LOG_MAX_BYTES = None
+LOG_ROTATE_WHEN = None
+LOG_BACKUP_COUNT = 5
+LOG_QUEUE_SIZE = 10000
+LOG_STDERR = False
+LOG_SLOW_REQUEST_MS = 1000
+LOG_SAMPLE_RATES = {'request': 0.1}
+
+# Static assets: "flask assets build" fingerprints everything under static/
+# into static/dist/ and concatenates these bundles (logical name: sources,
+# relative to static/). Until it has run, the sources are linked one by one.
+ASSET_BUNDLES = {
+    'css/fyyur.css': [
+        'css/bootstrap.min.css', 'css/layout.main.css', 'css/main.css',
+        'css/main.responsive.css', 'css/main.quickfix.css',
+    ],
+    'js/head.js': ['js/libs/modernizr-2.8.2.min.js', 'js/libs/moment.min.js'],
+    'js/fyyur.js': ['js/script.js', 'js/libs/bootstrap-3.1.1.min.js', 'js/plugins.js'],
+}
+
+# Image proxy: venue and artist images are fetched once, cut to these
+# (width, height) boxes and served from IMAGE_CACHE_DIR (instance/images by
+# default). The links are signed with IMAGE_PROXY_KEY, which must be the same
+# in every worker; without one the proxy is off and pages link the sources.
+# Sources on private addresses are refused unless IMAGE_ALLOW_PRIVATE is set.
+IMAGE_PROXY_ENABLED = True
+IMAGE_PROXY_KEY = os.environ.get('FYYUR_IMAGE_PROXY_KEY')
+IMAGE_SIZES = {'tile': (300, 300), 'detail': (600, 600)}
+IMAGE_QUALITY = 80
+IMAGE_CACHE_DIR = None
+IMAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+IMAGE_MAX_SOURCE_BYTES = 20 * 1024 * 1024
+IMAGE_FETCH_TIMEOUT = 10
+IMAGE_FAILURE_TIMEOUT = 60
+IMAGE_ALLOW_PRIVATE = False
+IMAGE_CACHE_CONTROL = 'public, max-age=86400'
+IMAGES_URL = '/images'
+
+# Background jobs, stored in the Job table and run by "flask jobs worker"
+# (JOB_WORKERS processes, plus a scheduler enqueuing the JOB_SCHEDULE jobs
+# every so many seconds). A failed job is retried after a random backoff of
+# up to JOB_BACKOFF_BASE * 2^(attempt - 1) seconds, at most JOB_BACKOFF_MAX,
+# until it has run JOB_MAX_ATTEMPTS times. A job still running after
+# JOB_LEASE_SECONDS is taken to be lost and run again. Finished jobs are
+# pruned after JOB_RETENTION seconds. JOBS_EAGER runs jobs when they are
+# enqueued, in the request, for tests and development without a worker.
+JOBS_EAGER = False
+JOB_WORKERS = 2
+JOB_POLL_INTERVAL = 1.0
+JOB_LEASE_SECONDS = 300
+JOB_MAX_ATTEMPTS = 5
+JOB_BACKOFF_BASE = 10
+JOB_BACKOFF_MAX = 3600
+JOB_RETENTION = 7 * 24 * 3600
+JOB_SCHEDULE = {
+    'counters_rollover': 60,
+    'feed_refresh': 300,
+    'prune_jobs': 3600,
+    'purge_deleted': 3600,
+}
+
+# Deleting venues and artists runs DELETE_CHUNK_SIZE ids per transaction.
+# SOFT_DELETE only hides them (deleted_at), and the purge_deleted run in
+# JOB_SCHEDULE deletes them later. The bulk delete, import and export APIs
+# (/api/v1/<kind>/bulk-delete, /api/v1/import/<kind>, /api/v1/export/<kind>)
+# are enabled by setting ADMIN_TOKEN, sent in their X-Admin-Token header.
+DELETE_CHUNK_SIZE = 500
+SOFT_DELETE = False
+ADMIN_TOKEN = os.environ.get('FYYUR_ADMIN_TOKEN')
@@ -0,0 +1,186 @@
+from datetime import datetime
+import click
+import dateutil.parser
+from sqlalchemy import case, event, func, inspect, or_, select
+from models import app, db, Venue, Artist, Show
+from cache import cache, area_tag
+from jobs import job
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+# Venue and Artist carry upcoming_shows_count, past_shows_count and
+# next_show_at. ORM writes to shows adjust them in the same flush, as relative
+# updates so that concurrent writers do not lose counts. A show only moves
+# from upcoming to past when the rollover runs (flask counters rollover, e.g.
+# every minute from the job scheduler or cron); it recomputes the rows whose
+# next_show_at has passed. Bulk writes (imports, seeding) call refresh_counters
+# themselves. Start times are naive local time, like datetime.now(); strings
+# and aware datetimes are converted to that before they are stored and counted.
+
+FOREIGN_KEYS = {Venue: 'venue_id', Artist: 'artist_id'}
+
+
+def foreign_key(model):
+    return getattr(Show, FOREIGN_KEYS[model])
+
+
+def next_show(model, now):
+    return select([func.min(Show.start_time)]).where(
+        foreign_key(model) == model.id).where(Show.start_time > now).as_scalar()
+
+
+def actual_counts(model, now):
+    # the counters as computed from the Show table, correlated to model.id
+    def count(condition):
+        return select([func.count(Show.id)]).where(
+            foreign_key(model) == model.id).where(condition).as_scalar()
+    return {
+        'upcoming_shows_count': count(Show.start_time > now),
+        'past_shows_count': count(Show.start_time <= now),
+        'next_show_at': next_show(model, now),
+    }
+
+
+def naive_local(value):
+    if isinstance(value, str):
+        value = dateutil.parser.parse(value)
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+
+def normalise_start_time(mapper, connection, show):
+    start_time = naive_local(show.start_time)
+    if start_time is not show.start_time:
+        show.start_time = start_time
+
+
+def adjust(connection, model, entity_id, start_time, delta, now):
+    table = model.__table__
+    start_time = naive_local(start_time)
+    if start_time > now:
+        values = {'upcoming_shows_count': table.c.upcoming_shows_count + delta}
+        if delta > 0:
+            values['next_show_at'] = case(
+                [(or_(table.c.next_show_at.is_(None), table.c.next_show_at > start_time),
+                  start_time)], else_=table.c.next_show_at)
+        else:
+            values['next_show_at'] = next_show(model, now)
+    else:
+        values = {'past_shows_count': table.c.past_shows_count + delta}
+    connection.execute(table.update().where(table.c.id == entity_id).values(**values))
+
+
+def show_added(mapper, connection, show):
+    now = datetime.now()
+    adjust(connection, Venue, show.venue_id, show.start_time, 1, now)
+    adjust(connection, Artist, show.artist_id, show.start_time, 1, now)
+
+
+def show_removed(mapper, connection, show):
+    now = datetime.now()
+    adjust(connection, Venue, show.venue_id, show.start_time, -1, now)
+    adjust(connection, Artist, show.artist_id, show.start_time, -1, now)
+
+
+def show_changed(mapper, connection, show):
+    state = inspect(show)
+    old = {}
+    for name in ('venue_id', 'artist_id', 'start_time'):
+        history = state.attrs[name].history
+        old[name] = history.deleted[0] if history.deleted else getattr(show, name)
+    if all(old[name] == getattr(show, name) for name in old):
+        return
+    now = datetime.now()
+    adjust(connection, Venue, old['venue_id'], old['start_time'], -1, now)
+    adjust(connection, Artist, old['artist_id'], old['start_time'], -1, now)
+    show_added(mapper, connection, show)
+
+
+event.listen(Show, 'before_insert', normalise_start_time)
+event.listen(Show, 'before_update', normalise_start_time)
+event.listen(Show, 'after_insert', show_added)
+event.listen(Show, 'after_delete', show_removed)
+event.listen(Show, 'after_update', show_changed)
+
+
+def refresh_counters(model, condition=None, now=None):
+    # recomputes the counters of the rows matching condition (all by default)
+    # in the session's transaction
+    statement = model.__table__.update().values(**actual_counts(model, now or datetime.now()))
+    if condition is not None:
+        statement = statement.where(condition)
+    return db.session.execute(statement).rowcount
+
+
+def rollover(now=None):
+    # returns the number of venues and artists whose counters were recomputed
+    now = now or datetime.now()
+    venues = db.session.query(Venue.id, Venue.city, Venue.state).filter(
+        Venue.next_show_at <= now).all()
+    refreshed = 0
+    if venues:
+        refreshed += refresh_counters(Venue, Venue.id.in_([venue.id for venue in venues]), now)
+    refreshed += refresh_counters(Artist, Artist.next_show_at <= now, now)
+    db.session.commit()
+    # /venues shows the upcoming counts; the other listings do not
+    if venues:
+        cache.invalidate(*set([area_tag(venue.city, venue.state) for venue in venues] +
+                              ['venue:{}'.format(venue.id) for venue in venues]))
+    return refreshed
+
+
+@job
+def counters_rollover():
+    rollover()
+
+
+def check_counters(model, fix=False, now=None):
+    # returns [(id, stored, actual)] for rows whose counters disagree with the
+    # Show table; rows already due for the rollover are not reported
+    now = now or datetime.now()
+    actual = actual_counts(model, now)
+    names = ['upcoming_shows_count', 'past_shows_count', 'next_show_at']
+    rows = db.session.query(
+        model.id, *([getattr(model, name) for name in names] +
+                    [actual[name].label('actual_' + name) for name in names])
+    ).filter(or_(model.next_show_at.is_(None), model.next_show_at > now)).filter(
+        or_(*[getattr(model, name).is_distinct_from(actual[name]) for name in names])
+    ).all()
+    mismatches = [(row[0], tuple(row[1:4]), tuple(row[4:7])) for row in rows]
+    if fix and mismatches:
+        refresh_counters(model, model.id.in_([row_id for row_id, _, _ in mismatches]), now)
+        db.session.commit()
+    return mismatches
+
+#----------------------------------------------------------------------------#
+# Command line.
+#----------------------------------------------------------------------------#
+
+
+@app.cli.group('counters')
+def counters_command():
+    """Maintain the per venue and per artist show counters."""
+
+
+@counters_command.command('rollover')
+def rollover_command():
+    """Move started shows from upcoming to past."""
+    click.echo('refreshed {} rows'.format(rollover()))
+
+
+@counters_command.command('check')
+@click.option('--fix', is_flag=True, help='Recompute the counters that disagree.')
+def check_command(fix):
+    """Compare the counters with the Show table."""
+    rollover()
+    failed = False
+    for model in (Venue, Artist):
+        for row_id, stored, actual in check_counters(model, fix):
+            failed = True
+            click.echo('{} {}: stored {}, actual {}'.format(
+                model.__tablename__, row_id, stored, actual), err=True)
+    if failed and not fix:
+        raise SystemExit(1)
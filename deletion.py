@@ -0,0 +1,130 @@
+from datetime import datetime
+import click
+from models import app, db, Venue, Artist, Show, ShowFeed
+from cache import invalidate_later, invalidate_deleted
+from counters import FOREIGN_KEYS, foreign_key, refresh_counters
+from jobs import job
+
+#----------------------------------------------------------------------------#
+# Deleting venues and artists.
+#----------------------------------------------------------------------------#
+
+# A venue or artist is deleted with its shows by a few set-based statements
+# per DELETE_CHUNK_SIZE ids, each chunk in its own transaction so that no
+# delete holds its locks for long. On PostgreSQL the Show foreign keys (and
+# the feed's) cascade; SQLite does not enforce them, so there the shows are
+# deleted first. The counterparts' show counters are recomputed in the same
+# transaction; the cached pages are dropped after each commit.
+#
+# With SOFT_DELETE the rows are only marked deleted_at, which hides them from
+# every listing, detail page and search at once, and the scheduled
+# purge_deleted job (JOB_SCHEDULE) deletes them later, never within the
+# request that hid them, even with JOBS_EAGER. Until then the counterparts' counters still count their
+# shows.
+
+KINDS = {'venues': Venue, 'artists': Artist}
+COUNTERPARTS = {Venue: Artist, Artist: Venue}
+feed = ShowFeed.__table__
+
+
+def kind_of(model):
+    return 'venues' if model is Venue else 'artists'
+
+
+def chunks(ids):
+    # sorted, so concurrent deletes take their row locks in the same order
+    ids = sorted(set(int(row_id) for row_id in ids))
+    size = app.config.get('DELETE_CHUNK_SIZE', 500)
+    for offset in range(0, len(ids), size):
+        yield ids[offset:offset + size]
+
+
+def counterpart_ids(model, ids):
+    # the artists that played the venues, or the venues the artists played
+    key = foreign_key(model)
+    other = foreign_key(COUNTERPARTS[model])
+    return [row_id for row_id, in db.session.query(other).filter(key.in_(ids)).distinct()]
+
+
+def delete_chunk(model, ids):
+    # returns the number of rows deleted and the counterpart ids whose counters
+    # changed, in the session's transaction
+    counterpart = COUNTERPARTS[model]
+    others = counterpart_ids(model, ids)
+    if db.engine.dialect.name != 'postgresql':
+        key = foreign_key(model)
+        db.session.execute(feed.delete().where(
+            feed.c[FOREIGN_KEYS[model]].in_(ids)))
+        db.session.execute(Show.__table__.delete().where(key.in_(ids)))
+    deleted = db.session.execute(
+        model.__table__.delete().where(model.id.in_(ids))).rowcount
+    if others:
+        refresh_counters(counterpart, counterpart.id.in_(others))
+    return deleted, others
+
+
+def delete_entities(model, ids):
+    # deletes the rows with these ids and their shows; returns the number deleted
+    deleted = 0
+    for chunk in chunks(ids):
+        try:
+            count, others = delete_chunk(model, chunk)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        deleted += count
+        invalidate_later(invalidate_deleted, kind_of(model), chunk, others)
+    return deleted
+
+
+def soft_delete(model, ids):
+    # hides the rows with these ids and their shows; returns the number hidden
+    table = model.__table__
+    hidden = 0
+    for chunk in chunks(ids):
+        try:
+            others = counterpart_ids(model, chunk)
+            count = db.session.execute(table.update().where(
+                table.c.id.in_(chunk) & table.c.deleted_at.is_(None)
+            ).values(deleted_at=datetime.utcnow(), updated_at=datetime.utcnow())).rowcount
+            # the feed would list their upcoming shows until the purge
+            db.session.execute(feed.delete().where(
+                feed.c[FOREIGN_KEYS[model]].in_(chunk)))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        hidden += count
+        invalidate_later(invalidate_deleted, kind_of(model), chunk, others)
+    return hidden
+
+
+def delete(model, ids, soft=None):
+    if soft is None:
+        soft = app.config.get('SOFT_DELETE', False)
+    return soft_delete(model, ids) if soft else delete_entities(model, ids)
+
+
+@job
+def purge_deleted(kind=None):
+    # deletes the soft deleted venues and artists (of one kind, or both)
+    purged = 0
+    for name, model in sorted(KINDS.items()):
+        if kind not in (None, name):
+            continue
+        ids = [row_id for row_id, in db.session.query(model.id).filter(
+            model.deleted_at.isnot(None))]
+        purged += delete_entities(model, ids)
+    return purged
+
+#----------------------------------------------------------------------------#
+# Command line.
+#----------------------------------------------------------------------------#
+
+
+@app.cli.command('purge-deleted')
+@click.argument('kind', required=False, type=click.Choice(sorted(KINDS)))
+def purge_command(kind):
+    """Delete the soft deleted venues and artists."""
+    click.echo('purged {}'.format(purge_deleted(kind)))
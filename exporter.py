@@ -0,0 +1,178 @@
+import csv
+import gzip
+import io
+import json
+import os
+import zlib
+from datetime import datetime, timedelta
+import click
+import dateutil.parser
+from models import app, db, Venue, Artist, Show
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+#----------------------------------------------------------------------------#
+# Export.
+#----------------------------------------------------------------------------#
+
+# Tables are read through a server-side cursor (stream_results + yield_per)
+# and written row group by row group, so neither the rows nor the output are
+# ever held in memory as a whole. With `since`, only rows whose updated_at
+# falls in (since, until] are exported; deletes are not captured.
+
+MODELS = {'venues': Venue, 'artists': Artist, 'shows': Show}
+FORMATS = ['csv', 'ndjson', 'columnar']
+# search_text is derived from the other columns
+SKIPPED_COLUMNS = ['search_text']
+
+
+def export_columns(model):
+    return [column for column in model.__table__.c
+            if column.name not in SKIPPED_COLUMNS]
+
+
+def encode_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def export_rows(model, since=None, until=None):
+    # yields lists of rows, each at most EXPORT_CHUNK_SIZE long
+    chunk_size = app.config.get('EXPORT_CHUNK_SIZE', 5000)
+    columns = export_columns(model)
+    query = db.session.query(*columns).order_by(model.id)
+    if since is not None:
+        query = query.filter(model.updated_at > since)
+    if until is not None:
+        query = query.filter(model.updated_at <= until)
+
+    chunk = []
+    for row in query.execution_options(stream_results=True).yield_per(chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def csv_chunks(columns, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.name for column in columns])
+    for rows in chunks:
+        for row in rows:
+            writer.writerow([';'.join(value) if isinstance(value, list) else encode_value(value)
+                             for value in row])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def ndjson_chunks(columns, chunks):
+    names = [column.name for column in columns]
+    for rows in chunks:
+        yield ''.join(json.dumps(dict(zip(names, [encode_value(value) for value in row]))) + '\n'
+                      for row in rows)
+
+
+def columnar_chunks(columns, chunks):
+    # one JSON object of column arrays per row group; the fallback for
+    # 'columnar' when pyarrow is not installed
+    names = [column.name for column in columns]
+    for rows in chunks:
+        yield json.dumps(dict((name, [encode_value(row[i]) for row in rows])
+                              for i, name in enumerate(names))) + '\n'
+
+
+TEXT_WRITERS = {'csv': csv_chunks, 'ndjson': ndjson_chunks, 'columnar': columnar_chunks}
+
+
+def write_parquet(path, columns, chunks):
+    writer = None
+    try:
+        for rows in chunks:
+            table = pyarrow.Table.from_pydict(dict(
+                (column.name, [row[i] for row in rows]) for i, column in enumerate(columns)))
+            if writer is None:
+                writer = pyarrow.parquet.ParquetWriter(path, table.schema, compression='gzip')
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def export_file(kind, format, directory, since=None, until=None):
+    # writes <directory>/<kind>-<until>.<ext> and returns its path
+    model = MODELS[kind]
+    columns = export_columns(model)
+    chunks = export_rows(model, since, until)
+    name = '{}-{}'.format(kind, (until or datetime.utcnow()).strftime('%Y%m%dT%H%M%S'))
+    if format == 'columnar' and pyarrow is not None:
+        path = os.path.join(directory, name + '.parquet')
+        write_parquet(path, columns, chunks)
+        return path
+
+    extension = 'columnar.ndjson' if format == 'columnar' else format
+    path = os.path.join(directory, '{}.{}.gz'.format(name, extension))
+    with gzip.open(path, 'wt', newline='') as f:
+        for text in TEXT_WRITERS[format](columns, chunks):
+            f.write(text)
+    return path
+
+
+def gzip_stream(texts):
+    # compresses a text stream incrementally for a chunked HTTP response
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for text in texts:
+        data = compressor.compress(text.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(kind, format, since=None):
+    model = MODELS[kind]
+    columns = export_columns(model)
+    return gzip_stream(TEXT_WRITERS[format](columns, export_rows(model, since)))
+
+#----------------------------------------------------------------------------#
+# Command line.
+#----------------------------------------------------------------------------#
+
+
+def read_state(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return dateutil.parser.parse(json.load(f)['until'])
+    return None
+
+
+@app.cli.command('export')
+@click.argument('directory', type=click.Path(file_okay=False))
+@click.option('--format', 'format', type=click.Choice(FORMATS), default='csv')
+@click.option('--kind', 'kinds', type=click.Choice(sorted(MODELS)), multiple=True,
+              help='Tables to export; defaults to all of them.')
+@click.option('--since', help='Only rows changed after this UTC timestamp.')
+@click.option('--incremental', is_flag=True,
+              help='Continue from the previous run recorded in DIRECTORY/export_state.json.')
+def export_command(directory, format, kinds, since, incremental):
+    """Export venues, artists and shows, optionally only what changed."""
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    state = os.path.join(directory, 'export_state.json')
+    since = dateutil.parser.parse(since) if since else (read_state(state) if incremental else None)
+    # rows committed by transactions still running at the cut-off may carry an
+    # older updated_at, so the window ends slightly in the past
+    until = datetime.utcnow() - timedelta(seconds=app.config.get('EXPORT_SAFETY_LAG', 60))
+
+    for kind in kinds or sorted(MODELS):
+        click.echo(export_file(kind, format, directory, since, until))
+    with open(state, 'w') as f:
+        json.dump({'until': until.isoformat()}, f)
@@ -1,18 +1,33 @@
+import os
 from fabric.api import local, settings, abort
 from fabric.contrib.console import confirm
 
 # prepare for deployment
 
 
+BASELINE = "benchmarks/results/baseline.json"
+RESULTS = "benchmarks/results/current.json"
+
+
 def test():
+    # runs the tests, then the route benchmark suite (against
+    # FYYUR_BENCH_DATABASE_URL) and compares it with the saved baseline
     with settings(warn_only=True):
-        result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
-        )
-    if result.failed and not confirm("Tests failed. Continue?"):
+        result = local("python -m pytest -q")
+        if not result.failed:
+            result = local("python -m benchmarks.suite --output " + RESULTS)
+        if not result.failed and os.path.exists(BASELINE):
+            result = local(
+                "python -m benchmarks.compare {} {}".format(BASELINE, RESULTS))
+    if result.failed and not confirm("Tests or benchmarks failed or regressed. Continue?"):
         abort("Aborted at user request.")
 
 
+def baseline():
+    # saves the last suite results as the baseline for test()
+    local("cp {} {}".format(RESULTS, BASELINE))
+
+
 def commit():
     message = raw_input("Enter a git commit message: ")
     local("git add . && git commit -am '{}'".format(message))
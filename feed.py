@@ -0,0 +1,127 @@
+from datetime import datetime
+import click
+from sqlalchemy import and_, event, exists, inspect, select
+from models import app, db, Venue, Artist, Show, ShowFeed
+from cache import cache
+from jobs import job
+
+#----------------------------------------------------------------------------#
+# Upcoming shows feed.
+#----------------------------------------------------------------------------#
+
+# ShowFeed holds the upcoming shows with their venue and artist names, so
+# /shows reads one table by its (start_time, show_id) index instead of joining
+# three. ORM writes to shows, venues and artists update it in the same flush.
+# "flask feed refresh" (or the feed_refresh job) drops the shows that
+# have started and reconciles the rest with the source tables; it runs as a
+# few set-based statements in one transaction, so readers keep seeing the old
+# rows until it commits. Bulk writes (imports, seeding) call refresh_feed.
+
+FEED_COLUMNS = ['show_id', 'start_time', 'venue_id', 'venue_name',
+                'artist_id', 'artist_name', 'artist_image_link']
+feed = ShowFeed.__table__
+
+
+def upcoming_shows(now):
+    # the feed's rows as computed from the source tables
+    return select([
+        Show.id, Show.start_time, Show.venue_id, Venue.name,
+        Show.artist_id, Artist.name, Artist.image_link
+    ]).select_from(
+        Show.__table__.join(Venue.__table__, Show.venue_id == Venue.id).join(
+            Artist.__table__, Show.artist_id == Artist.id)
+    ).where(Show.start_time > now).where(
+        Venue.deleted_at.is_(None) & Artist.deleted_at.is_(None))
+
+
+def changed(target, *names):
+    state = inspect(target)
+    return any(state.attrs[name].history.has_changes() for name in names)
+
+
+def show_added(mapper, connection, show):
+    connection.execute(feed.insert().from_select(
+        FEED_COLUMNS, upcoming_shows(datetime.now()).where(Show.id == show.id)))
+
+
+def show_removed(mapper, connection, show):
+    connection.execute(feed.delete().where(feed.c.show_id == show.id))
+
+
+def show_changed(mapper, connection, show):
+    if changed(show, 'venue_id', 'artist_id', 'start_time'):
+        show_removed(mapper, connection, show)
+        show_added(mapper, connection, show)
+
+
+def venue_changed(mapper, connection, venue):
+    if changed(venue, 'name'):
+        connection.execute(feed.update().where(feed.c.venue_id == venue.id).values(
+            venue_name=venue.name))
+
+
+def artist_changed(mapper, connection, artist):
+    if changed(artist, 'name', 'image_link'):
+        connection.execute(feed.update().where(feed.c.artist_id == artist.id).values(
+            artist_name=artist.name, artist_image_link=artist.image_link))
+
+
+event.listen(Show, 'after_insert', show_added)
+event.listen(Show, 'before_delete', show_removed)
+event.listen(Show, 'after_update', show_changed)
+event.listen(Venue, 'after_update', venue_changed)
+event.listen(Artist, 'after_update', artist_changed)
+
+
+def refresh_feed(now=None):
+    # brings the feed up to date in the session's transaction and returns the
+    # number of rows removed, renamed and added
+    now = now or datetime.now()
+    venue_name = select([Venue.name]).where(Venue.id == feed.c.venue_id).as_scalar()
+    artist_name = select([Artist.name]).where(Artist.id == feed.c.artist_id).as_scalar()
+    artist_image = select([Artist.image_link]).where(Artist.id == feed.c.artist_id).as_scalar()
+    current = exists().where(and_(
+        Show.id == feed.c.show_id,
+        Show.start_time == feed.c.start_time,
+        Show.venue_id == feed.c.venue_id,
+        Show.artist_id == feed.c.artist_id))
+
+    counts = {}
+    # started, deleted or moved shows; moved ones are added again below
+    counts['removed'] = db.session.execute(feed.delete().where(
+        (feed.c.start_time <= now) | ~current)).rowcount
+    counts['renamed'] = db.session.execute(feed.update().where(
+        feed.c.venue_name.is_distinct_from(venue_name) |
+        feed.c.artist_name.is_distinct_from(artist_name) |
+        feed.c.artist_image_link.is_distinct_from(artist_image)
+    ).values(venue_name=venue_name, artist_name=artist_name,
+             artist_image_link=artist_image)).rowcount
+    counts['added'] = db.session.execute(feed.insert().from_select(
+        FEED_COLUMNS, upcoming_shows(now).where(
+            ~exists().where(feed.c.show_id == Show.id)))).rowcount
+    return counts
+
+
+@job
+def feed_refresh():
+    counts = refresh_feed()
+    db.session.commit()
+    if any(counts.values()):
+        cache.invalidate('shows')
+    return counts
+
+#----------------------------------------------------------------------------#
+# Command line.
+#----------------------------------------------------------------------------#
+
+
+@app.cli.group('feed')
+def feed_command():
+    """Maintain the upcoming shows feed behind /shows."""
+
+
+@feed_command.command('refresh')
+def refresh_command():
+    """Drop started shows and reconcile the feed with the Show table."""
+    counts = feed_refresh()
+    click.echo('removed {removed}, renamed {renamed}, added {added}'.format(**counts))
@@ -1,7 +1,7 @@
 from datetime import datetime
 from flask_wtf import Form
 from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, RadioField
-from wtforms.validators import DataRequired, AnyOf, URL
+from wtforms.validators import DataRequired, AnyOf, URL, Optional, ValidationError
 
 
 class ShowForm(Form):
@@ -16,6 +16,16 @@ class ShowForm(Form):
         validators=[DataRequired()],
         default=datetime.today()
     )
+    # SHOW_DEFAULT_DURATION after the start when left empty
+    end_time = DateTimeField(
+        'end_time',
+        validators=[Optional()]
+    )
+
+    def validate_end_time(self, field):
+        if field.data is not None and self.start_time.data is not None and \
+                field.data <= self.start_time.data:
+            raise ValidationError('The show must end after it starts.')
 
 
 class VenueForm(Form):
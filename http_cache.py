@@ -0,0 +1,117 @@
+import hashlib
+from functools import wraps
+from flask import make_response, request, session
+from sqlalchemy import func
+from models import app, db, Venue, Artist, Show
+from cache import cached_version, listing_key
+
+#----------------------------------------------------------------------------#
+# Resource versions.
+#----------------------------------------------------------------------------#
+
+# Each version function returns (last_modified, parts); the ETag is a hash of
+# parts. The listing pages are served from the listing cache (cache.py), so
+# their version is the one of the cache entry the page is rendered from: no
+# queries, and the validators change exactly when the cached body does. The
+# detail pages take theirs from a few indexed queries on the entity and its
+# shows; counts are included so that deletes change the ETag. A show moving
+# from upcoming to past changes the counters of its venue and artist at the
+# next rollover (counters.py), which bumps their updated_at.
+
+
+def latest(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+def listing_version(name):
+    # None until the page is cached; conditional asks again after rendering
+    def version():
+        return cached_version(listing_key(
+            name, request.args.get('after'), request.args.get('before')))
+    return version
+
+
+venues_version = listing_version('venues')
+artists_version = listing_version('artists')
+shows_version = listing_version('shows')
+
+
+def detail_version(model, entity_id, foreign_key, counterpart, counterpart_key):
+    updated = db.session.query(model.updated_at).filter(
+        model.id == entity_id).scalar()
+    if updated is None:
+        return None
+    show_count, show_updated, other_updated = db.session.query(
+        func.count(Show.id),
+        func.max(Show.updated_at),
+        func.max(counterpart.updated_at)
+    ).join(counterpart, counterpart_key == counterpart.id).filter(
+        foreign_key == entity_id).one()
+    return latest(updated, show_updated, other_updated), (
+        updated, show_count, show_updated, other_updated)
+
+
+def venue_version(venue_id):
+    return detail_version(Venue, venue_id, Show.venue_id, Artist, Show.artist_id)
+
+
+def artist_version(artist_id):
+    return detail_version(Artist, artist_id, Show.artist_id, Venue, Show.venue_id)
+
+
+#----------------------------------------------------------------------------#
+# Conditional GETs.
+#----------------------------------------------------------------------------#
+
+
+def cache_control(endpoint):
+    policies = app.config.get('HTTP_CACHE_CONTROL', {})
+    return policies.get(endpoint, policies.get('default', 'no-cache'))
+
+
+def version_etag(parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def is_fresh(etag, last_modified, if_none_match, if_modified_since):
+    # if_none_match is a werkzeug ETags, if_modified_since a datetime or None;
+    # If-None-Match wins when both are sent
+    if if_none_match:
+        return etag in if_none_match
+    return (last_modified is not None and if_modified_since is not None and
+            last_modified.replace(microsecond=0) <= if_modified_since.replace(tzinfo=None))
+
+
+def conditional(version):
+    # answers If-None-Match / If-Modified-Since with a 304 before the view
+    # runs; otherwise renders and attaches the validators
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            # pages carrying a flashed message must be rendered to show it
+            if not app.config.get('HTTP_CACHE_ENABLED', True) or session.get('_flashes'):
+                return view(**kwargs)
+            current = version(**kwargs)
+            response = None
+            if current is None:
+                # nothing to validate against yet, e.g. a listing page that
+                # is not cached: render it, then take the version it left
+                response = make_response(view(**kwargs))
+                current = version(**kwargs)
+                if current is None or response.status_code != 200:
+                    return response
+            last_modified, parts = current
+            etag = version_etag(parts)
+
+            if response is None:
+                not_modified = is_fresh(etag, last_modified, request.if_none_match,
+                                        request.if_modified_since)
+                response = make_response(('', 304) if not_modified else view(**kwargs))
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.headers['Cache-Control'] = cache_control(request.endpoint)
+            return response
+        return wrapper
+    return decorator
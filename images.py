@@ -0,0 +1,353 @@
+import hashlib
+import hmac
+import io
+import ipaddress
+import os
+import socket
+import threading
+from http.client import HTTPConnection, HTTPSConnection
+from urllib.parse import urlsplit
+from urllib.error import HTTPError
+from urllib.request import (HTTPDefaultErrorHandler, HTTPErrorProcessor, HTTPHandler,
+                            HTTPRedirectHandler, HTTPSHandler, OpenerDirector, Request,
+                            UnknownHandler)
+from flask import abort, current_app, redirect, request, send_file, url_for
+from cache import MemoryCache
+from jobs import enqueue, job
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+#----------------------------------------------------------------------------#
+# Image proxy and thumbnail cache.
+#----------------------------------------------------------------------------#
+
+# thumbnail_url(image_link, size) links /images/<size>/<signature>?url=...,
+# signed with IMAGE_PROXY_KEY so that the route only fetches URLs the app
+# itself rendered; without a key the proxy is off and pages link the sources
+# directly. The first request for a source downloads it once; the original is stored by the
+# SHA-256 of its content and the source URL just points at that hash, so the
+# same picture behind several URLs is stored once. Thumbnails are cut to the
+# fixed IMAGE_SIZES box and stored next to it, as WebP for clients that
+# accept it and JPEG otherwise. The cache is kept under IMAGE_CACHE_MAX_BYTES
+# by evicting the least recently served files. Without Pillow the originals
+# are cached and served as they are. Sources that fail are not retried for
+# IMAGE_FAILURE_TIMEOUT seconds; until then the client is sent to the source.
+# warm_later(image_link) fills the cache from a background job when a venue or
+# artist is saved, so the first visitor does not wait for the fetch.
+
+FORMATS = {'webp': ('WEBP', 'image/webp'), 'jpeg': ('JPEG', 'image/jpeg')}
+CHUNK_SIZE = 64 * 1024
+KEY_LOCKS = 64
+# leading bytes of the formats served as they are when Pillow is missing
+SIGNATURES = [(b'\xff\xd8\xff', 'image/jpeg'), (b'\x89PNG', 'image/png'),
+              (b'GIF8', 'image/gif'), (b'RIFF', 'image/webp')]
+
+
+class FetchError(Exception):
+    pass
+
+
+def sign(source, size):
+    key = current_app.config['IMAGE_PROXY_KEY']
+    if isinstance(key, str):
+        key = key.encode()
+    message = '{}\n{}'.format(size, source).encode()
+    return hmac.new(key, message, hashlib.sha256).hexdigest()[:32]
+
+
+def proxied(source):
+    config = current_app.config
+    return (config.get('IMAGE_PROXY_ENABLED', True) and bool(config.get('IMAGE_PROXY_KEY')) and
+            bool(source) and urlsplit(source).scheme in ('http', 'https'))
+
+
+def thumbnail_url(source, size='tile'):
+    if not proxied(source):
+        return source
+    return url_for('image', size=size, signature=sign(source, size), url=source)
+
+#----------------------------------------------------------------------------#
+# Disk cache.
+#----------------------------------------------------------------------------#
+
+
+class ImageCache(object):
+    # content-addressed files under directory: sources/<sha256 of the URL>
+    # holds the hash of the original, originals/<hash> its bytes and
+    # thumbnails/<hash>-<size>.<format> the resized copies. A file's mtime is
+    # its last use; eviction removes the oldest until the cache is at
+    # low_water of max_bytes.
+
+    def __init__(self, directory, max_bytes, low_water=0.9):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self.lock = threading.Lock()
+        self.size = None
+        # one fetch or resize per key at a time, from a fixed set of locks
+        self.key_locks = [threading.Lock() for _ in range(KEY_LOCKS)]
+
+    def path(self, kind, name):
+        return os.path.join(self.directory, kind, name[:2], name)
+
+    def key_lock(self, key):
+        return self.key_locks[int(hashlib.sha1(key.encode()).hexdigest()[:8], 16) % KEY_LOCKS]
+
+    def get(self, kind, name):
+        path = self.path(kind, name)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def put(self, kind, name, content):
+        path = self.path(kind, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # written aside and renamed, so readers never see half a file
+        temporary = '{}.{}.tmp'.format(path, threading.get_ident())
+        with open(temporary, 'wb') as f:
+            f.write(content)
+        os.replace(temporary, path)
+        with self.lock:
+            if self.size is None:
+                self.size = sum(size for _, _, size in self.files())
+            else:
+                self.size += len(content)
+            over = self.size > self.max_bytes
+        if over:
+            self.evict(keep=path)
+        return path
+
+    def files(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield stat.st_mtime, path, stat.st_size
+
+    def evict(self, keep=None):
+        # keep is the file just written, which its caller is about to use
+        with self.lock:
+            files = sorted(self.files())
+            total = sum(size for _, _, size in files)
+            target = self.max_bytes * self.low_water
+            for _, path, size in files:
+                if total <= target:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+            self.size = total
+
+
+caches = {}
+failures = MemoryCache(10000, 60)
+
+
+def image_cache():
+    config = current_app.config
+    directory = config.get('IMAGE_CACHE_DIR') or os.path.join(current_app.instance_path, 'images')
+    if directory not in caches:
+        caches[directory] = ImageCache(directory, config.get('IMAGE_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+    return caches[directory]
+
+#----------------------------------------------------------------------------#
+# Fetching and resizing.
+#----------------------------------------------------------------------------#
+
+
+def check_host(host, port):
+    # returns the address to connect to; the proxy must not be turned on the
+    # internal network
+    try:
+        addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise FetchError('cannot resolve {}: {}'.format(host, e))
+    if not current_app.config.get('IMAGE_ALLOW_PRIVATE', False):
+        for address in addresses:
+            ip = ipaddress.ip_address(address[4][0])
+            if ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved:
+                raise FetchError('{} resolves to {}'.format(host, ip))
+    return addresses[0][4][:2]
+
+
+# Every connection, redirects included, goes to the address check_host
+# approved, so a second lookup cannot swap in another one (DNS rebinding).
+# HTTPS still sends and verifies the host name. The opener has no handlers
+# for other schemes (ftp:, file:, data:) or proxies, and redirects may only
+# lead to http and https URLs.
+
+
+class CheckedHTTPConnection(HTTPConnection):
+    def connect(self):
+        self.sock = socket.create_connection(check_host(self.host, self.port),
+                                             self.timeout, self.source_address)
+
+
+class CheckedHTTPSConnection(HTTPSConnection, CheckedHTTPConnection):
+    # HTTPSConnection.connect wraps what CheckedHTTPConnection.connect opened
+    pass
+
+
+class CheckedHTTPHandler(HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(CheckedHTTPConnection, req)
+
+
+class CheckedHTTPSHandler(HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(CheckedHTTPSConnection, req, context=self._context)
+
+
+class CheckedRedirectHandler(HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        if urlsplit(newurl).scheme not in ('http', 'https'):
+            raise HTTPError(req.full_url, code, 'redirect to {} refused'.format(newurl),
+                            headers, fp)
+        return super(CheckedRedirectHandler, self).redirect_request(
+            req, fp, code, msg, headers, newurl)
+
+
+def opener():
+    # only the handlers above, unlike build_opener, which adds the defaults;
+    # UnknownHandler refuses every other scheme
+    director = OpenerDirector()
+    for handler in (CheckedHTTPHandler(), CheckedHTTPSHandler(), CheckedRedirectHandler(),
+                    HTTPDefaultErrorHandler(), HTTPErrorProcessor(), UnknownHandler()):
+        director.add_handler(handler)
+    return director
+
+
+def fetch(source):
+    config = current_app.config
+    limit = config.get('IMAGE_MAX_SOURCE_BYTES', 20 * 1024 * 1024)
+    try:
+        response = opener().open(
+            Request(source, headers={'User-Agent': 'fyyur-image-proxy'}),
+            timeout=config.get('IMAGE_FETCH_TIMEOUT', 10))
+        with response:
+            if not response.headers.get('Content-Type', '').startswith('image/'):
+                raise FetchError('{} is not an image'.format(source))
+            chunks, total = [], 0
+            for chunk in iter(lambda: response.read(CHUNK_SIZE), b''):
+                total += len(chunk)
+                if total > limit:
+                    raise FetchError('{} is larger than {} bytes'.format(source, limit))
+                chunks.append(chunk)
+    except (OSError, ValueError) as e:
+        raise FetchError('cannot fetch {}: {}'.format(source, e))
+    return b''.join(chunks)
+
+
+def original(cache, source):
+    # the path of the cached original, fetched on first use
+    source_key = hashlib.sha256(source.encode()).hexdigest()
+    with cache.key_lock(source_key):
+        pointer = cache.get('sources', source_key)
+        if pointer is not None:
+            with open(pointer) as f:
+                path = cache.get('originals', f.read().strip())
+            if path is not None:
+                return path
+        content = fetch(source)
+        digest = hashlib.sha256(content).hexdigest()
+        path = cache.put('originals', digest, content)
+        cache.put('sources', source_key, digest.encode())
+        return path
+
+
+def resize(path, box, image_format):
+    with Image.open(path) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        if image_format == 'JPEG' and image.mode == 'RGBA':
+            image = image.convert('RGB')
+        thumbnail = ImageOps.fit(image, box, Image.LANCZOS)
+        output = io.BytesIO()
+        thumbnail.save(output, image_format,
+                       quality=current_app.config.get('IMAGE_QUALITY', 80))
+        return output.getvalue()
+
+
+def thumbnail(cache, path, size, format_name):
+    box = current_app.config.get('IMAGE_SIZES', {})[size]
+    name = '{}-{}.{}'.format(os.path.basename(path), size, format_name)
+    with cache.key_lock(name):
+        cached = cache.get('thumbnails', name)
+        if cached is not None:
+            return cached
+        return cache.put('thumbnails', name, resize(path, box, FORMATS[format_name][0]))
+
+
+@job
+def warm_images(source):
+    # every size in every format; a failure is retried by the job queue
+    cache = image_cache()
+    path = original(cache, source)
+    if Image is not None:
+        for size in current_app.config.get('IMAGE_SIZES', {}):
+            for format_name in FORMATS:
+                thumbnail(cache, path, size, format_name)
+
+
+def warm_later(source):
+    if proxied(source):
+        enqueue(warm_images, source)
+
+
+def sniff(path):
+    with open(path, 'rb') as f:
+        head = f.read(16)
+    for prefix, mimetype in SIGNATURES:
+        if head.startswith(prefix):
+            return mimetype
+    return 'application/octet-stream'
+
+#----------------------------------------------------------------------------#
+# Route.
+#----------------------------------------------------------------------------#
+
+
+def image(size, signature):
+    source = request.args.get('url', '')
+    if (not proxied(source) or size not in current_app.config.get('IMAGE_SIZES', {}) or
+            not hmac.compare_digest(signature, sign(source, size))):
+        abort(404)
+    if failures.get(source) is not None:
+        return redirect(source)
+    cache = image_cache()
+    try:
+        path = original(cache, source)
+        if Image is None:
+            response = send_file(path, mimetype=sniff(path))
+        else:
+            format_name = 'webp' if request.accept_mimetypes['image/webp'] else 'jpeg'
+            path = thumbnail(cache, path, size, format_name)
+            response = send_file(path, mimetype=FORMATS[format_name][1])
+    except Exception as e:
+        # unreachable sources, and sources Pillow cannot (or will not) decode
+        current_app.logger.warning('image proxy: %s', e)
+        failures.set(source, True, current_app.config.get('IMAGE_FAILURE_TIMEOUT', 60))
+        return redirect(source)
+    response.headers['Vary'] = 'Accept'
+    response.headers['Cache-Control'] = current_app.config.get(
+        'IMAGE_CACHE_CONTROL', 'public, max-age=86400')
+    return response
+
+
+def init_images(app):
+    app.jinja_env.globals['thumbnail_url'] = thumbnail_url
+    app.add_url_rule(app.config.get('IMAGES_URL', '/images') + '/<size>/<signature>',
+                     'image', image)
@@ -0,0 +1,286 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from types import SimpleNamespace
+import click
+from sqlalchemy.exc import IntegrityError
+from werkzeug.datastructures import MultiDict
+from models import app, db, Venue, Artist, Show, show_end
+from forms import VenueForm, ArtistForm, ShowForm
+from search import build_search_text
+from cache import invalidate_imported
+from counters import refresh_counters
+from feed import refresh_feed
+from scheduling import booking_conflicts
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#----------------------------------------------------------------------------#
+
+# Rows are read lazily from CSV or NDJSON, validated with the same form rules
+# as the create pages, and written in chunks with one executemany (or COPY on
+# PostgreSQL) and one commit per chunk. Rows that fail validation are reported
+# with their line number and skipped, as are malformed NDJSON lines and shows
+# that would double-book a venue or artist (scheduling.py). A chunk the
+# database refuses (e.g. a duplicate explicit id) is written again row by row
+# so that only the offending rows are rejected. After every chunk the last
+# committed line is written to a checkpoint file so an interrupted import can
+# be resumed.
+
+MODELS = {'venues': Venue, 'artists': Artist, 'shows': Show}
+FORMS = {'venues': VenueForm, 'artists': ArtistForm, 'shows': ShowForm}
+FIELDS = {
+    'venues': ['name', 'city', 'state', 'address', 'phone', 'genres', 'image_link',
+               'facebook_link', 'website', 'seeking_talent', 'seeking_description'],
+    'artists': ['name', 'city', 'state', 'phone', 'genres', 'image_link',
+                'facebook_link', 'website', 'seeking_venue', 'seeking_description'],
+    'shows': ['venue_id', 'artist_id', 'start_time', 'end_time'],
+}
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('true', 't', 'yes', 'y', '1')
+
+
+def read_rows(stream, format):
+    # yields (line_number, row) pairs; genres may be a list or "a;b" in CSV.
+    # An NDJSON line that is not a JSON object comes with a None row
+    if format == 'csv':
+        for line_number, row in enumerate(csv.DictReader(stream), start=2):
+            if row.get('genres') is not None:
+                row['genres'] = [genre for genre in row['genres'].split(';') if genre]
+            yield line_number, row
+    else:
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+
+
+def integer(values, errors, field, value):
+    try:
+        values[field] = int(value)
+    except (TypeError, ValueError):
+        errors[field] = ['Not a valid integer value.']
+
+
+def validate(kind, row):
+    # returns (values, errors) using the rules of the matching create form
+    formdata = MultiDict()
+    for field, value in row.items():
+        if isinstance(value, list):
+            formdata.setlist(field, [str(item) for item in value])
+        elif value is not None:
+            formdata[field] = str(value)
+    form = FORMS[kind](formdata=formdata, meta={'csrf': False})
+    if not form.validate():
+        return None, form.errors
+
+    values = dict((field, form.data.get(field)) for field in FIELDS[kind])
+    errors = {}
+    if kind == 'shows':
+        integer(values, errors, 'venue_id', values['venue_id'])
+        integer(values, errors, 'artist_id', values['artist_id'])
+        values['end_time'] = values['end_time'] or show_end(values['start_time'])
+    else:
+        # the radio fields coerce any non-empty string to True
+        seeking = 'seeking_talent' if kind == 'venues' else 'seeking_venue'
+        values[seeking] = parse_bool(row.get(seeking, False))
+        # bulk writes skip the mapper events that normally fill these in
+        values['search_text'] = build_search_text(SimpleNamespace(**values))
+        values.update(upcoming_shows_count=0, past_shows_count=0, next_show_at=None)
+    values['updated_at'] = datetime.utcnow()
+    if row.get('id'):
+        integer(values, errors, 'id', row['id'])
+    if errors:
+        return None, errors
+    return values, None
+
+
+def missing_references(rows):
+    # shows whose venue or artist does not exist, checked with one query each
+    venue_ids = set(values['venue_id'] for _, values in rows)
+    artist_ids = set(values['artist_id'] for _, values in rows)
+    venues = set(row_id for row_id, in db.session.query(Venue.id).filter(
+        Venue.id.in_(venue_ids), Venue.deleted_at.is_(None)))
+    artists = set(row_id for row_id, in db.session.query(Artist.id).filter(
+        Artist.id.in_(artist_ids), Artist.deleted_at.is_(None)))
+    errors = []
+    for line_number, values in rows:
+        if values['venue_id'] not in venues:
+            errors.append((line_number, {'venue_id': ['Unknown venue']}))
+        elif values['artist_id'] not in artists:
+            errors.append((line_number, {'artist_id': ['Unknown artist']}))
+    return errors
+
+
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, list):
+        return '{' + ','.join('"{}"'.format(item.replace('\\', '\\\\').replace('"', '\\"'))
+                              for item in value) + '}'
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def write_chunk(table, rows):
+    # every row in a chunk has the same keys, so one statement covers them all
+    if db.engine.dialect.name == 'postgresql' and app.config.get('IMPORT_USE_COPY', True):
+        columns = list(rows[0])
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([copy_value(row[column]) for column in columns])
+        buffer.seek(0)
+        cursor = db.session.connection().connection.cursor()
+        cursor.copy_expert('COPY "{}" ({}) FROM STDIN WITH CSV NULL \'\\N\''.format(
+            table.name, ', '.join('"{}"'.format(column) for column in columns)), buffer)
+    else:
+        db.session.execute(table.insert(), rows)
+
+
+def sync_sequence(model):
+    # explicit ids do not advance the PostgreSQL sequence
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(
+            'SELECT setval(pg_get_serial_sequence(\'"{0}"\', \'id\'), '
+            'coalesce(max(id), 1)) FROM "{0}"'.format(model.__tablename__))
+        db.session.commit()
+
+
+def import_rows(kind, stream, format='csv', chunk_size=None, checkpoint=None, on_error=None):
+    # returns {imported, failed, lines}; on_error(line_number, errors) is
+    # called for every rejected row
+    model = MODELS[kind]
+    chunk_size = chunk_size or app.config.get('IMPORT_CHUNK_SIZE', 1000)
+    resume_after = 0
+    if checkpoint and os.path.exists(checkpoint):
+        with open(checkpoint) as f:
+            resume_after = json.load(f)['line']
+
+    summary = {'imported': 0, 'failed': 0, 'lines': resume_after}
+    explicit_ids = False
+
+    def report(line_number, errors):
+        summary['failed'] += 1
+        if on_error:
+            on_error(line_number, errors)
+
+    def write(chunk):
+        # rows with and without explicit ids are written separately
+        for has_id in (True, False):
+            rows = [values for _, values in chunk if ('id' in values) == has_id]
+            if rows:
+                write_chunk(model.__table__, rows)
+        if kind == 'shows':
+            # the counter events do not see bulk writes either
+            refresh_counters(Venue, Venue.id.in_(set(values['venue_id'] for _, values in chunk)))
+            refresh_counters(Artist, Artist.id.in_(set(values['artist_id'] for _, values in chunk)))
+        db.session.commit()
+
+    def flush(chunk, last_line):
+        if kind == 'shows':
+            for check in (missing_references, booking_conflicts):
+                rejected = check(chunk)
+                for line_number, errors in rejected:
+                    report(line_number, errors)
+                rejected_lines = set(line_number for line_number, _ in rejected)
+                chunk = [item for item in chunk if item[0] not in rejected_lines]
+        if chunk:
+            try:
+                write(chunk)
+            except IntegrityError:
+                db.session.rollback()
+                written = []
+                for item in chunk:
+                    try:
+                        write([item])
+                    except IntegrityError as e:
+                        db.session.rollback()
+                        report(item[0], {'row': [str(e.orig).strip().splitlines()[0]]})
+                    else:
+                        written.append(item)
+                chunk = written
+        summary['imported'] += len(chunk)
+        summary['lines'] = last_line
+        if checkpoint:
+            with open(checkpoint, 'w') as f:
+                json.dump({'line': last_line}, f)
+
+    chunk = []
+    line_number = resume_after
+    try:
+        for line_number, row in read_rows(stream, format):
+            if line_number <= resume_after:
+                continue
+            if row is None:
+                report(line_number, {'row': ['Not a JSON object.']})
+                continue
+            values, errors = validate(kind, row)
+            if errors:
+                report(line_number, errors)
+                continue
+            explicit_ids = explicit_ids or 'id' in values
+            chunk.append((line_number, values))
+            if len(chunk) >= chunk_size:
+                flush(chunk, line_number)
+                chunk = []
+        flush(chunk, line_number)
+        if kind == 'shows':
+            refresh_feed()
+            db.session.commit()
+    except:
+        db.session.rollback()
+        raise
+    finally:
+        db.session.close()
+
+    if explicit_ids:
+        sync_sequence(model)
+    # dropped by tag through the configured backend, so with the Redis cache
+    # every web process sees it, even when the import ran on another host (a
+    # memory cache is per process; the other processes' entries expire). The
+    # in-memory search indexes notice the new rows by themselves
+    invalidate_imported(kind)
+    return summary
+
+#----------------------------------------------------------------------------#
+# Command line.
+#----------------------------------------------------------------------------#
+
+
+@app.cli.command('import')
+@click.argument('kind', type=click.Choice(sorted(MODELS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'format', type=click.Choice(['csv', 'ndjson']),
+              help='Defaults to the file extension.')
+@click.option('--chunk-size', type=int, help='Rows per INSERT/COPY and commit.')
+@click.option('--resume/--no-resume', default=True,
+              help='Continue from PATH.checkpoint if it exists.')
+def import_command(kind, path, format, chunk_size, resume):
+    """Import venues, artists or shows from a CSV or NDJSON file."""
+    format = format or ('csv' if path.endswith('.csv') else 'ndjson')
+    checkpoint = path + '.checkpoint'
+    if not resume and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+
+    def on_error(line_number, errors):
+        click.echo('line {}: {}'.format(line_number, json.dumps(errors)), err=True)
+
+    with open(path, newline='') as stream:
+        summary = import_rows(kind, stream, format, chunk_size, checkpoint, on_error)
+    click.echo('imported {imported} rows, {failed} rejected'.format(**summary))
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
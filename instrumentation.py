@@ -0,0 +1,209 @@
+import time
+from threading import Lock
+from flask import Response, current_app, g, has_request_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from pool import pool_status
+
+#----------------------------------------------------------------------------#
+# Per-request SQL and template timing.
+#----------------------------------------------------------------------------#
+
+# statements longer than this are cut short in the metrics output
+STATEMENT_PREVIEW = 200
+
+
+class RequestStats(object):
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_started = None
+        self.slowest_time = 0.0
+        self.slowest_statement = None
+
+
+class EndpointStats(object):
+    def __init__(self):
+        self.requests = 0
+        self.statements = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.total_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement = None
+
+
+endpoints = {}
+endpoints_lock = Lock()
+
+
+def current_stats():
+    if has_request_context():
+        return g.get('request_stats')
+    return None
+
+
+# engines are recreated when SQLALCHEMY_DATABASE_URI changes (e.g. in the
+# benchmarks), so listen on the Engine class rather than a single instance.
+# The start is kept on the statement's execution context, which goes away
+# with it, so a statement that raises leaves nothing behind on the connection
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_start = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_start
+    stats = current_stats()
+    if stats is None:
+        return
+    stats.statements += 1
+    stats.db_time += elapsed
+    if elapsed > stats.slowest_time:
+        stats.slowest_time = elapsed
+        stats.slowest_statement = statement
+
+
+def start_template(sender, template, context, **extra):
+    stats = current_stats()
+    if stats is not None:
+        stats.template_started = time.perf_counter()
+
+
+def finish_template(sender, template, context, **extra):
+    stats = current_stats()
+    if stats is not None and stats.template_started is not None:
+        stats.template_time += time.perf_counter() - stats.template_started
+        stats.template_started = None
+
+
+def start_request():
+    g.request_stats = RequestStats()
+
+
+def finish_request(response):
+    stats = current_stats()
+    if stats is None:
+        return response
+    total_time = time.perf_counter() - stats.started
+
+    response.headers['Server-Timing'] = ', '.join([
+        'db;dur={:.2f};desc="{} queries"'.format(
+            stats.db_time * 1000, stats.statements),
+        'tpl;dur={:.2f}'.format(stats.template_time * 1000),
+        'total;dur={:.2f}'.format(total_time * 1000)
+    ])
+
+    with endpoints_lock:
+        endpoint = endpoints.setdefault(
+            request.endpoint or 'unknown', EndpointStats())
+        endpoint.requests += 1
+        endpoint.statements += stats.statements
+        endpoint.db_time += stats.db_time
+        endpoint.template_time += stats.template_time
+        endpoint.total_time += total_time
+        if stats.slowest_time > endpoint.slowest_time:
+            endpoint.slowest_time = stats.slowest_time
+            endpoint.slowest_statement = stats.slowest_statement
+
+    return response
+
+#----------------------------------------------------------------------------#
+# Prometheus text exposition.
+#----------------------------------------------------------------------------#
+
+
+METRICS = [
+    ('fyyur_requests_total', 'counter',
+     'Requests handled per endpoint.', 'requests'),
+    ('fyyur_db_statements_total', 'counter',
+     'SQL statements executed per endpoint.', 'statements'),
+    ('fyyur_db_seconds_total', 'counter',
+     'Time spent executing SQL per endpoint.', 'db_time'),
+    ('fyyur_template_seconds_total', 'counter',
+     'Time spent rendering templates per endpoint.', 'template_time'),
+    ('fyyur_request_seconds_total', 'counter',
+     'Total time spent handling requests per endpoint.', 'total_time'),
+]
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+def render_metrics():
+    with endpoints_lock:
+        snapshot = sorted(endpoints.items())
+
+    lines = []
+    for name, kind, description, attribute in METRICS:
+        lines.append('# HELP {} {}'.format(name, description))
+        lines.append('# TYPE {} {}'.format(name, kind))
+        for endpoint, stats in snapshot:
+            lines.append('{}{{endpoint="{}"}} {}'.format(
+                name, escape_label(endpoint), getattr(stats, attribute)))
+
+    lines.append(
+        '# HELP fyyur_db_slowest_statement_seconds Slowest SQL statement seen per endpoint.')
+    lines.append('# TYPE fyyur_db_slowest_statement_seconds gauge')
+    for endpoint, stats in snapshot:
+        if stats.slowest_statement is None:
+            continue
+        statement = ' '.join(stats.slowest_statement.split())
+        lines.append('fyyur_db_slowest_statement_seconds{{endpoint="{}",statement="{}"}} {}'.format(
+            escape_label(endpoint),
+            escape_label(statement[:STATEMENT_PREVIEW]),
+            stats.slowest_time))
+
+    # connection pool gauges, the same numbers /_health reports
+    status = pool_status(current_app.extensions['sqlalchemy'].db.engine)
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        if name in status:
+            lines.append('# HELP fyyur_db_pool_{0} Connection pool {0}.'.format(name))
+            lines.append('# TYPE fyyur_db_pool_{} gauge'.format(name))
+            lines.append('fyyur_db_pool_{} {}'.format(name, status[name]))
+
+    # log records dropped because the logging queue was full
+    handler = current_app.extensions.get('logging')
+    if handler is not None:
+        lines.append('# HELP fyyur_log_dropped_total Log records dropped on a full queue.')
+        lines.append('# TYPE fyyur_log_dropped_total counter')
+        lines.append('fyyur_log_dropped_total {}'.format(handler.dropped))
+
+    # background jobs per name and status, and how late the queue runs
+    job_counts = current_app.extensions.get('jobs')
+    if job_counts is not None:
+        try:
+            counts, lag = job_counts()
+        except SQLAlchemyError:
+            current_app.logger.exception('job metrics unavailable')
+        else:
+            lines.append('# HELP fyyur_jobs Background jobs per name and status.')
+            lines.append('# TYPE fyyur_jobs gauge')
+            for name, status, count in sorted(counts):
+                lines.append('fyyur_jobs{{name="{}",status="{}"}} {}'.format(
+                    escape_label(name), status, count))
+            lines.append('# HELP fyyur_jobs_lag_seconds Wait of the oldest due job.')
+            lines.append('# TYPE fyyur_jobs_lag_seconds gauge')
+            lines.append('fyyur_jobs_lag_seconds {}'.format(lag))
+
+    return '\n'.join(lines) + '\n'
+
+
+def metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
+def init_instrumentation(app):
+    if not app.config.get('INSTRUMENTATION_ENABLED', True):
+        return
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    before_render_template.connect(start_template, app)
+    template_rendered.connect(finish_template, app)
+    app.add_url_rule(app.config.get('METRICS_URL', '/_metrics'),
+                     'metrics', metrics)
@@ -0,0 +1,303 @@
+import json
+import multiprocessing
+import os
+import random
+import signal
+import time
+from datetime import datetime, timedelta
+import click
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.exc import IntegrityError
+from models import app, db, Job
+from logs import restart_logging
+
+#----------------------------------------------------------------------------#
+# Background jobs.
+#----------------------------------------------------------------------------#
+
+# A job is a plain function registered with @job; enqueue(function, *args)
+# stores its name and JSON arguments in the Job table and returns. Workers
+# ("flask jobs worker") claim due jobs (SKIP LOCKED on PostgreSQL), run them
+# in an app context and retry failures with exponential backoff and jitter up
+# to JOB_MAX_ATTEMPTS, after which the job is kept as failed. A claimed job
+# is leased for JOB_LEASE_SECONDS; a worker that dies leaves it to be claimed
+# again when the lease runs out, so jobs must be safe to run twice. A job
+# whose lease ran out on its last attempt is marked failed instead. With
+# JOBS_EAGER (tests, development) enqueue runs the job inline instead.
+
+registry = {}
+jobs = Job.__table__
+
+
+def job(function):
+    registry[function.__name__] = function
+    return function
+
+
+def enqueue(function, *args, **options):
+    # options: delay (seconds) and unique_key; returns False when a job with
+    # the same unique_key already exists
+    name = function.__name__
+    if registry.get(name) is not function:
+        raise ValueError('{} is not registered with @job'.format(name))
+    if app.config.get('JOBS_EAGER', False):
+        run_eagerly(name, list(args))
+        return True
+    now = datetime.now()
+    try:
+        # in its own transaction, so the caller's session is left alone
+        with db.engine.begin() as connection:
+            connection.execute(jobs.insert().values(
+                name=name, arguments=json.dumps(list(args)), status='queued', attempts=0,
+                max_attempts=app.config.get('JOB_MAX_ATTEMPTS', 5),
+                run_at=now + timedelta(seconds=options.get('delay', 0)),
+                unique_key=options.get('unique_key'), created_at=now))
+    except IntegrityError:
+        return False
+    return True
+
+
+def run_eagerly(name, args):
+    try:
+        registry[name](*args)
+    except Exception:
+        db.session.rollback()
+        app.logger.exception('job %s failed', name, extra={'event': 'job_failed', 'job': name})
+
+#----------------------------------------------------------------------------#
+# Queue.
+#----------------------------------------------------------------------------#
+
+
+def due(now):
+    # queued jobs whose time has come, and running jobs whose lease ran out
+    return or_(and_(jobs.c.status == 'queued', jobs.c.run_at <= now),
+               and_(jobs.c.status == 'running', jobs.c.locked_until < now))
+
+
+def claim(now=None):
+    # returns the claimed (id, name, arguments, attempts, max_attempts) or None
+    now = now or datetime.now()
+    lease = timedelta(seconds=app.config.get('JOB_LEASE_SECONDS', 300))
+    with db.engine.begin() as connection:
+        query = select([jobs.c.id, jobs.c.name, jobs.c.status, jobs.c.attempts,
+                        jobs.c.max_attempts]).where(due(now)).order_by(jobs.c.run_at).limit(1)
+        if connection.dialect.name == 'postgresql':
+            query = query.with_for_update(skip_locked=True)
+        while True:
+            row = connection.execute(query).first()
+            if row is None:
+                return None
+            if row.status == 'queued' or row.attempts < row.max_attempts:
+                break
+            connection.execute(jobs.update().where(and_(jobs.c.id == row.id, due(now))).values(
+                status='failed', locked_until=None, finished_at=now,
+                last_error='lease expired on the last attempt'))
+            app.logger.error('job %s failed for good: lease expired', row.name, extra={
+                'event': 'job_failed', 'job': row.name, 'job_id': row.id,
+                'attempt': row.attempts})
+        job_id = row.id
+        # on SQLite two workers can select the same job: only one update wins
+        claimed = connection.execute(jobs.update().where(
+            and_(jobs.c.id == job_id, due(now))).values(
+                status='running', attempts=jobs.c.attempts + 1,
+                locked_until=now + lease)).rowcount
+        if not claimed:
+            return None
+        return connection.execute(select([
+            jobs.c.id, jobs.c.name, jobs.c.arguments, jobs.c.attempts, jobs.c.max_attempts
+        ]).where(jobs.c.id == job_id)).first()
+
+
+def settle(job_id, **values):
+    with db.engine.begin() as connection:
+        connection.execute(jobs.update().where(jobs.c.id == job_id).values(
+            locked_until=None, **values))
+
+
+def backoff(attempts):
+    # full jitter: up to base * 2^(attempts - 1) seconds, capped
+    config = app.config
+    ceiling = min(config.get('JOB_BACKOFF_MAX', 3600),
+                  config.get('JOB_BACKOFF_BASE', 10) * 2 ** (attempts - 1))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+def work_once():
+    # runs one due job; returns False when there was none
+    claimed = claim()
+    if claimed is None:
+        return False
+    job_id, name, arguments, attempts, max_attempts = claimed
+    fields = {'job': name, 'job_id': job_id, 'attempt': attempts}
+    started = time.perf_counter()
+    try:
+        function = registry.get(name)
+        if function is None:
+            raise LookupError('no job named {}'.format(name))
+        function(*json.loads(arguments))
+    except Exception as e:
+        db.session.rollback()
+        error = '{}: {}'.format(type(e).__name__, e)
+        if attempts >= max_attempts:
+            settle(job_id, status='failed', last_error=error, finished_at=datetime.now())
+            app.logger.exception('job %s failed for good', name,
+                                 extra=dict(fields, event='job_failed'))
+        else:
+            delay = backoff(attempts)
+            settle(job_id, status='queued', last_error=error,
+                   run_at=datetime.now() + timedelta(seconds=delay))
+            app.logger.warning('job %s failed, retrying in %.0fs: %s', name, delay, error,
+                               extra=dict(fields, event='job_retry'))
+    else:
+        settle(job_id, status='done', finished_at=datetime.now())
+        app.logger.info('job %s done', name, extra=dict(
+            fields, event='job', duration_ms=round((time.perf_counter() - started) * 1000, 2)))
+    finally:
+        db.session.remove()
+    return True
+
+
+def job_counts():
+    # [(name, status, count)] and the age in seconds of the oldest due job
+    now = datetime.now()
+    counts = db.session.query(Job.name, Job.status, func.count(Job.id)).group_by(
+        Job.name, Job.status).all()
+    oldest = db.session.query(func.min(Job.run_at)).filter(
+        Job.status == 'queued', Job.run_at <= now).scalar()
+    return counts, (now - oldest).total_seconds() if oldest else 0.0
+
+
+# for the /_metrics gauges
+app.extensions['jobs'] = job_counts
+
+#----------------------------------------------------------------------------#
+# Scheduler.
+#----------------------------------------------------------------------------#
+
+
+class Scheduler(object):
+    # enqueues every JOB_SCHEDULE job once per interval; the unique key per
+    # period keeps several schedulers (one per worker host) from doubling up
+
+    def __init__(self, schedule):
+        self.schedule = schedule
+        self.enqueued = {}
+
+    def tick(self, now=None):
+        now = now or time.time()
+        for name, interval in self.schedule.items():
+            period = int(now // interval)
+            if self.enqueued.get(name) == period:
+                continue
+            enqueue(registry[name], unique_key='{}:{}'.format(name, period))
+            self.enqueued[name] = period
+
+
+@job
+def prune_jobs():
+    # finished jobs are kept for JOB_RETENTION seconds, failed ones too
+    before = datetime.now() - timedelta(seconds=app.config.get('JOB_RETENTION', 86400))
+    Job.query.filter(Job.status.in_(['done', 'failed']), Job.finished_at < before).delete(
+        synchronize_session=False)
+    db.session.commit()
+
+#----------------------------------------------------------------------------#
+# Workers.
+#----------------------------------------------------------------------------#
+
+
+def work(stop):
+    interval = app.config.get('JOB_POLL_INTERVAL', 1.0)
+    while not stop.is_set():
+        if not work_once():
+            stop.wait(interval)
+
+
+def worker_process(stop):
+    # the parent handles the signals and sets stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    listener = restart_logging(app)
+    try:
+        with app.app_context():
+            work(stop)
+    finally:
+        # multiprocessing skips atexit in its children
+        if listener is not None:
+            listener.stop()
+
+
+def run_workers(processes, scheduler=None):
+    context = multiprocessing.get_context()
+    stop = context.Event()
+    # setting stop in the handler could deadlock on the lock stop.wait holds
+    signals = []
+    signal.signal(signal.SIGINT, lambda signum, frame: signals.append(signum))
+    signal.signal(signal.SIGTERM, lambda signum, frame: signals.append(signum))
+
+    workers = []
+    while not signals:
+        # start missing workers, including any that died
+        workers = [worker for worker in workers if worker.is_alive()]
+        if len(workers) < processes:
+            # children must not inherit the scheduler's pooled connections
+            db.engine.dispose()
+        while len(workers) < processes:
+            worker = context.Process(target=worker_process, args=(stop,), daemon=True)
+            worker.start()
+            workers.append(worker)
+        if scheduler is not None:
+            scheduler.tick()
+        time.sleep(1)
+    stop.set()
+    for worker in workers:
+        worker.join()
+
+#----------------------------------------------------------------------------#
+# Command line.
+#----------------------------------------------------------------------------#
+
+
+@app.cli.group('jobs')
+def jobs_command():
+    """Run and inspect background jobs."""
+
+
+@jobs_command.command('worker')
+@click.option('--processes', type=int, default=lambda: app.config.get('JOB_WORKERS', 2),
+              help='Worker processes; 0 runs jobs in this process.')
+@click.option('--scheduler/--no-scheduler', default=True,
+              help='Also enqueue the JOB_SCHEDULE jobs.')
+def worker_command(processes, scheduler):
+    """Run jobs until interrupted."""
+    scheduler = Scheduler(app.config.get('JOB_SCHEDULE', {})) if scheduler else None
+    click.echo('{} worker processes, scheduler {}, pid {}'.format(
+        processes, 'on' if scheduler else 'off', os.getpid()))
+    if processes:
+        run_workers(processes, scheduler)
+        return
+    while True:
+        if scheduler is not None:
+            scheduler.tick()
+        if not work_once():
+            time.sleep(app.config.get('JOB_POLL_INTERVAL', 1.0))
+
+
+@jobs_command.command('status')
+def status_command():
+    """Show the number of jobs per name and status."""
+    counts, lag = job_counts()
+    for name, status, count in sorted(counts):
+        click.echo('{:<30} {:<8} {:>8}'.format(name, status, count))
+    click.echo('oldest due job waiting {:.0f}s'.format(lag))
+
+
+@jobs_command.command('retry')
+def retry_command():
+    """Queue the failed jobs again."""
+    retried = Job.query.filter_by(status='failed').update(
+        {'status': 'queued', 'attempts': 0, 'run_at': datetime.now(), 'finished_at': None},
+        synchronize_session=False)
+    db.session.commit()
+    click.echo('queued {} jobs'.format(retried))
@@ -0,0 +1,192 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import time
+import traceback
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import (QueueHandler, QueueListener, RotatingFileHandler,
+                              TimedRotatingFileHandler, WatchedFileHandler)
+from flask import current_app, g, has_request_context, request
+from flask.logging import default_handler
+from instrumentation import current_stats
+
+#----------------------------------------------------------------------------#
+# Structured logging.
+#----------------------------------------------------------------------------#
+
+# Records are formatted as one JSON object per line in the thread that logs
+# them and put on an in-memory queue; a QueueListener thread writes them to
+# stderr, or to LOG_FILE when one is set (and stderr too with LOG_STDERR), so
+# request threads never wait on the output. Several processes (gunicorn
+# workers, job workers) may share LOG_FILE, so it is reopened when an external
+# logrotate moves it rather than rotated here; in-process rotation
+# (LOG_MAX_BYTES or LOG_ROTATE_WHEN) is only safe with a single process. When the queue is full, records are dropped and counted
+# rather than blocking. Records logged during a request carry its request_id
+# (taken from X-Request-ID or generated, and echoed back), endpoint, method
+# and path. Every request logs one 'request' event with its latency and, with
+# instrumentation on, its SQL and template stats; events listed in
+# LOG_SAMPLE_RATES are kept at that rate and carry it as sample_rate.
+
+# LogRecord attributes that are not passed on as extra fields
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {
+    'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in RECORD_ATTRIBUTES:
+                entry[name] = value
+        if record.exc_info:
+            entry['exception'] = ''.join(traceback.format_exception(*record.exc_info)).rstrip()
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            record.endpoint = request.endpoint
+            record.method = request.method
+            record.path = request.path
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    # keeps records of a sampled event (the 'event' extra field) at its rate
+    def __init__(self, rates):
+        super(SamplingFilter, self).__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        rate = self.rates.get(getattr(record, 'event', None))
+        if rate is None:
+            return True
+        record.sample_rate = rate
+        return random.random() < rate
+
+
+class DroppingQueueHandler(QueueHandler):
+    def __init__(self, queue):
+        super(DroppingQueueHandler, self).__init__(queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # the record is already a JSON line; only the text crosses the queue
+        return logging.makeLogRecord({
+            'msg': self.format(record), 'levelno': record.levelno,
+            'levelname': record.levelname, 'name': record.name})
+
+
+def file_handler(config):
+    # the directory is created when logging starts, the file on the first record
+    path = config['LOG_FILE']
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if config.get('LOG_ROTATE_WHEN'):
+        return TimedRotatingFileHandler(path, when=config['LOG_ROTATE_WHEN'], delay=True,
+                                        backupCount=config.get('LOG_BACKUP_COUNT', 5))
+    if config.get('LOG_MAX_BYTES'):
+        return RotatingFileHandler(path, maxBytes=config['LOG_MAX_BYTES'], delay=True,
+                                   backupCount=config.get('LOG_BACKUP_COUNT', 5))
+    return WatchedFileHandler(path, delay=True)
+
+
+def log_handlers(config):
+    handlers = []
+    if config.get('LOG_FILE'):
+        handlers.append(file_handler(config))
+    if not handlers or config.get('LOG_STDERR', False):
+        handlers.append(logging.StreamHandler())
+    return handlers
+
+#----------------------------------------------------------------------------#
+# Request hooks.
+#----------------------------------------------------------------------------#
+
+request_logger = logging.getLogger('fyyur.request')
+
+
+def start_request():
+    g.request_id = request.headers.get('X-Request-ID', '')[:64] or uuid.uuid4().hex
+    g.request_started = time.perf_counter()
+
+
+def finish_request(response):
+    config = current_app.config
+    # start_request is skipped when an earlier before_request hook aborts
+    latency = time.perf_counter() - g.get('request_started', time.perf_counter())
+    fields = {'event': 'request', 'status': response.status_code,
+              'latency_ms': round(latency * 1000, 2)}
+    stats = current_stats()
+    if stats is not None:
+        fields.update(db_statements=stats.statements,
+                      db_ms=round(stats.db_time * 1000, 2),
+                      template_ms=round(stats.template_time * 1000, 2))
+    level = logging.INFO
+    # failed and slow requests are logged as their own, unsampled, events
+    if response.status_code >= 500:
+        fields['event'], level = 'request_failed', logging.ERROR
+    elif latency * 1000 >= config.get('LOG_SLOW_REQUEST_MS', 1000):
+        fields['event'], level = 'slow_request', logging.WARNING
+    request_logger.log(level, '%s %s %s', request.method, request.path,
+                       response.status_code, extra=fields)
+    if 'request_id' in g:
+        response.headers['X-Request-ID'] = g.request_id
+    return response
+
+
+def init_logging(app):
+    if not app.config.get('LOG_ENABLED', True):
+        return
+    config = app.config
+    handlers = log_handlers(config)
+    for handler in handlers:
+        handler.setFormatter(logging.Formatter('%(message)s'))
+
+    queue_handler = DroppingQueueHandler(queue.Queue(config.get('LOG_QUEUE_SIZE', 10000)))
+    queue_handler.setFormatter(JsonFormatter())
+    queue_handler.addFilter(RequestContextFilter())
+    queue_handler.addFilter(SamplingFilter(config.get('LOG_SAMPLE_RATES', {})))
+    listener = QueueListener(queue_handler.queue, *handlers)
+    listener.start()
+    # flush what is still queued when the process exits
+    atexit.register(listener.stop)
+    queue_handler.listener = listener
+
+    # the app logger propagates to the root logger, as do the libraries'
+    root = logging.getLogger()
+    root.addHandler(queue_handler)
+    root.setLevel(config.get('LOG_LEVEL', 'INFO'))
+    app.logger.removeHandler(default_handler)
+    app.extensions['logging'] = queue_handler
+
+    app.before_request(start_request)
+    app.after_request(finish_request)
+
+
+def restart_logging(app):
+    # a forked process inherits the queue but not the thread that drains it;
+    # returns the new listener, to be stopped before the process exits
+    handler = app.extensions.get('logging')
+    if handler is None:
+        return None
+    handler.queue = queue.Queue(handler.queue.maxsize)
+    handler.listener = QueueListener(handler.queue, *handler.listener.handlers)
+    handler.listener.start()
+    return handler.listener
@@ -0,0 +1,32 @@
+"""show and venue indexes
+
+Revision ID: 3c5e8a1f9b27
+Revises: cf66a6d808fa
+Create Date: 2026-10-18 12:10:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3c5e8a1f9b27'
+down_revision = 'cf66a6d808fa'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # composite indexes lead with the foreign keys, so they also cover the
+    # venue_id/artist_id lookups that used to scan the whole Show table
+    op.create_index('ix_Show_venue_id_start_time', 'Show',
+                    ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_Show_artist_id_start_time', 'Show',
+                    ['artist_id', 'start_time'], unique=False)
+    op.create_index('ix_Venue_state_city', 'Venue',
+                    ['state', 'city'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Venue_state_city', table_name='Venue')
+    op.drop_index('ix_Show_artist_id_start_time', table_name='Show')
+    op.drop_index('ix_Show_venue_id_start_time', table_name='Show')
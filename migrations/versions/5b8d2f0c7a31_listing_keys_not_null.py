@@ -0,0 +1,33 @@
+"""listing sort keys not null
+
+Revision ID: 5b8d2f0c7a31
+Revises: a7c3e5f19d42
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8d2f0c7a31'
+down_revision = 'a7c3e5f19d42'
+branch_labels = None
+depends_on = None
+
+# the keyset pagination compares (state, city, name, id) and (name, id) row
+# values, and a NULL in one of them would compare as NULL and drop the row
+KEY_COLUMNS = [('Venue', 'state', sa.String(120)), ('Venue', 'city', sa.String(120)),
+               ('Venue', 'name', sa.String()), ('Artist', 'name', sa.String())]
+
+
+def upgrade():
+    # the forms always required them; older rows get an empty string
+    for table, column, type_ in KEY_COLUMNS:
+        op.execute('UPDATE "{0}" SET {1} = \'\' WHERE {1} IS NULL'.format(table, column))
+        op.alter_column(table, column, existing_type=type_, nullable=False)
+
+
+def downgrade():
+    for table, column, type_ in KEY_COLUMNS:
+        op.alter_column(table, column, existing_type=type_, nullable=True)
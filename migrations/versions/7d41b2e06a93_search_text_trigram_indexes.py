@@ -0,0 +1,35 @@
+"""search text trigram indexes
+
+Revision ID: 7d41b2e06a93
+Revises: 3c5e8a1f9b27
+Create Date: 2026-10-18 12:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d41b2e06a93'
+down_revision = '3c5e8a1f9b27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('search_text', sa.Text(), nullable=True))
+        # same flattening as search.build_search_text
+        op.execute(
+            'UPDATE "{}" SET search_text = lower(concat_ws(\' \', name, city, state, '
+            'array_to_string(genres, \' \')))'.format(table))
+        op.create_index('ix_{}_search_text'.format(table), table, ['search_text'],
+                        unique=False, postgresql_using='gin',
+                        postgresql_ops={'search_text': 'gin_trgm_ops'})
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        op.drop_index('ix_{}_search_text'.format(table), table_name=table)
+        op.drop_column(table, 'search_text')
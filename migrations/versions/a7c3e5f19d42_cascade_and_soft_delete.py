@@ -0,0 +1,38 @@
+"""cascading show foreign keys and soft delete columns
+
+Revision ID: a7c3e5f19d42
+Revises: d3f7a2c95e14
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e5f19d42'
+down_revision = 'd3f7a2c95e14'
+branch_labels = None
+depends_on = None
+
+FOREIGN_KEYS = [('venue_id', 'Venue'), ('artist_id', 'Artist')]
+
+
+def upgrade():
+    # deleting a venue or artist deletes its shows, and through ShowFeed's
+    # own cascade their feed rows
+    for column, table in FOREIGN_KEYS:
+        name = 'Show_{}_fkey'.format(column)
+        op.drop_constraint(name, 'Show', type_='foreignkey')
+        op.create_foreign_key(name, 'Show', table, [column], ['id'], ondelete='CASCADE')
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('deleted_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        op.drop_column(table, 'deleted_at')
+    for column, table in FOREIGN_KEYS:
+        name = 'Show_{}_fkey'.format(column)
+        op.drop_constraint(name, 'Show', type_='foreignkey')
+        op.create_foreign_key(name, 'Show', table, [column], ['id'])
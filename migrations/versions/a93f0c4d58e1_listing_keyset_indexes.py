@@ -0,0 +1,35 @@
+"""listing keyset indexes
+
+Revision ID: a93f0c4d58e1
+Revises: 7d41b2e06a93
+Create Date: 2026-10-18 13:05:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a93f0c4d58e1'
+down_revision = '7d41b2e06a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # one index per listing sort key, so each page is a single index range
+    # scan; the venue key extends (state, city), which it replaces
+    op.create_index('ix_Show_start_time_id', 'Show',
+                    ['start_time', 'id'], unique=False)
+    op.create_index('ix_Artist_name_id', 'Artist',
+                    ['name', 'id'], unique=False)
+    op.create_index('ix_Venue_state_city_name_id', 'Venue',
+                    ['state', 'city', 'name', 'id'], unique=False)
+    op.drop_index('ix_Venue_state_city', table_name='Venue')
+
+
+def downgrade():
+    op.create_index('ix_Venue_state_city', 'Venue',
+                    ['state', 'city'], unique=False)
+    op.drop_index('ix_Venue_state_city_name_id', table_name='Venue')
+    op.drop_index('ix_Artist_name_id', table_name='Artist')
+    op.drop_index('ix_Show_start_time_id', table_name='Show')
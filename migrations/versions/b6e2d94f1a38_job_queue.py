@@ -0,0 +1,41 @@
+"""background job queue
+
+Revision ID: b6e2d94f1a38
+Revises: f81b3d6a2c47
+Create Date: 2026-10-18 18:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e2d94f1a38'
+down_revision = 'f81b3d6a2c47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('Job',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('name', sa.String(length=120), nullable=False),
+                    sa.Column('arguments', sa.Text(), nullable=False),
+                    sa.Column('status', sa.String(length=10), nullable=False),
+                    sa.Column('attempts', sa.Integer(), nullable=False),
+                    sa.Column('max_attempts', sa.Integer(), nullable=False),
+                    sa.Column('run_at', sa.DateTime(), nullable=False),
+                    sa.Column('locked_until', sa.DateTime(), nullable=True),
+                    sa.Column('unique_key', sa.String(length=200), nullable=True),
+                    sa.Column('last_error', sa.Text(), nullable=True),
+                    sa.Column('created_at', sa.DateTime(), nullable=False),
+                    sa.Column('finished_at', sa.DateTime(), nullable=True),
+                    sa.PrimaryKeyConstraint('id'),
+                    sa.UniqueConstraint('unique_key')
+                    )
+    op.create_index('ix_Job_status_run_at', 'Job', ['status', 'run_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Job_status_run_at', table_name='Job')
+    op.drop_table('Job')
@@ -0,0 +1,33 @@
+"""updated_at columns
+
+Revision ID: c2b7e4f81d06
+Revises: a93f0c4d58e1
+Create Date: 2026-10-18 13:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2b7e4f81d06'
+down_revision = 'a93f0c4d58e1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('Venue', 'Artist', 'Show'):
+        # existing rows are stamped with the migration time; afterwards the
+        # models set the value, so the server default is dropped again
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=False,
+                                       server_default=sa.text("timezone('utc', now())")))
+        op.alter_column(table, 'updated_at', server_default=None)
+        op.create_index('ix_{}_updated_at'.format(table), table,
+                        ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table in ('Show', 'Artist', 'Venue'):
+        op.drop_index('ix_{}_updated_at'.format(table), table_name=table)
+        op.drop_column(table, 'updated_at')
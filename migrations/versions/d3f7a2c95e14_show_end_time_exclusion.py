@@ -0,0 +1,49 @@
+"""show end time and double-booking exclusion constraints
+
+Revision ID: d3f7a2c95e14
+Revises: b6e2d94f1a38
+Create Date: 2026-10-18 19:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3f7a2c95e14'
+down_revision = 'b6e2d94f1a38'
+branch_labels = None
+depends_on = None
+
+# config.SHOW_DEFAULT_DURATION when this revision was written
+DEFAULT_DURATION = '3 hours'
+# a few of the overlapping pairs are named when the constraints cannot be added
+REPORTED_CONFLICTS = 20
+
+
+def upgrade():
+    op.add_column('Show', sa.Column('end_time', sa.DateTime(), nullable=True))
+    op.execute('UPDATE "Show" SET end_time = start_time + interval \'{}\''.format(DEFAULT_DURATION))
+    op.alter_column('Show', 'end_time', nullable=False)
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    connection = op.get_bind()
+    for column in ('venue_id', 'artist_id'):
+        # existing double bookings have to be resolved by hand first
+        conflicts = connection.execute(sa.text(
+            'SELECT a.{0}, a.id, b.id FROM "Show" a JOIN "Show" b '
+            'ON a.{0} = b.{0} AND a.id < b.id '
+            'AND a.start_time < b.end_time AND b.start_time < a.end_time '
+            'ORDER BY a.{0}, a.id, b.id LIMIT :limit'.format(column)),
+            limit=REPORTED_CONFLICTS).fetchall()
+        if conflicts:
+            raise RuntimeError('overlapping shows of the same {}: {}'.format(
+                column, ', '.join('{} ({} and {})'.format(*row) for row in conflicts)))
+        op.execute(
+            'ALTER TABLE "Show" ADD CONSTRAINT "ex_Show_{0}_during" EXCLUDE USING gist '
+            '({0} WITH =, tsrange(start_time, end_time) WITH &&)'.format(column))
+
+
+def downgrade():
+    for column in ('artist_id', 'venue_id'):
+        op.drop_constraint('ex_Show_{}_during'.format(column), 'Show')
+    op.drop_column('Show', 'end_time')
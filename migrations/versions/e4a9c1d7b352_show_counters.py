@@ -0,0 +1,47 @@
+"""show counters on venues and artists
+
+Revision ID: e4a9c1d7b352
+Revises: c2b7e4f81d06
+Create Date: 2026-10-18 15:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a9c1d7b352'
+down_revision = 'c2b7e4f81d06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table, foreign_key in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), nullable=False,
+                                       server_default='0'))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), nullable=False,
+                                       server_default='0'))
+        op.add_column(table, sa.Column('next_show_at', sa.DateTime(), nullable=True))
+        op.alter_column(table, 'upcoming_shows_count', server_default=None)
+        op.alter_column(table, 'past_shows_count', server_default=None)
+        op.create_index('ix_{}_next_show_at'.format(table), table,
+                        ['next_show_at'], unique=False)
+        # shows start times are local, like datetime.now() in the app
+        op.execute(
+            'UPDATE "{0}" SET '
+            'upcoming_shows_count = (SELECT count(*) FROM "Show" '
+            'WHERE "Show".{1} = "{0}".id AND "Show".start_time > localtimestamp), '
+            'past_shows_count = (SELECT count(*) FROM "Show" '
+            'WHERE "Show".{1} = "{0}".id AND "Show".start_time <= localtimestamp), '
+            'next_show_at = (SELECT min(start_time) FROM "Show" '
+            'WHERE "Show".{1} = "{0}".id AND "Show".start_time > localtimestamp)'.format(
+                table, foreign_key))
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        op.drop_index('ix_{}_next_show_at'.format(table), table_name=table)
+        op.drop_column(table, 'next_show_at')
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
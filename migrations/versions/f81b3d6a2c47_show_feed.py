@@ -0,0 +1,50 @@
+"""upcoming shows feed
+
+Revision ID: f81b3d6a2c47
+Revises: e4a9c1d7b352
+Create Date: 2026-10-18 16:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f81b3d6a2c47'
+down_revision = 'e4a9c1d7b352'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ShowFeed',
+                    sa.Column('show_id', sa.Integer(), nullable=False),
+                    sa.Column('start_time', sa.DateTime(), nullable=False),
+                    sa.Column('venue_id', sa.Integer(), nullable=False),
+                    sa.Column('venue_name', sa.String(), nullable=True),
+                    sa.Column('artist_id', sa.Integer(), nullable=False),
+                    sa.Column('artist_name', sa.String(), nullable=True),
+                    sa.Column('artist_image_link', sa.String(length=500), nullable=True),
+                    sa.ForeignKeyConstraint(['show_id'], ['Show.id'], ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('show_id')
+                    )
+    op.create_index('ix_ShowFeed_start_time_show_id', 'ShowFeed',
+                    ['start_time', 'show_id'], unique=False)
+    op.create_index('ix_ShowFeed_venue_id', 'ShowFeed', ['venue_id'], unique=False)
+    op.create_index('ix_ShowFeed_artist_id', 'ShowFeed', ['artist_id'], unique=False)
+    # shows start times are local, like datetime.now() in the app
+    op.execute(
+        'INSERT INTO "ShowFeed" (show_id, start_time, venue_id, venue_name, '
+        'artist_id, artist_name, artist_image_link) '
+        'SELECT "Show".id, "Show".start_time, "Show".venue_id, "Venue".name, '
+        '"Show".artist_id, "Artist".name, "Artist".image_link FROM "Show" '
+        'JOIN "Venue" ON "Venue".id = "Show".venue_id '
+        'JOIN "Artist" ON "Artist".id = "Show".artist_id '
+        'WHERE "Show".start_time > localtimestamp')
+
+
+def downgrade():
+    op.drop_index('ix_ShowFeed_artist_id', table_name='ShowFeed')
+    op.drop_index('ix_ShowFeed_venue_id', table_name='ShowFeed')
+    op.drop_index('ix_ShowFeed_start_time_show_id', table_name='ShowFeed')
+    op.drop_table('ShowFeed')
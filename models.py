@@ -1,7 +1,9 @@
+from datetime import datetime, timedelta
 from flask import Flask
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
+from replicas import RoutingSQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy import DDL, event
 
 
 #----------------------------------------------------------------------------#
@@ -19,9 +21,12 @@ app.config['SQLALCHEMY_DATABASE_URI']
 # SQLALCHEMY_TRACK_MODIFICATIONS = False
 
 
-db = SQLAlchemy(app)
+db = RoutingSQLAlchemy(app)
 migrate = Migrate(app, db)
 
+# genres are arrays on PostgreSQL and JSON lists elsewhere (SQLite, tests)
+Genres = db.ARRAY(db.String()).with_variant(db.JSON(), 'sqlite')
+
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
@@ -29,38 +34,75 @@ migrate = Migrate(app, db)
 
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    # /venues groups the listing by area and pages through it by this key
+    __table_args__ = (
+        db.Index('ix_Venue_state_city_name_id', 'state', 'city', 'name', 'id'),
+        db.Index('ix_Venue_search_text', 'search_text', postgresql_using='gin',
+                 postgresql_ops={'search_text': 'gin_trgm_ops'}),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
-    city = db.Column(db.String(120))
-    state = db.Column(db.String(120))
+    # the listing sort key (pagination.py compares it as a row value)
+    name = db.Column(db.String, nullable=False)
+    city = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(500))
-    genres = db.Column(db.ARRAY(db.String()))
+    genres = db.Column(Genres)
     website = db.Column(db.String(500))
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(120))
-    shows = db.relationship('Show', backref='Venue', lazy=True)
+    # lowercase name, city, state and genres, maintained by search.py
+    search_text = db.Column(db.Text)
+    # show counters as of the last write or rollover, maintained by counters.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0)
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0)
+    next_show_at = db.Column(db.DateTime, index=True)
+    # bumped on every ORM write; drives the HTTP validators in http_cache.py
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow,
+                           onupdate=datetime.utcnow, index=True)
+    # set by a soft delete; the row is hidden until deletion.py purges it
+    deleted_at = db.Column(db.DateTime)
+    # the database deletes the shows with the venue
+    shows = db.relationship('Show', backref='Venue', lazy=True, passive_deletes=True)
     # (Done): implement any missing fields, as a database migration using Flask-Migrate
 
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_Artist_name_id', 'name', 'id'),
+        db.Index('ix_Artist_search_text', 'search_text', postgresql_using='gin',
+                 postgresql_ops={'search_text': 'gin_trgm_ops'}),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
+    # the listing sort key, with the id
+    name = db.Column(db.String, nullable=False)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String()))
+    genres = db.Column(Genres)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(500))
     website = db.Column(db.String(500))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(120))
-    shows = db.relationship('Show', backref='Artist', lazy=True)
+    # lowercase name, city, state and genres, maintained by search.py
+    search_text = db.Column(db.Text)
+    # show counters as of the last write or rollover, maintained by counters.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0)
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0)
+    next_show_at = db.Column(db.DateTime, index=True)
+    # bumped on every ORM write; drives the HTTP validators in http_cache.py
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow,
+                           onupdate=datetime.utcnow, index=True)
+    # set by a soft delete; the row is hidden until deletion.py purges it
+    deleted_at = db.Column(db.DateTime)
+    # the database deletes the shows with the artist
+    shows = db.relationship('Show', backref='Artist', lazy=True, passive_deletes=True)
 
     # (Done): implement any missing fields, as a database migration using Flask-Migrate
 
@@ -69,8 +111,86 @@ class Artist(db.Model):
 
 class Show(db.Model):
     __tablename__ = 'Show'
+    # listings and detail pages filter by venue/artist and start_time together;
+    # the leading columns also serve as the foreign key indexes
+    __table_args__ = (
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
-    artist_id = db.Column(db.Integer, db.ForeignKey(
-        'Artist.id'), nullable=False)
+    # the counters (counters.py) need the old values of these on update, even
+    # when the show was expired by a commit before it was changed
+    venue_id = db.column_property(db.Column(
+        db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), nullable=False),
+        active_history=True)
+    artist_id = db.column_property(db.Column(
+        db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), nullable=False),
+        active_history=True)
+    start_time = db.column_property(db.Column(db.DateTime, nullable=False),
+                                    active_history=True)
+    # the show books its venue and artist for [start_time, end_time)
+    end_time = db.Column(db.DateTime, nullable=False, default=lambda context: show_end(
+        context.get_current_parameters()['start_time']))
+    # bumped on every ORM write; drives the HTTP validators in http_cache.py
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow,
+                           onupdate=datetime.utcnow, index=True)
+
+
+def show_end(start_time):
+    # shows listed without an end take SHOW_DEFAULT_DURATION seconds
+    return start_time + timedelta(seconds=app.config.get('SHOW_DEFAULT_DURATION', 3 * 3600))
+
+
+# PostgreSQL refuses overlapping shows of a venue or an artist (scheduling.py);
+# btree_gist lets the GiST index compare the ids with =
+event.listen(Show.__table__, 'before_create', DDL(
+    'CREATE EXTENSION IF NOT EXISTS btree_gist').execute_if(dialect='postgresql'))
+for column in ('venue_id', 'artist_id'):
+    event.listen(Show.__table__, 'after_create', DDL(
+        'ALTER TABLE "Show" ADD CONSTRAINT "ex_Show_{0}_during" EXCLUDE USING gist '
+        '({0} WITH =, tsrange(start_time, end_time) WITH &&)'.format(column)
+    ).execute_if(dialect='postgresql'))
+
+
+class ShowFeed(db.Model):
+    __tablename__ = 'ShowFeed'
+    # upcoming shows already joined with their venue and artist, maintained by
+    # feed.py; /shows is a range scan over (start_time, show_id)
+    __table_args__ = (
+        db.Index('ix_ShowFeed_start_time_show_id', 'start_time', 'show_id'),
+        db.Index('ix_ShowFeed_venue_id', 'venue_id'),
+        db.Index('ix_ShowFeed_artist_id', 'artist_id'),
+    )
+    show_id = db.Column(db.Integer, db.ForeignKey('Show.id', ondelete='CASCADE'),
+                        primary_key=True)
     start_time = db.Column(db.DateTime, nullable=False)
+    venue_id = db.Column(db.Integer, nullable=False)
+    venue_name = db.Column(db.String)
+    artist_id = db.Column(db.Integer, nullable=False)
+    artist_name = db.Column(db.String)
+    artist_image_link = db.Column(db.String(500))
+
+
+class Job(db.Model):
+    __tablename__ = 'Job'
+    # background jobs of the database queue in jobs.py; workers claim the
+    # oldest due job by (status, run_at)
+    __table_args__ = (
+        db.Index('ix_Job_status_run_at', 'status', 'run_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False)
+    # JSON list of the positional arguments
+    arguments = db.Column(db.Text, nullable=False)
+    # queued, running, done or failed
+    status = db.Column(db.String(10), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False)
+    run_at = db.Column(db.DateTime, nullable=False)
+    locked_until = db.Column(db.DateTime)
+    # set for scheduled runs, so that one run per period is enqueued
+    unique_key = db.Column(db.String(200), unique=True)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False)
+    finished_at = db.Column(db.DateTime)
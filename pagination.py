@@ -0,0 +1,69 @@
+import base64
+import json
+from datetime import datetime
+import dateutil.parser
+from sqlalchemy import tuple_
+from models import app, db
+
+#----------------------------------------------------------------------------#
+# Keyset (seek) pagination.
+#----------------------------------------------------------------------------#
+
+# Pages are addressed by the sort key of their boundary rows rather than an
+# OFFSET, so fetching page N costs the same as page 1: the database seeks to
+# the cursor through the index on the sort columns and reads one page. The
+# sort columns are NOT NULL: a NULL would make the row value comparison NULL
+# and silently drop rows.
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    values = [value.isoformat() if isinstance(value, datetime) else value
+              for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(token, columns):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+    except (ValueError, TypeError):
+        raise InvalidCursor(token)
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise InvalidCursor(token)
+    # datetimes travel as ISO strings
+    return [dateutil.parser.parse(value) if isinstance(column.type, db.DateTime) and value else value
+            for column, value in zip(columns, values)]
+
+
+def row_key(row, columns):
+    return [getattr(row, column.key) for column in columns]
+
+
+def keyset_page(query, columns, after=None, before=None, per_page=None):
+    # returns (rows, next_cursor, prev_cursor) for the page following `after`,
+    # the page preceding `before`, or the first page. `columns` must be
+    # selected by the query and together identify a row (end with the id).
+    per_page = per_page or app.config.get('LISTING_PAGE_SIZE', 50)
+    key = tuple_(*columns)
+
+    if before:
+        values = decode_cursor(before, columns)
+        rows = query.filter(key < tuple_(*values)).order_by(
+            *[column.desc() for column in columns]).limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        rows = list(reversed(rows[:per_page]))
+        next_cursor = encode_cursor(row_key(rows[-1], columns)) if rows else None
+        prev_cursor = encode_cursor(row_key(rows[0], columns)) if has_more else None
+        return rows, next_cursor, prev_cursor
+
+    if after:
+        query = query.filter(key > tuple_(*decode_cursor(after, columns)))
+    rows = query.order_by(*columns).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    next_cursor = encode_cursor(row_key(rows[-1], columns)) if has_more else None
+    prev_cursor = encode_cursor(row_key(rows[0], columns)) if after and rows else None
+    return rows, next_cursor, prev_cursor
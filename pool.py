@@ -0,0 +1,92 @@
+from flask import jsonify
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+#----------------------------------------------------------------------------#
+# Connection pool.
+#----------------------------------------------------------------------------#
+
+# PostgreSQL engines get their pool settings from config.py. Pre-ping replaces
+# connections that died with a server restart before a request sees them, and
+# recycle retires connections before idle timeouts on the server or network
+# can kill them. In DB_PGBOUNCER mode PgBouncer owns the pooling: connections
+# are not kept here, no startup parameters are sent (PgBouncer rejects them),
+# and the statement timeout is set per transaction. psycopg2 never creates
+# server-side prepared statements, so transaction pooling is safe with it.
+
+
+def postgres_options(config):
+    if config.get('DB_PGBOUNCER'):
+        return {
+            'poolclass': NullPool,
+            'pool_pre_ping': config.get('DB_POOL_PRE_PING', True),
+        }
+    options = {
+        'pool_size': config.get('DB_POOL_SIZE', 5),
+        'max_overflow': config.get('DB_MAX_OVERFLOW', 10),
+        'pool_timeout': config.get('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': config.get('DB_POOL_PRE_PING', True),
+    }
+    timeout = config.get('DB_STATEMENT_TIMEOUT')
+    if timeout:
+        options['connect_args'] = {
+            'options': '-c statement_timeout={}'.format(timeout)}
+    return options
+
+
+class PooledSQLAlchemy(SQLAlchemy):
+    def apply_driver_hacks(self, app, sa_url, options):
+        if sa_url.drivername.startswith('postgres'):
+            for key, value in postgres_options(app.config).items():
+                options.setdefault(key, value)
+        return super(PooledSQLAlchemy, self).apply_driver_hacks(app, sa_url, options)
+
+    def init_app(self, app):
+        super(PooledSQLAlchemy, self).init_app(app)
+        set_local_statement_timeout(app)
+
+
+def set_local_statement_timeout(app):
+    # PgBouncer mode cannot use a startup parameter, so each transaction sets
+    # its own timeout; SET LOCAL ends with the transaction
+    @event.listens_for(Session, 'after_begin')
+    def after_begin(session, transaction, connection):
+        timeout = app.config.get('DB_STATEMENT_TIMEOUT')
+        if (app.config.get('DB_PGBOUNCER') and timeout and
+                connection.dialect.name == 'postgresql'):
+            connection.execute(
+                'SET LOCAL statement_timeout = {:d}'.format(int(timeout)))
+
+
+def pool_status(engine):
+    # checked in/out counts; pools without a queue (NullPool) only report
+    # their class
+    pool = engine.pool
+    status = {'class': type(pool).__name__}
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        if hasattr(pool, name):
+            status[name] = getattr(pool, name)()
+    return status
+
+#----------------------------------------------------------------------------#
+# Health check.
+#----------------------------------------------------------------------------#
+
+
+def init_health(app, db):
+    def health():
+        try:
+            db.session.execute('SELECT 1')
+            database = 'ok'
+        except Exception as e:
+            app.logger.warning('health check failed: %s', e)
+            database = 'unavailable'
+        finally:
+            db.session.remove()
+        status = {'database': database, 'pool': pool_status(db.engine)}
+        return jsonify(status), 200 if database == 'ok' else 503
+
+    app.add_url_rule(app.config.get('HEALTH_URL', '/_health'), 'health', health)
@@ -0,0 +1,309 @@
+import cProfile
+import hmac
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from flask import Response, abort, current_app, g, render_template, request, url_for
+
+#----------------------------------------------------------------------------#
+# Per-request profiling.
+#----------------------------------------------------------------------------#
+
+# With PROFILING_ENABLED, a request carrying ?__profile=1 (or =cprofile or
+# =sampling) and the PROFILING_TOKEN in an X-Profile-Token header or a
+# __token argument is profiled, as is a PROFILING_SAMPLE_RATE fraction of all
+# requests. Each trace is reduced to collapsed stacks rooted at the Flask
+# endpoint and written to PROFILING_DIR, which keeps the newest
+# PROFILING_KEEP traces. The response names the trace in X-Profile, and
+# /_profiles/<id> shows it as a flamegraph (?format=collapsed for
+# flamegraph.pl or speedscope).
+
+MODES = ('cprofile', 'sampling')
+# when a cProfile call graph is unfolded, frames deeper than MAX_DEPTH and
+# paths taking less than MIN_SHARE seconds are left out
+MAX_DEPTH = 64
+MIN_SHARE = 0.00001
+PROFILE_ID = re.compile(r'^[0-9]+-[0-9a-f]+$')
+
+
+def frame_name(filename, lineno, name):
+    # ';' separates frames in the collapsed format
+    return '{} ({}:{})'.format(name, os.path.basename(filename), lineno).replace(';', ',')
+
+
+class SamplingProfiler(object):
+    # records the stack of one thread every interval seconds from a
+    # background thread; counts are samples, not seconds
+    def __init__(self, interval):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.sampler = threading.Thread(target=self.run, daemon=True)
+        self.outer = []
+
+    def start(self):
+        # the server's frames above the request are left out of the stacks;
+        # they are held on to so that their ids are not reused
+        frame = sys._getframe(1)
+        while frame is not None:
+            self.outer.append(frame)
+            frame = frame.f_back
+        self.sampler.start()
+
+    def run(self):
+        outer = set(id(frame) for frame in self.outer)
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and id(frame) not in outer:
+                code = frame.f_code
+                stack.append(frame_name(code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.sampler.join()
+        del self.outer[:]
+        return self.stacks
+
+
+class CallProfiler(object):
+    # cProfile only records caller/callee pairs, so stacks are rebuilt by
+    # unfolding the call graph from its roots and splitting each function's
+    # time over its callers in proportion; counts are microseconds
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+        stats = pstats.Stats(self.profile).stats
+        children = {}
+        for function, (_, _, _, cumulative, callers) in stats.items():
+            for caller, edge in callers.items():
+                children.setdefault(caller, []).append((function, edge[3]))
+        stacks = Counter()
+
+        def unfold(function, path, share):
+            total, own = stats[function][3], stats[function][2]
+            fraction = share / total if total else 0
+            path = path + [frame_name(*function)]
+            stacks[';'.join(path)] += int(own * fraction * 1e6)
+            if len(path) >= MAX_DEPTH:
+                return
+            for child, edge in children.get(function, []):
+                # recursion is folded into the first occurrence
+                if edge * fraction >= MIN_SHARE and frame_name(*child) not in path:
+                    unfold(child, path, edge * fraction)
+
+        for function, (_, _, _, cumulative, callers) in stats.items():
+            if not callers:
+                unfold(function, [], cumulative)
+        return Counter(dict((stack, count) for stack, count in stacks.items() if count > 0))
+
+#----------------------------------------------------------------------------#
+# Trace ring.
+#----------------------------------------------------------------------------#
+
+
+def profile_dir():
+    return current_app.config.get('PROFILING_DIR') or os.path.join(
+        current_app.instance_path, 'profiles')
+
+
+def trace_path(profile_id):
+    return os.path.join(profile_dir(), profile_id + '.json')
+
+
+def save_trace(trace):
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    # written aside and renamed, so readers never see half a trace
+    temporary = trace_path(trace['id']) + '.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(trace, f)
+    os.replace(temporary, trace_path(trace['id']))
+    # ids sort by time, so the oldest traces go first
+    traces = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    for name in traces[:-current_app.config.get('PROFILING_KEEP', 50)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+
+def load_trace(profile_id):
+    if not PROFILE_ID.match(profile_id):
+        return None
+    try:
+        with open(trace_path(profile_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def list_traces():
+    try:
+        names = sorted(os.listdir(profile_dir()), reverse=True)
+    except OSError:
+        return []
+    traces = []
+    for name in names:
+        if name.endswith('.json'):
+            trace = load_trace(name[:-len('.json')])
+            if trace is not None:
+                del trace['stacks']
+                trace['started_at'] = datetime.fromtimestamp(trace['started'])
+                traces.append(trace)
+    return traces
+
+#----------------------------------------------------------------------------#
+# Request hooks.
+#----------------------------------------------------------------------------#
+
+
+def authorized():
+    token = current_app.config.get('PROFILING_TOKEN')
+    given = request.headers.get('X-Profile-Token') or request.args.get('__token', '')
+    return bool(token) and hmac.compare_digest(given.encode(), token.encode())
+
+
+def requested_mode():
+    # the mode asked for by ?__profile, or by the sample rate, or None
+    config = current_app.config
+    mode = request.args.get('__profile')
+    if mode and authorized():
+        return mode if mode in MODES else config.get('PROFILING_MODE', 'cprofile')
+    if random.random() < config.get('PROFILING_SAMPLE_RATE', 0.0):
+        return config.get('PROFILING_MODE', 'cprofile')
+    return None
+
+
+def start_profile():
+    if request.endpoint in (None, 'profiles', 'profile'):
+        return
+    mode = requested_mode()
+    if mode is None:
+        return
+    if mode == 'sampling':
+        profiler = SamplingProfiler(current_app.config.get('PROFILING_SAMPLE_INTERVAL', 0.005))
+    else:
+        profiler = CallProfiler()
+    try:
+        profiler.start()
+    except ValueError:
+        # another profiler is active (Python 3.12+ allows one per process)
+        return
+    g.profile = {
+        'id': '{:d}-{}'.format(int(time.time() * 1000), uuid.uuid4().hex[:8]),
+        'mode': mode, 'profiler': profiler, 'started': time.time(),
+        'clock': time.perf_counter()}
+
+
+def announce_profile(response):
+    profile = g.get('profile')
+    if profile is not None:
+        response.headers['X-Profile'] = url_for('profile', profile_id=profile['id'])
+    return response
+
+
+def finish_profile(exception=None):
+    # teardown runs after failed requests too, so the profiler always stops
+    profile = g.pop('profile', None)
+    if profile is None:
+        return
+    stacks = profile['profiler'].stop()
+    endpoint = request.endpoint or 'unknown'
+    save_trace({
+        'id': profile['id'],
+        'endpoint': endpoint,
+        'method': request.method,
+        'path': request.path,
+        'mode': profile['mode'],
+        'started': profile['started'],
+        'duration': time.perf_counter() - profile['clock'],
+        'error': repr(exception) if exception is not None else None,
+        # stacks are rooted at the endpoint, so traces of several requests
+        # can be merged and still be told apart
+        'stacks': dict((endpoint + ';' + stack, count) for stack, count in stacks.items()),
+    })
+
+#----------------------------------------------------------------------------#
+# Flamegraph.
+#----------------------------------------------------------------------------#
+
+
+def flame_boxes(stacks):
+    # [(depth, left, width, name)] with left and width as fractions of the
+    # total, laid out like flamegraph.pl (children sorted by name)
+    tree = {}
+    for stack, count in stacks.items():
+        node = tree
+        for name in stack.split(';'):
+            entry = node.setdefault(name, [0, {}])
+            entry[0] += count
+            node = entry[1]
+    total = float(sum(entry[0] for entry in tree.values())) or 1.0
+    boxes = []
+
+    def walk(node, depth, left):
+        for name in sorted(node):
+            count, children = node[name]
+            boxes.append((depth, left / total, count / total, name))
+            walk(children, depth + 1, left)
+            left += count
+
+    walk(tree, 0, 0)
+    return boxes
+
+
+def guarded():
+    if not authorized():
+        abort(404)
+
+
+def list_profiles():
+    guarded()
+    endpoint = request.args.get('view')
+    traces = [trace for trace in list_traces() if endpoint in (None, trace['endpoint'])]
+    return render_template('profiling/profiles.html', traces=traces,
+                           token=request.args.get('__token'))
+
+
+def show_profile(profile_id):
+    guarded()
+    trace = load_trace(profile_id)
+    if trace is None:
+        abort(404)
+    if request.args.get('format') == 'collapsed':
+        return Response(''.join('{} {}\n'.format(stack, count)
+                                for stack, count in sorted(trace['stacks'].items())),
+                        mimetype='text/plain')
+    boxes = flame_boxes(trace['stacks'])
+    depth = max([box[0] for box in boxes] or [0]) + 1
+    return render_template('profiling/flamegraph.html', trace=trace, boxes=boxes,
+                           depth=depth, token=request.args.get('__token'))
+
+
+def init_profiling(app):
+    if not app.config.get('PROFILING_ENABLED', False):
+        return
+    app.before_request(start_profile)
+    app.after_request(announce_profile)
+    app.teardown_request(finish_profile)
+    url = app.config.get('PROFILES_URL', '/_profiles')
+    app.add_url_rule(url, 'profiles', list_profiles)
+    app.add_url_rule(url + '/<profile_id>', 'profile', show_profile)
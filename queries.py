@@ -0,0 +1,129 @@
+from datetime import datetime
+from itertools import groupby
+from sqlalchemy.orm import selectinload
+from models import db, Venue, Artist, Show, ShowFeed
+from pagination import keyset_page
+
+#----------------------------------------------------------------------------#
+# Listing queries.
+#----------------------------------------------------------------------------#
+
+
+# listing sort keys; each ends with the id so that it identifies a row
+VENUE_KEY = [Venue.state, Venue.city, Venue.name, Venue.id]
+ARTIST_KEY = [Artist.name, Artist.id]
+SHOW_KEY = [ShowFeed.start_time, ShowFeed.show_id]
+
+
+def venue_areas(after=None, before=None):
+    # returns ([{city, state, venues: [{id, name, num_upcoming_shows}]}],
+    # next_cursor, prev_cursor) for one page of venues in a single round trip.
+    # Venues are ordered by area, so grouping them here is a linear pass.
+    query = db.session.query(
+        Venue.city,
+        Venue.state,
+        Venue.id,
+        Venue.name,
+        Venue.upcoming_shows_count.label('num_upcoming_shows')
+    ).filter(Venue.deleted_at.is_(None))
+    rows, next_cursor, prev_cursor = keyset_page(
+        query, VENUE_KEY, after=after, before=before)
+
+    areas = []
+    for (city, state), venues in groupby(rows, key=lambda row: (row.city, row.state)):
+        areas.append({
+            "city": city,
+            "state": state,
+            "venues": [{
+                "id": venue.id,
+                "name": venue.name,
+                "num_upcoming_shows": venue.num_upcoming_shows
+            } for venue in venues]
+        })
+    return areas, next_cursor, prev_cursor
+
+
+def artist_list(after=None, before=None):
+    query = db.session.query(Artist.id, Artist.name).filter(Artist.deleted_at.is_(None))
+    rows, next_cursor, prev_cursor = keyset_page(
+        query, ARTIST_KEY, after=after, before=before)
+    return [row._asdict() for row in rows], next_cursor, prev_cursor
+
+
+def show_list(after=None, before=None, now=None):
+    # one page of upcoming shows, read from the feed table (see feed.py) by its
+    # (start_time, show_id) index
+    now = now or datetime.now()
+    query = db.session.query(
+        ShowFeed.show_id,
+        ShowFeed.start_time,
+        ShowFeed.venue_id,
+        ShowFeed.venue_name,
+        ShowFeed.artist_id,
+        ShowFeed.artist_name,
+        ShowFeed.artist_image_link
+    ).filter(ShowFeed.start_time > now)
+    rows, next_cursor, prev_cursor = keyset_page(
+        query, SHOW_KEY, after=after, before=before)
+    shows = []
+    for row in rows:
+        show = row._asdict()
+        show["id"] = show.pop("show_id")
+        shows.append(show)
+    return shows, next_cursor, prev_cursor
+
+
+#----------------------------------------------------------------------------#
+# Detail page queries.
+#----------------------------------------------------------------------------#
+
+
+def split_shows(shows, counterpart, now=None):
+    # splits shows into (past, upcoming) in a single pass, describing each show
+    # by its counterpart ('Venue' or 'Artist') so the templates can link to it
+    now = now or datetime.now()
+    prefix = counterpart.lower()
+    past_shows = []
+    upcoming_shows = []
+    for show in sorted(shows, key=lambda show: show.start_time):
+        other = getattr(show, counterpart)
+        # soft deleted, and about to be purged with its shows
+        if other.deleted_at is not None:
+            continue
+        showDetails = {
+            prefix + "_id": other.id,
+            prefix + "_name": other.name,
+            prefix + "_image_link": other.image_link,
+            "start_time": show.start_time
+        }
+        if show.start_time > now:
+            upcoming_shows.append(showDetails)
+        else:
+            past_shows.append(showDetails)
+    return past_shows, upcoming_shows
+
+
+def load_detail(model, entity_id, counterpart, now=None):
+    # loads a Venue or Artist with its shows and each show's counterpart name
+    # and image in two statements, then attaches the past/upcoming split
+    counterpart_model = Artist if counterpart == 'Artist' else Venue
+    entity = model.query.options(
+        selectinload(model.shows).joinedload(getattr(Show, counterpart)).load_only(
+            counterpart_model.name, counterpart_model.image_link,
+            counterpart_model.deleted_at)
+    ).get(entity_id)
+    if entity is None or entity.deleted_at is not None:
+        return None
+
+    # the templates count these lists rather than showing the counters kept
+    # on the row, which include shows with soft deleted counterparts
+    entity.past_shows, entity.upcoming_shows = split_shows(entity.shows, counterpart, now)
+    return entity
+
+
+def venue_detail(venue_id, now=None):
+    return load_detail(Venue, venue_id, 'Artist', now)
+
+
+def artist_detail(artist_id, now=None):
+    return load_detail(Artist, artist_id, 'Venue', now)
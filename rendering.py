@@ -0,0 +1,68 @@
+from datetime import datetime
+from functools import lru_cache
+import babel.dates
+import dateutil.parser
+from markupsafe import Markup
+from models import app
+from cache import MemoryCache
+
+#----------------------------------------------------------------------------#
+# Date formatting.
+#----------------------------------------------------------------------------#
+
+# The queries hand native datetimes to the templates, and a page of show
+# tiles repeats the same few start times across requests, so formatted values
+# are memoised per (value, format).
+
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=app.config.get('DATETIME_FORMAT_CACHE_SIZE', 8192))
+def format_datetime(value, format='medium'):
+    # strings are still accepted for values that did not come from a query
+    date = value if isinstance(value, datetime) else dateutil.parser.parse(value)
+    return babel.dates.format_datetime(date, DATETIME_FORMATS.get(format, format))
+
+#----------------------------------------------------------------------------#
+# Fragment cache.
+#----------------------------------------------------------------------------#
+
+# A fragment is a small template rendered from one entity, e.g. a show tile.
+# It depends on nothing but its context, so the context itself is the
+# version in its key: an edited show, venue or artist produces a new key, and
+# entries for old versions simply age out of the LRU.
+
+fragments = MemoryCache(app.config.get('FRAGMENT_CACHE_SIZE', 20000),
+                        app.config.get('FRAGMENT_CACHE_TIMEOUT', 3600))
+
+
+def fragment(template_name, **context):
+    if not app.config.get('FRAGMENT_CACHE_ENABLED', True):
+        return Markup(app.jinja_env.get_template(template_name).render(**context))
+    key = template_name + repr(sorted(context.items()))
+    html = fragments.get(key)
+    if html is None:
+        html = app.jinja_env.get_template(template_name).render(**context)
+        fragments.set(key, html)
+    return Markup(html)
+
+#----------------------------------------------------------------------------#
+# Setup.
+#----------------------------------------------------------------------------#
+
+
+def precompile_templates(app):
+    # compiles every template into the environment's cache at startup instead
+    # of on the first request that uses it
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
+
+
+def init_rendering(app):
+    app.jinja_env.filters['datetime'] = format_datetime
+    app.jinja_env.globals['fragment'] = fragment
+    if app.config.get('PRECOMPILE_TEMPLATES', True):
+        precompile_templates(app)
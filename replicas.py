@@ -0,0 +1,119 @@
+import threading
+import time
+from itertools import count
+from flask import current_app, g, has_app_context, request
+from flask_sqlalchemy import SignallingSession, get_state
+from sqlalchemy import orm
+from sqlalchemy.exc import SQLAlchemyError
+from pool import PooledSQLAlchemy
+
+#----------------------------------------------------------------------------#
+# Read replicas.
+#----------------------------------------------------------------------------#
+
+# Each URI in SQLALCHEMY_REPLICA_URIS becomes a bind named replica_<n>. Requests
+# to the endpoints in REPLICA_ENDPOINTS pick one replica when they start and
+# every statement of that request that is not part of a flush runs on it.
+# Everything else runs on the primary, and so does every request from a client
+# that wrote within the last REPLICA_STICKY_SECONDS, so a redirect or reload
+# after a form submission shows what was just written.
+
+LAG_QUERY = (
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+    'ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp()) END')
+
+turns = count()
+# bind -> (checked_at, lag in seconds or None when unreachable), shared by
+# the request threads
+lags = {}
+lags_lock = threading.Lock()
+
+
+class RoutingSession(SignallingSession):
+    def get_bind(self, mapper=None, clause=None):
+        replica = g.get('replica') if has_app_context() else None
+        if replica is not None and not self._flushing:
+            return get_state(self.app).db.get_engine(self.app, bind=replica)
+        return super(RoutingSession, self).get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(PooledSQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def init_app(self, app):
+        register_replicas(app)
+        super(RoutingSQLAlchemy, self).init_app(app)
+        app.before_request(route_request)
+        app.after_request(stick_to_primary)
+
+
+def register_replicas(app):
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    for index, uri in enumerate(app.config.get('SQLALCHEMY_REPLICA_URIS') or []):
+        binds['replica_{}'.format(index)] = uri
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+
+def replica_names(app):
+    return ['replica_{}'.format(index)
+            for index in range(len(app.config.get('SQLALCHEMY_REPLICA_URIS') or []))]
+
+
+def replica_lag(app, name):
+    # the check itself runs outside the lock; two threads may both make it
+    with lags_lock:
+        checked_at, lag = lags.get(name, (0, None))
+    if time.monotonic() - checked_at < app.config.get('REPLICA_LAG_CHECK_INTERVAL', 5):
+        return lag
+    engine = get_state(app).db.get_engine(app, bind=name)
+    try:
+        if engine.dialect.name == 'postgresql':
+            with engine.connect() as connection:
+                lag = float(connection.execute(LAG_QUERY).scalar() or 0)
+        else:
+            # stand-ins without replication are never behind
+            lag = 0.0
+    except SQLAlchemyError as e:
+        app.logger.warning('replica %s unavailable: %s', name, e)
+        lag = None
+    with lags_lock:
+        lags[name] = (time.monotonic(), lag)
+    return lag
+
+
+def choose_replica(app):
+    # None means the primary; unreachable replicas and those further behind
+    # than REPLICA_MAX_LAG are skipped whatever the selection
+    names = replica_names(app)
+    if not names:
+        return None
+    max_lag = app.config.get('REPLICA_MAX_LAG', 30)
+    candidates = [(lag, name) for lag, name in
+                  ((replica_lag(app, name), name) for name in names)
+                  if lag is not None and lag <= max_lag]
+    if not candidates:
+        return None
+    if app.config.get('REPLICA_SELECTION', 'round_robin') == 'least_lag':
+        return min(candidates)[1]
+    return candidates[next(turns) % len(candidates)][1]
+
+
+def route_request():
+    config = current_app.config
+    g.replica = None
+    if (request.endpoint in config.get('REPLICA_ENDPOINTS', []) and
+            not request.cookies.get(config.get('REPLICA_STICKY_COOKIE', 'primary'))):
+        g.replica = choose_replica(current_app)
+
+
+def stick_to_primary(response):
+    # writes are never routed, so any other method is treated as one
+    config = current_app.config
+    if (request.method not in ('GET', 'HEAD', 'OPTIONS') and
+            request.endpoint not in config.get('REPLICA_ENDPOINTS', []) and
+            replica_names(current_app)):
+        response.set_cookie(config.get('REPLICA_STICKY_COOKIE', 'primary'), '1',
+                            max_age=config.get('REPLICA_STICKY_SECONDS', 10),
+                            httponly=True)
+    return response
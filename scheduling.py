@@ -0,0 +1,130 @@
+from operator import itemgetter
+from sortedcontainers import SortedKeyList
+from sqlalchemy import DateTime, bindparam, text
+from models import db, Show
+
+#----------------------------------------------------------------------------#
+# Show scheduling conflicts.
+#----------------------------------------------------------------------------#
+
+# A show books its venue and its artist for [start_time, end_time); two shows
+# of the same venue or artist must not overlap. On PostgreSQL the Show table
+# enforces this with GiST exclusion constraints over tsrange(start_time,
+# end_time), so concurrent inserts cannot double-book. The create form and
+# the import check first, to name the conflicting show.
+#
+# Since the bookings of one venue (or artist) never overlap, ordered by start
+# they are ordered by end as well: the only booking that can overlap a new
+# [start, end) is the last one starting before end. Finding it is one seek on
+# the (venue_id, start_time) index, or one bisect in an IntervalIndex, however
+# many shows the venue has. The import seeks the stored shows for a whole
+# chunk in a few statements and keeps the chunk's own rows in IntervalIndexes.
+
+FIELDS = ('venue_id', 'artist_id')
+# seeks per statement in the import check; SQLite allows 500 compound selects
+PREVIOUS_BATCH = 200
+# SQLSTATE of an exclusion constraint violation
+EXCLUSION_VIOLATION = '23P01'
+
+
+class ShowConflict(Exception):
+    def __init__(self, field, show_id, start_time, end_time):
+        self.field = field
+        self.show_id = show_id
+        self.start_time = start_time
+        self.end_time = end_time
+        Exception.__init__(self, '{} is booked from {} to {} by show {}'.format(
+            'The venue' if field == 'venue_id' else 'The artist',
+            start_time, end_time, show_id))
+
+
+def find_conflict(venue_id, artist_id, start_time, end_time):
+    # returns a ShowConflict for the first booking in the way, or None
+    for field, value in zip(FIELDS, (venue_id, artist_id)):
+        column = getattr(Show, field)
+        previous = db.session.query(Show.id, Show.start_time, Show.end_time).filter(
+            column == value, Show.start_time < end_time).order_by(
+                Show.start_time.desc()).first()
+        if previous is not None and previous.end_time > start_time:
+            return ShowConflict(field, *previous)
+    return None
+
+
+def is_exclusion_violation(error):
+    # the IntegrityError PostgreSQL raises when a concurrent insert won
+    return getattr(error.orig, 'pgcode', None) == EXCLUSION_VIOLATION
+
+
+class IntervalIndex(object):
+    # disjoint [start, end) intervals per key, kept sorted by start in a
+    # SortedKeyList, so that adding one costs O(log n) too rather than moving
+    # every later interval of a busy venue (seeding adds them in any order)
+
+    def __init__(self):
+        self.intervals = {}
+
+    def find(self, key, start, end):
+        # the (start, end, value) overlapping [start, end), or None
+        intervals = self.intervals.get(key)
+        if not intervals:
+            return None
+        position = intervals.bisect_key_left(end) - 1
+        if position >= 0 and intervals[position][1] > start:
+            return intervals[position]
+        return None
+
+    def add(self, key, start, end, value=None):
+        if key not in self.intervals:
+            self.intervals[key] = SortedKeyList(key=itemgetter(0))
+        self.intervals[key].add((start, end, value))
+
+
+def previous_bookings(field, rows):
+    # for each row values, the stored show of its venue (or artist) that starts
+    # last before the row ends, as (id, start_time, end_time) or None; one
+    # index seek per row, PREVIOUS_BATCH of them per statement
+    found = {}
+    for offset in range(0, len(rows), PREVIOUS_BATCH):
+        batch = rows[offset:offset + PREVIOUS_BATCH]
+        # written out as text: building it as a union of 200 selects costs far
+        # more than running it
+        statement = text(' UNION ALL '.join(
+            'SELECT * FROM (SELECT {0} AS seek, id, start_time, end_time FROM "Show" '
+            'WHERE {1} = :key_{0} AND start_time < :end_{0} '
+            'ORDER BY start_time DESC LIMIT 1) AS previous_{0}'.format(i, field)
+            for i in range(len(batch)))).bindparams(
+                *[bindparam('end_{}'.format(i), type_=DateTime) for i in range(len(batch))]
+            ).columns(start_time=DateTime, end_time=DateTime)
+        parameters = {}
+        for i, values in enumerate(batch):
+            parameters['key_{}'.format(i)] = values[field]
+            parameters['end_{}'.format(i)] = values['end_time']
+        for seek, show_id, start_time, end_time in db.session.execute(statement, parameters):
+            found[offset + seek] = (show_id, start_time, end_time)
+    return [found.get(i) for i in range(len(rows))]
+
+
+def booking_conflicts(rows):
+    # [(line_number, errors)] for the (line_number, values) rows that overlap a
+    # stored show or an earlier row; the others are booked in an IntervalIndex
+    stored = dict((field, previous_bookings(field, [values for _, values in rows]))
+                  for field in FIELDS)
+    indexes = dict((field, IntervalIndex()) for field in FIELDS)
+    errors = []
+    for i, (line_number, values) in enumerate(rows):
+        start, end = values['start_time'], values['end_time']
+        conflicts = {}
+        for field in FIELDS:
+            previous = stored[field][i]
+            if previous is not None and previous[2] > start:
+                booked = (previous[1], previous[2], 'show {}'.format(previous[0]))
+            else:
+                booked = indexes[field].find(values[field], start, end)
+            if booked is not None:
+                conflicts[field] = ['Booked from {} to {} by {}'.format(*booked)]
+        if conflicts:
+            errors.append((line_number, conflicts))
+            continue
+        for field in FIELDS:
+            indexes[field].add(values[field], start, end, 'line {}'.format(line_number))
+    return errors
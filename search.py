@@ -0,0 +1,156 @@
+from threading import Lock
+from sqlalchemy import event, func
+from sqlalchemy.orm import load_only
+from models import app, db, Venue, Artist
+
+#----------------------------------------------------------------------------#
+# Search text.
+#----------------------------------------------------------------------------#
+
+# venues and artists are searched by name, city, state and genres, flattened
+# into a lowercase search_text column. On PostgreSQL that column carries a
+# pg_trgm GIN index, so '%term%' patterns no longer scan the whole table.
+
+NGRAM = 3
+
+
+def build_search_text(target):
+    parts = [target.name, target.city, target.state] + list(target.genres or [])
+    return ' '.join(part for part in parts if part).lower()
+
+
+def set_search_text(mapper, connection, target):
+    target.search_text = build_search_text(target)
+
+
+for model in (Venue, Artist):
+    event.listen(model, 'before_insert', set_search_text)
+    event.listen(model, 'before_update', set_search_text)
+
+
+def escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+#----------------------------------------------------------------------------#
+# In-memory n-gram index (SQLite and tests).
+#----------------------------------------------------------------------------#
+
+# The index is per process, and other processes (workers, the importer, the
+# set-based deletes) write the tables too. So each search first reads the
+# table's row count and latest updated_at, and rebuilds the index when they
+# differ from the ones it was built at. That is one aggregate per search and a
+# full rebuild after every write: fine for development and the tests, which is
+# all this is for. PostgreSQL searches the table itself.
+
+
+def ngrams(text):
+    return set(text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1))
+
+
+class NgramIndex(object):
+    # maps each trigram to the ids of the rows containing it; a query only
+    # verifies the rows that contain every trigram of the search term
+
+    def __init__(self, version=None):
+        self.lock = Lock()
+        self.version = version
+        self.texts = {}
+        self.postings = {}
+
+    def add(self, row_id, text):
+        with self.lock:
+            self.discard_locked(row_id)
+            self.texts[row_id] = text
+            for gram in ngrams(text):
+                self.postings.setdefault(gram, set()).add(row_id)
+
+    def discard(self, row_id):
+        with self.lock:
+            self.discard_locked(row_id)
+
+    def discard_locked(self, row_id):
+        text = self.texts.pop(row_id, None)
+        if text is None:
+            return
+        for gram in ngrams(text):
+            ids = self.postings.get(gram)
+            if ids is not None:
+                ids.discard(row_id)
+                if not ids:
+                    del self.postings[gram]
+
+    def search(self, term):
+        # returns matching ids ranked by the share of trigrams they have in common
+        term = term.lower()
+        grams = ngrams(term)
+        with self.lock:
+            if grams:
+                candidates = set.intersection(
+                    *[self.postings.get(gram, set()) for gram in grams])
+            else:
+                candidates = set(self.texts)
+            matches = []
+            for row_id in candidates:
+                text = self.texts[row_id]
+                if term in text:
+                    text_grams = ngrams(text)
+                    score = len(grams & text_grams) / float(len(grams | text_grams) or 1)
+                    matches.append((-score, row_id))
+        return [row_id for _, row_id in sorted(matches)]
+
+
+indexes = {}
+indexes_lock = Lock()
+
+
+def table_version(model):
+    # every insert and update bumps updated_at; deletes lower the count
+    return tuple(db.session.query(func.count(model.id), func.max(model.updated_at)).one())
+
+
+def memory_index(model):
+    # built from the table on first use and again whenever it changed
+    version = table_version(model)
+    with indexes_lock:
+        index = indexes.get(model)
+        if index is None or index.version != version:
+            index = NgramIndex(version)
+            for row_id, text in db.session.query(model.id, model.search_text).filter(
+                    model.deleted_at.is_(None)):
+                index.add(row_id, text or '')
+            indexes[model] = index
+    return index
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+
+def search(model, term, page=1, per_page=None):
+    # returns {count, data, page, pages} with at most one page of rows loaded
+    per_page = per_page or app.config.get('SEARCH_PAGE_SIZE', 20)
+    page = max(page, 1)
+    term = term.strip().lower()
+
+    if db.engine.dialect.name == 'postgresql':
+        query = model.query.filter(model.search_text.like(
+            '%{}%'.format(escape_like(term)), escape='\\'), model.deleted_at.is_(None))
+        count = query.order_by(None).count()
+        data = query.options(load_only('id', 'name')).order_by(
+            func.similarity(model.search_text, term).desc(), model.name, model.id
+        ).limit(per_page).offset((page - 1) * per_page).all()
+    else:
+        ids = memory_index(model).search(term)
+        count = len(ids)
+        page_ids = ids[(page - 1) * per_page:page * per_page]
+        rows = dict((row.id, row) for row in model.query.options(
+            load_only('id', 'name')).filter(model.id.in_(page_ids), model.deleted_at.is_(None)))
+        data = [rows[row_id] for row_id in page_ids if row_id in rows]
+
+    return {
+        "count": count,
+        "data": data,
+        "page": page,
+        "pages": (count + per_page - 1) // per_page
+    }
+
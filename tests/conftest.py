@@ -0,0 +1,101 @@
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+
+# the app reads DATABASE_URL when config.py is imported; the tests run on a
+# SQLite file, which every connection (and thread) of the engine shares
+DATABASE = os.path.join(tempfile.mkdtemp(prefix='fyyur-tests-'), 'fyyur.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + DATABASE
+
+import app as views  # noqa: E402
+from models import app as flask_app, db as database, Venue, Artist, Show  # noqa: E402
+from search import indexes  # noqa: E402
+
+#----------------------------------------------------------------------------#
+# App and database.
+#----------------------------------------------------------------------------#
+
+
+@pytest.fixture
+def app():
+    config = dict(flask_app.config)
+    flask_app.config.update(
+        TESTING=True, WTF_CSRF_ENABLED=False, CACHE_ENABLED=False, JOBS_EAGER=True)
+    yield flask_app
+    flask_app.config.clear()
+    flask_app.config.update(config)
+
+
+@pytest.fixture
+def db(app):
+    # a fresh schema per test
+    with app.app_context():
+        database.session.remove()
+        database.drop_all()
+        database.create_all()
+        indexes.clear()
+        yield database
+        database.session.remove()
+    indexes.clear()
+
+
+@pytest.fixture
+def client(app, db):
+    return app.test_client()
+
+
+@pytest.fixture
+def count_queries(db):
+    # with count_queries() as queries: ...; queries is a list of the statements
+    @contextmanager
+    def counting():
+        statements = []
+
+        def before_cursor_execute(connection, cursor, statement, *args):
+            statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return counting
+
+#----------------------------------------------------------------------------#
+# Rows.
+#----------------------------------------------------------------------------#
+
+
+@pytest.fixture
+def make_venue(db):
+    def make_venue(name='The Musical Hop', city='San Francisco', state='CA', **fields):
+        venue = Venue(name=name, city=city, state=state, address='1015 Folsom Street',
+                      genres=fields.pop('genres', ['Jazz']), **fields)
+        db.session.add(venue)
+        db.session.commit()
+        return venue
+    return make_venue
+
+
+@pytest.fixture
+def make_artist(db):
+    def make_artist(name='Guns N Petals', city='San Francisco', state='CA', **fields):
+        artist = Artist(name=name, city=city, state=state,
+                        genres=fields.pop('genres', ['Rock n Roll']), **fields)
+        db.session.add(artist)
+        db.session.commit()
+        return artist
+    return make_artist
+
+
+@pytest.fixture
+def make_show(db):
+    def make_show(venue, artist, start_time=None, days=1):
+        start_time = start_time or datetime.now().replace(microsecond=0) + timedelta(days=days)
+        show = Show(venue_id=venue.id, artist_id=artist.id, start_time=start_time)
+        db.session.add(show)
+        db.session.commit()
+        return show
+    return make_show
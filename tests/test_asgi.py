@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+
+pytest.importorskip('aiosqlite')
+from asgi import Application  # noqa: E402
+
+
+@pytest.fixture
+def asgi_get(app, db):
+    # asgi_get(path, **headers) -> (status, headers, body) from the async app
+    application = Application(app)
+
+    async def call(path, headers):
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+        await application({
+            'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'',
+            'headers': [(name.replace('_', '-').encode(), value.encode())
+                        for name, value in headers.items()],
+            'scheme': 'http', 'server': ('localhost', 80), 'root_path': '',
+            'http_version': '1.1', 'client': ('127.0.0.1', 1)
+        }, receive, send)
+        return messages
+
+    def get(path, **headers):
+        messages = asyncio.run(call(path, headers))
+        start = messages[0]
+        return (start['status'],
+                dict((name.decode(), value.decode()) for name, value in start['headers']),
+                b''.join(message.get('body', b'') for message in messages[1:]))
+    yield get
+
+    async def close():
+        for pool in application.pools.values():
+            await pool.close()
+    asyncio.run(close())
+
+
+@pytest.fixture
+def booked(make_venue, make_artist, make_show):
+    venue, artist = make_venue(), make_artist()
+    make_show(venue, artist, days=-2)
+    make_show(venue, artist, days=3)
+    return venue.id, artist.id
+
+
+@pytest.mark.parametrize('path', ['/api/v1/venues/{venue}', '/api/v1/artists/{artist}'])
+def test_async_json_matches_wsgi(client, asgi_get, booked, path):
+    path = path.format(venue=booked[0], artist=booked[1])
+    wsgi = client.get(path)
+    status, headers, body = asgi_get(path)
+    assert status == 200
+    assert body == wsgi.data
+    assert headers['etag'] == wsgi.headers['ETag']
+    assert headers['last-modified'] == wsgi.headers['Last-Modified']
+
+
+def test_async_page_answers_conditional_gets(client, asgi_get, booked):
+    path = '/venues/{}'.format(booked[0])
+    status, headers, body = asgi_get(path)
+    assert status == 200
+    assert b'The Musical Hop' in body
+    assert headers['etag'] == client.get(path).headers['ETag']
+    status, _, body = asgi_get(path, if_none_match=headers['etag'])
+    assert (status, body) == (304, b'')
+    status, _, _ = asgi_get(path, if_modified_since=headers['last-modified'])
+    assert status == 304
+
+
+def test_unknown_ids_get_the_wsgi_404(asgi_get):
+    assert asgi_get('/api/v1/venues/1')[0] == 404
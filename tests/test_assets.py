@@ -0,0 +1,91 @@
+import gzip
+import json
+import os
+import pytest
+from flask import Flask, url_for
+import assets
+from assets import IMMUTABLE, build_assets, init_assets
+
+BUNDLES = {'app.css': ['css/main.css'], 'app.js': ['js/one.js', 'js/two.js']}
+STYLESHEET = b'/* the layout */\nbody {\n  background: url("../img/bg.png");\n}\n'
+
+
+@pytest.fixture
+def static(tmp_path):
+    # a small static/ tree: a stylesheet pointing at an image, two scripts
+    files = {
+        'css/main.css': STYLESHEET,
+        'img/bg.png': b'\x89PNG not really',
+        'js/one.js': b'function one() {\n  return 1\n}\n',
+        'js/two.js': b'var two = one() + 1;\n',
+    }
+    for name, content in files.items():
+        path = tmp_path / 'static' / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+    return tmp_path / 'static'
+
+
+def test_build_writes_hashed_and_compressed_files(static):
+    manifest = build_assets(str(static), BUNDLES)
+    assert sorted(manifest) == ['app.css', 'app.js', 'css/main.css', 'img/bg.png',
+                                'js/one.js', 'js/two.js']
+    with open(str(static / 'dist' / 'manifest.json')) as f:
+        assert json.load(f) == manifest
+    assert manifest['img/bg.png'].startswith('dist/img/bg.')
+    assert manifest['img/bg.png'].endswith('.png')
+
+    image = os.path.basename(manifest['img/bg.png']).encode()
+    # url()s point at the hashed image, relative to each stylesheet
+    assert b'url("../img/' + image + b'")' in (static / manifest['css/main.css']).read_bytes()
+    bundle = (static / manifest['app.css']).read_bytes()
+    assert b'url("img/' + image + b'")' in bundle
+    assert b'/*' not in bundle and b'\n' not in bundle
+    scripts = (static / manifest['app.js']).read_bytes().split(b'\n;\n')
+    assert len(scripts) == 2 and b'one()' in scripts[1]
+
+    for name in ['app.css', 'app.js', 'css/main.css']:
+        content = (static / manifest[name]).read_bytes()
+        assert gzip.decompress((static / (manifest[name] + '.gz')).read_bytes()) == content
+        if assets.brotli is not None:
+            assert assets.brotli.decompress((static / (manifest[name] + '.br')).read_bytes()) == content
+    assert not (static / (manifest['img/bg.png'] + '.gz')).exists()
+
+    # the same sources give the same names
+    assert build_assets(str(static), BUNDLES) == manifest
+
+
+@pytest.fixture
+def built(static):
+    build_assets(str(static), BUNDLES)
+    app = Flask(__name__, static_folder=str(static))
+    app.config['ASSET_BUNDLES'] = BUNDLES
+    init_assets(app)
+    return app
+
+
+def test_hashed_files_are_served_precompressed_and_immutable(built):
+    client = built.test_client()
+    with built.test_request_context():
+        url = url_for('static', filename='css/main.css')
+        assert assets.bundle_urls('app.js') == [url_for('static', filename='app.js')]
+    assert '/dist/css/main.' in url
+    plain = client.get(url)
+    assert (plain.mimetype, plain.headers['Cache-Control']) == ('text/css', IMMUTABLE)
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.headers['Vary'] == 'Accept-Encoding'
+
+    compressed = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert compressed.mimetype == 'text/css'
+    assert gzip.decompress(compressed.data) == plain.data
+    if assets.brotli is not None:
+        compressed = client.get(url, headers={'Accept-Encoding': 'gzip, br'})
+        assert compressed.headers['Content-Encoding'] == 'br'
+        assert assets.brotli.decompress(compressed.data) == plain.data
+        assert compressed.headers['Cache-Control'] == IMMUTABLE
+
+    source = client.get('/static/css/main.css', headers={'Accept-Encoding': 'gzip'})
+    assert source.data == STYLESHEET
+    assert 'Content-Encoding' not in source.headers
+    assert source.headers.get('Cache-Control') != IMMUTABLE
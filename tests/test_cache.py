@@ -0,0 +1,111 @@
+import time
+import pytest
+from cache import MemoryCache, RedisCache, cache, cached_venue_areas, invalidate_venue_shows
+
+
+@pytest.fixture
+def listing_cache(app, db):
+    app.config['CACHE_ENABLED'] = True
+    cache.clear()
+    yield cache
+    cache.clear()
+
+
+def test_memory_cache_invalidates_by_tag():
+    memory = MemoryCache()
+    memory.set('a', 1, tags=['x', 'y'])
+    memory.set('b', 2, tags=['y'])
+    memory.invalidate('x')
+    assert memory.get('a') is None
+    assert memory.get('b') == 2
+    # a left its other tag sets too
+    assert memory.tags == {'y': {'b'}}
+
+
+def test_memory_cache_prunes_tags_of_evicted_entries():
+    memory = MemoryCache(max_entries=2)
+    for i in range(100):
+        memory.set('venues:{}'.format(i), i, tags=['venues', 'cursor:{}'.format(i)])
+    assert list(memory.entries) == ['venues:98', 'venues:99']
+    assert memory.tags == {'venues': {'venues:98', 'venues:99'},
+                           'cursor:98': {'venues:98'}, 'cursor:99': {'venues:99'}}
+
+
+def test_memory_cache_prunes_tags_of_expired_entries(monkeypatch):
+    memory = MemoryCache(default_timeout=10)
+    memory.set('a', 1, tags=['x'])
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 11)
+    assert memory.get('a') is None
+    assert memory.entries == {}
+    assert memory.tags == {}
+
+
+def test_memory_cache_replaces_tags_on_set():
+    memory = MemoryCache()
+    memory.set('a', 1, tags=['x'])
+    memory.set('a', 2, tags=['y'])
+    assert memory.tags == {'y': {'a'}}
+    memory.invalidate('x')
+    assert memory.get('a') == 2
+
+
+def test_redis_cache_against_fake():
+    fakeredis = pytest.importorskip('fakeredis')
+    shared = RedisCache(fakeredis.FakeRedis())
+    shared.set('a', {'rows': [1]}, tags=['x'])
+    shared.set('b', 2, tags=['y'])
+    assert shared.get('a') == {'rows': [1]}
+    shared.invalidate('x')
+    assert shared.get('a') is None
+    assert shared.get('b') == 2
+    shared.clear()
+    assert shared.get('b') is None
+
+
+def test_new_venue_drops_its_area_page(client, listing_cache, make_venue):
+    make_venue(name='The Musical Hop')
+    assert b'The Musical Hop' in client.get('/venues').data
+    assert listing_cache.get('venues:None:None') is not None
+
+    response = client.post('/venues/create', data={
+        'name': 'Park Square Live Music', 'city': 'San Francisco', 'state': 'CA',
+        'address': '34 Whiskey Moore Ave', 'phone': '415-000-1234', 'genres': ['Jazz'],
+        'website': '', 'image_link': '', 'seeking_talent': 'False',
+        'seeking_description': '', 'facebook_link': ''})
+    assert response.status_code == 200
+    assert listing_cache.get('venues:None:None') is None
+    assert b'Park Square Live Music' in client.get('/venues').data
+
+
+def test_cached_listing_is_served_until_invalidated(listing_cache, make_venue):
+    make_venue(name='The Musical Hop')
+    first = cached_venue_areas()
+    make_venue(name='Park Square Live Music', city='Oakland')
+    # written behind the cache's back, so still the cached page
+    assert cached_venue_areas() == first
+    listing_cache.invalidate('venues')
+    assert cached_venue_areas() != first
+
+
+def test_new_show_drops_the_pages_listing_its_venue(client, listing_cache, count_queries,
+                                                   make_venue, make_artist):
+    venue, artist = make_venue(), make_artist()
+    venue_id, artist_id = venue.id, artist.id
+    make_venue(name='Park Square Live Music', city='Oakland')
+    client.get('/venues')
+    client.get('/shows')
+    assert listing_cache.get('venues:None:None') is not None
+
+    with count_queries() as statements:
+        invalidate_venue_shows(venue_id)
+    assert statements == []
+    assert listing_cache.get('venues:None:None') is None
+    assert listing_cache.get('shows:None:None') is None
+
+    client.get('/venues')
+    client.post('/shows/create', data={'venue_id': venue_id, 'artist_id': artist_id,
+                                       'start_time': '2100-01-01 20:00:00'})
+    areas = cached_venue_areas()[0]
+    assert [venue['num_upcoming_shows'] for area in areas for venue in area['venues']
+            if venue['id'] == venue_id] == [1]
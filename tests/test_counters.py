@@ -0,0 +1,69 @@
+import time
+from datetime import datetime, timedelta, timezone
+import pytest
+from models import Venue, Artist, Show
+from counters import check_counters, rollover
+
+
+def test_counters_follow_show_writes(db, make_venue, make_artist, make_show):
+    venue, artist = make_venue(), make_artist()
+    show = make_show(venue, artist, days=2)
+    make_show(venue, artist, days=-2)
+    assert (venue.upcoming_shows_count, venue.past_shows_count) == (1, 1)
+
+    show.start_time = datetime.now() - timedelta(days=1)
+    db.session.commit()
+    assert (artist.upcoming_shows_count, artist.past_shows_count) == (0, 2)
+    db.session.delete(show)
+    db.session.commit()
+    assert (venue.upcoming_shows_count, venue.past_shows_count) == (0, 1)
+    assert check_counters(Venue) == check_counters(Artist) == []
+
+
+@pytest.fixture
+def local_zone(monkeypatch):
+    # a local zone that is neither UTC nor the offset of the aware times
+    monkeypatch.setenv('TZ', 'IST-5:30')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_string_and_aware_start_times_are_naive_local(db, local_zone, make_venue, make_artist):
+    venue, artist = make_venue(), make_artist()
+    later = datetime.now().replace(microsecond=0) + timedelta(days=1)
+    aware = later.astimezone(timezone(timedelta(hours=-8)))
+    assert aware.replace(tzinfo=None) != later
+    db.session.add(Show(venue_id=venue.id, artist_id=artist.id, start_time=aware))
+    db.session.add(Show(venue_id=venue.id, artist_id=artist.id,
+                        start_time=aware.isoformat()))
+    db.session.add(Show(venue_id=venue.id, artist_id=artist.id,
+                        start_time=(later + timedelta(days=1)).isoformat()))
+    db.session.commit()
+    assert sorted(show.start_time for show in Show.query) == \
+        [later, later, later + timedelta(days=1)]
+    assert venue.upcoming_shows_count == 3
+    assert check_counters(Venue) == []
+
+
+def test_rollover_moves_started_shows(db, make_venue, make_artist, make_show):
+    venue = make_venue()
+    make_show(venue, make_artist(), days=1)
+    assert rollover(now=datetime.now() + timedelta(days=2)) == 2
+    assert (venue.upcoming_shows_count, venue.past_shows_count) == (0, 1)
+
+
+def test_detail_pages_count_the_shows_they_list(db, client, make_venue, make_artist, make_show):
+    venue = make_venue()
+    gone = make_artist(name='The Wild Sax Band')
+    make_show(venue, make_artist(), days=1)
+    make_show(venue, gone, days=2)
+    gone.deleted_at = datetime.utcnow()
+    db.session.commit()
+    page = client.get('/venues/{}'.format(venue.id)).data
+    assert b'1 Upcoming Show' in page
+    assert b'The Wild Sax Band' not in page
+    data = client.get('/api/v1/venues/{}'.format(venue.id)).get_json()
+    assert data['upcoming_shows_count'] == len(data['upcoming_shows']) == 1
+    assert Artist.query.get(gone.id).upcoming_shows_count == 1
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+from models import Venue, Artist, Show, ShowFeed
+from counters import check_counters
+from deletion import delete_entities, purge_deleted, soft_delete
+
+TOKEN = 'delete-token'
+
+
+def booked_venues(make_venue, make_artist, make_show, count):
+    artist = make_artist()
+    venues = [make_venue(name='Venue {}'.format(i)) for i in range(count)]
+    for venue in venues:
+        make_show(venue, artist, days=1)
+        make_show(venue, artist, days=-1)
+    return [venue.id for venue in venues], artist.id
+
+
+def test_delete_takes_the_shows_along(app, make_venue, make_artist, make_show):
+    # SQLite does not cascade, so the shows and feed rows go first
+    app.config['DELETE_CHUNK_SIZE'] = 2
+    ids, artist_id = booked_venues(make_venue, make_artist, make_show, 5)
+    assert ShowFeed.query.count() == 5
+    assert delete_entities(Venue, ids[:3] + [ids[0], 1000]) == 3
+    assert Venue.query.count() == 2
+    assert Show.query.filter(Show.venue_id.in_(ids[:3])).count() == 0
+    assert ShowFeed.query.count() == 2
+    artist = Artist.query.get(artist_id)
+    assert (artist.upcoming_shows_count, artist.past_shows_count) == (2, 2)
+    assert check_counters(Artist) == []
+
+
+def test_soft_delete_hides_until_the_purge(client, make_venue, make_artist, make_show):
+    # JOBS_EAGER is on in the tests; the purge must still wait for its run
+    ids, artist_id = booked_venues(make_venue, make_artist, make_show, 2)
+    before = datetime.utcnow()
+    assert soft_delete(Venue, ids[:1]) == 1
+    assert soft_delete(Venue, ids[:1]) == 0
+    hidden = Venue.query.get(ids[0])
+    assert before <= hidden.deleted_at <= datetime.utcnow() + timedelta(seconds=1)
+    assert client.get('/venues/{}'.format(ids[0])).status_code == 404
+    assert b'Venue 0' not in client.get('/venues').data
+    assert b'1 Upcoming Show' in client.get('/artists/{}'.format(artist_id)).data
+    assert ShowFeed.query.count() == 1
+
+    assert purge_deleted('venues') == 1
+    assert Venue.query.get(ids[0]) is None
+    assert Show.query.count() == 2
+
+
+def test_bulk_delete_api(app, client, make_venue):
+    venue_id = make_venue().id
+    path = '/api/v1/venues/bulk-delete'
+    assert client.post(path, json={'ids': [venue_id]}).status_code == 404
+    app.config['ADMIN_TOKEN'] = TOKEN
+    headers = {'X-Admin-Token': TOKEN}
+    assert client.post(path, json={'ids': [venue_id]}).status_code == 403
+    assert client.post(path, json={'ids': ['1']}, headers=headers).status_code == 400
+    response = client.post(path, json={'ids': [venue_id], 'soft': True}, headers=headers)
+    assert response.get_json() == {'requested': 1, 'deleted': 1, 'soft': True}
+    assert Venue.query.get(venue_id).deleted_at is not None
@@ -0,0 +1,50 @@
+import pytest
+
+# two statements for the validators, then one for the entity and one for its
+# shows joined with the counterpart, however many shows there are
+MAX_QUERIES = 4
+PAGES = ['/venues/{venue}', '/artists/{artist}', '/api/v1/venues/{venue}',
+         '/api/v1/artists/{artist}']
+
+
+@pytest.fixture
+def booked(make_venue, make_artist, make_show):
+    # booked(n): a venue and an artist with n shows together, half of them past
+    def booked(shows):
+        venue = make_venue()
+        artist = make_artist()
+        for i in range(shows):
+            days = i - shows // 2
+            make_show(venue, artist, days=days + 1 if days >= 0 else days)
+        return {'venue': venue.id, 'artist': artist.id}
+    return booked
+
+
+@pytest.mark.parametrize('page', PAGES)
+def test_detail_query_count_does_not_grow_with_shows(db, client, booked, count_queries, page):
+    counts = []
+    for shows in (1, 10, 50):
+        db.drop_all()
+        db.create_all()
+        path = page.format(**booked(shows))
+        with count_queries() as statements:
+            response = client.get(path)
+        assert response.status_code == 200
+        counts.append(len(statements))
+    assert counts[0] == counts[-1], counts
+    assert max(counts) <= MAX_QUERIES, counts
+
+
+def test_detail_page_lists_past_and_upcoming_shows(client, booked):
+    ids = booked(4)
+    data = client.get('/api/v1/venues/{}'.format(ids['venue'])).get_json()
+    assert len(data['past_shows']) == 2
+    assert len(data['upcoming_shows']) == 2
+    assert data['upcoming_shows'][0]['artist_name'] == 'Guns N Petals'
+    response = client.get('/artists/{}'.format(ids['artist']))
+    assert b'The Musical Hop' in response.data
+
+
+def test_missing_detail_pages(client):
+    assert client.get('/venues/1').status_code == 404
+    assert client.get('/api/v1/artists/1').status_code == 404
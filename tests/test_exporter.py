@@ -0,0 +1,87 @@
+import csv
+import gzip
+import io
+import json
+import os
+from datetime import datetime, timedelta
+from models import Venue
+from exporter import export_file, export_rows, read_state
+
+TOKEN = 'export-token'
+
+
+def read_gzip(path):
+    with gzip.open(path, 'rt', newline='') as f:
+        return f.read()
+
+
+def touch(db, venue, updated_at):
+    # updated_at as if the row had last been written then
+    db.session.query(Venue).filter_by(id=venue.id).update(
+        {'updated_at': updated_at}, synchronize_session=False)
+    db.session.commit()
+
+
+def test_rows_come_in_chunks(app, make_venue):
+    app.config['EXPORT_CHUNK_SIZE'] = 2
+    for i in range(5):
+        make_venue(name='Venue {}'.format(i))
+    chunks = list(export_rows(Venue))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert [row.name for chunk in chunks for row in chunk] == ['Venue {}'.format(i) for i in range(5)]
+
+
+def test_only_rows_changed_in_the_window(db, make_venue):
+    now = datetime(2024, 5, 1)
+    for days, name in [(-3, 'Before'), (-1, 'Inside'), (0, 'At the end'), (1, 'After')]:
+        touch(db, make_venue(name=name), now + timedelta(days=days))
+    rows = [row for chunk in export_rows(Venue, since=now - timedelta(days=3), until=now)
+            for row in chunk]
+    assert [row.name for row in rows] == ['Inside', 'At the end']
+
+
+def test_csv_and_ndjson_files(db, tmp_path, make_venue):
+    venue = make_venue(genres=['Jazz', 'Folk'])
+    until = datetime(2030, 1, 1)
+    path = export_file('venues', 'csv', str(tmp_path), until=until)
+    assert os.path.basename(path) == 'venues-20300101T000000.csv.gz'
+    rows = list(csv.DictReader(io.StringIO(read_gzip(path))))
+    assert [(row['id'], row['name'], row['genres']) for row in rows] == \
+        [(str(venue.id), 'The Musical Hop', 'Jazz;Folk')]
+    assert 'search_text' not in rows[0]
+
+    path = export_file('venues', 'ndjson', str(tmp_path), until=until)
+    assert path.endswith('.ndjson.gz')
+    rows = [json.loads(line) for line in read_gzip(path).splitlines()]
+    assert [(row['id'], row['genres']) for row in rows] == [(venue.id, ['Jazz', 'Folk'])]
+    assert rows[0]['updated_at'] == venue.updated_at.isoformat()
+
+
+def test_incremental_runs_continue_where_the_last_one_stopped(app, db, tmp_path, make_venue):
+    app.config['EXPORT_SAFETY_LAG'] = 0
+    make_venue(name='Old')
+    changed = make_venue(name='Changed')
+    runner = app.test_cli_runner()
+    directory = str(tmp_path)
+
+    def export():
+        result = runner.invoke(args=['export', directory, '--kind', 'venues',
+                                     '--format', 'ndjson', '--incremental'])
+        assert result.exit_code == 0, result.output
+        return [json.loads(line)['name'] for line in read_gzip(result.output.strip()).splitlines()]
+    assert export() == ['Old', 'Changed']
+    first = read_state(os.path.join(directory, 'export_state.json'))
+    touch(db, changed, datetime.utcnow())
+    assert export() == ['Changed']
+    assert read_state(os.path.join(directory, 'export_state.json')) > first
+
+
+def test_export_api_needs_the_admin_token(app, client, make_venue):
+    make_venue()
+    path = '/api/v1/export/venues'
+    assert client.get(path).status_code == 404
+    app.config['ADMIN_TOKEN'] = TOKEN
+    assert client.get(path, headers={'X-Admin-Token': 'wrong'}).status_code == 403
+    response = client.get(path, headers={'X-Admin-Token': TOKEN})
+    assert response.mimetype == 'application/gzip'
+    assert json.loads(gzip.decompress(response.data))['name'] == 'The Musical Hop'
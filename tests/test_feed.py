@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+from models import Show, ShowFeed
+from feed import refresh_feed
+
+
+def feed_rows():
+    return [(row.show_id, row.start_time, row.venue_name, row.artist_name)
+            for row in ShowFeed.query.order_by(ShowFeed.start_time)]
+
+
+def test_show_writes_update_the_feed(db, make_venue, make_artist, make_show):
+    venue, artist = make_venue(), make_artist()
+    show = make_show(venue, artist, days=2)
+    make_show(venue, artist, days=-2)
+    assert feed_rows() == [(show.id, show.start_time, 'The Musical Hop', 'Guns N Petals')]
+
+    # moved to another venue and a day earlier
+    other = make_venue(name='Park Square Live Music')
+    show.venue_id = other.id
+    show.start_time = show.start_time - timedelta(days=1)
+    db.session.commit()
+    assert feed_rows() == [(show.id, show.start_time, 'Park Square Live Music', 'Guns N Petals')]
+
+    # moved into the past
+    show.start_time = datetime.now() - timedelta(days=1)
+    db.session.commit()
+    assert feed_rows() == []
+
+    show.start_time = datetime.now().replace(microsecond=0) + timedelta(days=3)
+    db.session.commit()
+    assert len(feed_rows()) == 1
+    db.session.delete(show)
+    db.session.commit()
+    assert feed_rows() == []
+
+
+def test_renames_reach_the_feed(db, make_venue, make_artist, make_show):
+    venue, artist = make_venue(), make_artist()
+    make_show(venue, artist)
+    venue.name = 'The Dueling Pianos Bar'
+    artist.name = 'Matt Quevedo'
+    db.session.commit()
+    assert [row[2:] for row in feed_rows()] == [('The Dueling Pianos Bar', 'Matt Quevedo')]
+
+
+def test_refresh_drops_started_shows(db, make_venue, make_artist, make_show):
+    venue, artist = make_venue(), make_artist()
+    soon = make_show(venue, artist, days=1)
+    later = make_show(venue, artist, days=3)
+    counts = refresh_feed(now=datetime.now() + timedelta(days=2))
+    db.session.commit()
+    assert counts == {'removed': 1, 'renamed': 0, 'added': 0}
+    assert [row[0] for row in feed_rows()] == [later.id]
+    assert Show.query.get(soon.id) is not None
+
+
+def test_refresh_repairs_bulk_writes(db, make_venue, make_artist, make_show):
+    venue, artist = make_venue(), make_artist()
+    show = make_show(venue, artist)
+    moved = show.start_time + timedelta(hours=1)
+    # writes that bypass the ORM events
+    db.session.execute(ShowFeed.__table__.delete())
+    db.session.execute(Show.__table__.update().values(start_time=moved))
+    counts = refresh_feed()
+    db.session.commit()
+    assert counts['added'] == 1
+    assert [row[:2] for row in feed_rows()] == [(show.id, moved)]
@@ -0,0 +1,80 @@
+import pytest
+from cache import cache
+
+
+@pytest.fixture
+def listing_cache(app, db):
+    app.config['CACHE_ENABLED'] = True
+    cache.clear()
+    yield cache
+    cache.clear()
+
+
+def test_listing_validators_come_from_the_cache_entry(client, listing_cache, make_venue,
+                                                      count_queries):
+    make_venue(name='The Musical Hop')
+    first = client.get('/venues')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert first.headers['Last-Modified']
+
+    # a cache hit answers the revalidation without touching the database
+    with count_queries() as statements:
+        response = client.get('/venues', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert statements == []
+
+
+def test_listing_etag_names_the_body_until_invalidated(client, listing_cache, make_venue):
+    make_venue(name='The Musical Hop')
+    etag = client.get('/venues').headers['ETag']
+    # a write whose invalidation has not run yet (queued for a worker)
+    make_venue(name='Park Square Live Music', city='Oakland')
+    response = client.get('/venues', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+    listing_cache.invalidate('venues')
+    response = client.get('/venues', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert b'Park Square Live Music' in response.data
+
+
+def test_listing_pages_have_their_own_validators(app, client, listing_cache, make_artist):
+    app.config['LISTING_PAGE_SIZE'] = 1
+    make_artist(name='A')
+    make_artist(name='B')
+    first = client.get('/artists')
+    cursor = first.data.split(b'after=')[1].split(b'"')[0].decode()
+    second = client.get('/artists?after=' + cursor)
+    assert second.status_code == 200
+    assert second.headers['ETag'] != first.headers['ETag']
+
+
+def test_no_listing_validators_without_the_cache(client, make_venue):
+    make_venue()
+    response = client.get('/venues')
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+
+
+def test_detail_etag_changes_with_its_shows(client, make_venue, make_artist, make_show):
+    venue = make_venue()
+    artist = make_artist()
+    path = '/venues/{}'.format(venue.id)
+    etag = client.get(path).headers['ETag']
+    assert client.get(path, headers={'If-None-Match': etag}).status_code == 304
+    make_show(venue, artist)
+    response = client.get(path, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_flashed_pages_are_not_validated(client, listing_cache, make_venue):
+    make_venue()
+    etag = client.get('/venues').headers['ETag']
+    with client.session_transaction() as session:
+        session['_flashes'] = [('message', 'Saved')]
+    response = client.get('/venues', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'Saved' in response.data
@@ -0,0 +1,165 @@
+import io
+import os
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import images
+from images import FetchError, fetch, thumbnail_url
+
+JPEG = os.path.join(os.path.dirname(__file__), os.pardir, 'static', 'img', 'front-splash.jpg')
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    with open(JPEG, 'rb') as f:
+        body = f.read()
+    redirects = {
+        '/moved': 'http://images.test:{port}/a.jpg',
+        '/to-ftp': 'ftp://10.0.0.1/a.jpg',
+        '/to-private': 'http://10.0.0.1:{port}/a.jpg',
+    }
+
+    def do_GET(self):
+        self.server.hits.append((self.path, self.headers['Host']))
+        if self.path in self.redirects:
+            self.send_response(302)
+            self.send_header('Location', self.redirects[self.path].format(port=self.server.server_port))
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.hits = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def proxy(app, tmp_path):
+    app.config.update(IMAGE_PROXY_KEY='test-key', IMAGE_CACHE_DIR=str(tmp_path),
+                      IMAGE_ALLOW_PRIVATE=True)
+    images.failures.clear()
+    yield app
+    images.failures.clear()
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    # images.test resolves to the stub; every lookup is recorded
+    resolved = []
+    getaddrinfo = socket.getaddrinfo
+
+    def fake_getaddrinfo(host, port, *args, **kwargs):
+        resolved.append(host)
+        return getaddrinfo('127.0.0.1' if host == 'images.test' else host, port, *args, **kwargs)
+    monkeypatch.setattr(socket, 'getaddrinfo', fake_getaddrinfo)
+    return resolved
+
+
+def source(stub, path='/a.jpg', host='127.0.0.1'):
+    return 'http://{}:{}{}'.format(host, stub.server_port, path)
+
+
+def test_links_are_signed_and_checked(proxy, client, stub):
+    with proxy.test_request_context():
+        url = thumbnail_url(source(stub))
+    assert url.startswith('/images/tile/')
+    assert client.get(url).status_code == 200
+    signature = url.split('/')[3].split('?')[0]
+    assert client.get(url.replace(signature, '0' * 32)).status_code == 404
+    assert client.get(url.replace('/tile/', '/detail/')).status_code == 404
+
+
+def test_no_key_no_proxy(proxy, client, stub):
+    proxy.config['IMAGE_PROXY_KEY'] = None
+    with proxy.test_request_context():
+        assert thumbnail_url(source(stub)) == source(stub)
+    assert client.get('/images/tile/{}?url={}'.format('0' * 32, source(stub))).status_code == 404
+    assert stub.hits == []
+
+
+def test_private_addresses_are_refused(proxy, client, stub):
+    proxy.config['IMAGE_ALLOW_PRIVATE'] = False
+    with proxy.test_request_context():
+        with pytest.raises(FetchError):
+            fetch(source(stub))
+        url = thumbnail_url(source(stub))
+    response = client.get(url)
+    assert response.status_code == 302
+    assert response.headers['Location'] == source(stub)
+    assert stub.hits == []
+
+
+def test_connects_to_the_checked_address(proxy, stub, lookups):
+    with proxy.test_request_context():
+        content = fetch(source(stub, '/moved', 'images.test'))
+    assert content == StubHandler.body
+    # the name is looked up once per hop, then only the checked address is
+    # used, and the request still names the host
+    assert [host for host in lookups if host != '127.0.0.1'] == ['images.test'] * 2
+    assert [host for _, host in stub.hits] == ['images.test:{}'.format(stub.server_port)] * 2
+
+
+def test_redirects_to_other_schemes_are_refused(proxy, stub):
+    with proxy.test_request_context():
+        # refused before anything connects to the ftp server
+        with pytest.raises(FetchError, match='redirect to ftp://10.0.0.1/a.jpg refused'):
+            fetch(source(stub, '/to-ftp'))
+        with pytest.raises(FetchError, match='unknown url type'):
+            fetch('ftp://127.0.0.1/a.jpg')
+    assert [path for path, _ in stub.hits] == ['/to-ftp']
+
+
+def test_redirects_to_private_addresses_are_refused(proxy, stub, monkeypatch):
+    proxy.config['IMAGE_ALLOW_PRIVATE'] = False
+    check_host = images.check_host
+
+    def public_stub(host, port):
+        # images.test stands in for a public host serving the redirect
+        if host == 'images.test':
+            return '127.0.0.1', port
+        return check_host(host, port)
+    monkeypatch.setattr(images, 'check_host', public_stub)
+    with proxy.test_request_context():
+        assert fetch(source(stub, host='images.test')) == StubHandler.body
+        with pytest.raises(FetchError, match='10.0.0.1'):
+            fetch(source(stub, '/to-private', 'images.test'))
+    assert [path for path, _ in stub.hits] == ['/a.jpg', '/to-private']
+
+
+def test_each_source_is_fetched_once(proxy, client, stub):
+    with proxy.test_request_context():
+        url = thumbnail_url(source(stub))
+    first = client.get(url, headers={'Accept': 'image/webp'})
+    second = client.get(url, headers={'Accept': 'image/webp'})
+    assert first.status_code == second.status_code == 200
+    assert second.data == first.data
+    assert len(stub.hits) == 1
+    if images.Image is not None:
+        assert first.headers['Content-Type'] == 'image/webp'
+        assert client.get(url, headers={'Accept': 'image/jpeg'}).headers['Content-Type'] == 'image/jpeg'
+        assert len(stub.hits) == 1
+
+
+@pytest.mark.skipif(images.Image is None, reason='needs Pillow')
+@pytest.mark.parametrize('accept, image_format', [('image/webp', 'WEBP'), ('image/jpeg', 'JPEG')])
+def test_thumbnails_are_cut_to_the_box(proxy, client, stub, accept, image_format):
+    proxy.config['IMAGE_SIZES'] = {'tile': (120, 80)}
+    with proxy.test_request_context():
+        url = thumbnail_url(source(stub))
+    response = client.get(url, headers={'Accept': accept})
+    assert response.headers['Content-Type'] == accept
+    with images.Image.open(io.BytesIO(response.data)) as thumbnail:
+        assert (thumbnail.format, thumbnail.size) == (image_format, (120, 80))
@@ -0,0 +1,84 @@
+import io
+import json
+import pytest
+from models import Venue, Show
+from importer import import_rows
+from cache import cache
+
+TOKEN = 'import-token'
+
+
+def ndjson(*rows):
+    return io.StringIO(''.join(
+        (row if isinstance(row, str) else json.dumps(row)) + '\n' for row in rows))
+
+
+def venue(name, **fields):
+    row = {'name': name, 'city': 'San Francisco', 'state': 'CA',
+           'address': '1015 Folsom Street', 'genres': ['Jazz'],
+           'facebook_link': 'https://www.facebook.com/TheMusicalHop'}
+    row.update(fields)
+    return row
+
+
+@pytest.fixture
+def rejected():
+    rejected = {}
+
+    def on_error(line_number, errors):
+        rejected[line_number] = errors
+    on_error.lines = rejected
+    return on_error
+
+
+def test_non_integer_ids_are_rejected(make_venue, make_artist, rejected):
+    venue_id, artist_id = make_venue().id, make_artist().id
+    rows = ndjson({'venue_id': 'abc', 'artist_id': artist_id, 'start_time': '2030-01-01 20:00:00'},
+                  {'venue_id': venue_id, 'artist_id': artist_id, 'start_time': '2030-01-01 20:00:00'})
+    summary = import_rows('shows', rows, 'ndjson', on_error=rejected)
+    assert summary['imported'] == 1
+    assert list(rejected.lines[1]) == ['venue_id']
+    assert import_rows('venues', ndjson(venue('Bad id', id='x')), 'ndjson', on_error=rejected)['failed'] == 1
+    assert Show.query.count() == 1
+
+
+def test_malformed_ndjson_lines_are_rejected(db, rejected):
+    rows = ndjson(venue('The Musical Hop'), '{"name": ', '[1, 2]', venue('Park Square'))
+    summary = import_rows('venues', rows, 'ndjson', on_error=rejected)
+    assert summary == {'imported': 2, 'failed': 2, 'lines': 4}
+    assert sorted(rejected.lines) == [2, 3]
+
+
+def test_duplicate_ids_only_reject_their_rows(make_venue, rejected):
+    existing = make_venue()
+    rows = ndjson(venue('First', id=existing.id + 1), venue('Duplicate', id=existing.id),
+                  venue('Last', id=existing.id + 2))
+    summary = import_rows('venues', rows, 'ndjson', chunk_size=10, on_error=rejected)
+    assert summary['imported'] == 2
+    assert list(rejected.lines) == [2]
+    assert sorted(row.name for row in Venue.query) == ['First', 'Last', 'The Musical Hop']
+
+
+def test_import_api_needs_the_admin_token(app, client):
+    body = json.dumps(venue('The Musical Hop'))
+    assert client.post('/api/v1/import/venues?format=ndjson', data=body).status_code == 404
+    app.config['ADMIN_TOKEN'] = TOKEN
+    assert client.post('/api/v1/import/venues?format=ndjson', data=body,
+                       headers={'X-Admin-Token': 'wrong'}).status_code == 403
+    response = client.post('/api/v1/import/venues?format=ndjson', data=body,
+                           headers={'X-Admin-Token': TOKEN})
+    assert response.get_json()['imported'] == 1
+
+
+def test_import_drops_the_listing_it_changed(app, client, make_venue, make_artist):
+    app.config['CACHE_ENABLED'] = True
+    cache.clear()
+    make_venue(name='The Musical Hop')
+    make_artist()
+    client.get('/venues')
+    client.get('/artists')
+    import_rows('venues', ndjson(venue('Park Square Live Music')), 'ndjson')
+    assert cache.get('venues:None:None') is None
+    assert cache.get('artists:None:None') is not None
+    assert b'Park Square Live Music' in client.get('/venues').data
+    cache.clear()
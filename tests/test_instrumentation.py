@@ -0,0 +1,32 @@
+import re
+import pytest
+from sqlalchemy.exc import OperationalError
+from instrumentation import endpoints
+
+
+def test_server_timing_counts_the_queries(client, make_venue):
+    venue_id = make_venue().id
+    response = client.get('/api/v1/venues/{}'.format(venue_id))
+    timing = response.headers['Server-Timing']
+    queries = int(re.search(r'db;dur=[\d.]+;desc="(\d+) queries"', timing).group(1))
+    assert queries >= 1
+    assert re.search(r'tpl;dur=[\d.]+, total;dur=[\d.]+$', timing)
+
+
+def test_metrics_report_the_endpoints(client, make_venue):
+    client.get('/api/v1/venues/{}'.format(make_venue().id))
+    requests = endpoints['api.venue'].requests
+    client.get('/api/v1/venues/1000')
+    body = client.get('/_metrics').get_data(as_text=True)
+    assert 'fyyur_requests_total{{endpoint="api.venue"}} {}'.format(requests + 1) in body
+    assert '# TYPE fyyur_db_seconds_total counter' in body
+    assert 'fyyur_db_slowest_statement_seconds{endpoint="api.venue",statement="SELECT' in body
+    assert 'fyyur_jobs_lag_seconds' in body
+
+
+def test_failed_statements_leave_nothing_on_the_connection(db):
+    with db.engine.connect() as connection:
+        with pytest.raises(OperationalError):
+            connection.execute('SELECT * FROM no_such_table')
+        assert connection.execute('SELECT 1').scalar() == 1
+        assert 'query_started' not in connection.info
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+import pytest
+from models import Job
+from jobs import Scheduler, claim, enqueue, job, work_once
+
+runs = []
+
+
+@job
+def record(value):
+    runs.append(value)
+
+
+@job
+def explode(value):
+    runs.append(value)
+    raise RuntimeError('boom')
+
+
+@pytest.fixture
+def queue(app, db):
+    # a real queue in the test database instead of running jobs inline
+    app.config.update(JOBS_EAGER=False, JOB_MAX_ATTEMPTS=2)
+    del runs[:]
+    yield db
+    del runs[:]
+
+
+def test_eager_jobs_run_inline_and_failures_are_logged(app, db):
+    del runs[:]
+    assert enqueue(record, 1)
+    enqueue(explode, 2)
+    assert runs == [1, 2]
+    assert Job.query.count() == 0
+
+
+def test_unregistered_functions_are_refused(queue):
+    with pytest.raises(ValueError):
+        enqueue(len, [])
+
+
+def test_sqlite_claim_takes_each_job_once(queue):
+    enqueue(record, 'a')
+    enqueue(record, 'b', delay=3600)
+    job_id, name, arguments, attempts, max_attempts = claim()
+    assert (name, arguments, attempts, max_attempts) == ('record', '["a"]', 1, 2)
+    # the other one is not due yet, and this one is leased
+    assert claim() is None
+    assert Job.query.get(job_id).status == 'running'
+
+
+def test_work_once_runs_retries_and_fails(queue):
+    enqueue(record, 'a')
+    assert work_once()
+    assert runs == ['a']
+    assert Job.query.one().status == 'done'
+    assert not work_once()
+
+    enqueue(explode, 'b')
+    assert work_once()
+    failed = Job.query.filter_by(name='explode').one()
+    assert (failed.status, failed.attempts) == ('queued', 1)
+    assert failed.run_at > datetime.now()
+    failed.run_at = datetime.now()
+    queue.session.commit()
+    assert work_once()
+    failed = Job.query.filter_by(name='explode').one()
+    assert (failed.status, failed.last_error) == ('failed', 'RuntimeError: boom')
+
+
+def test_expired_leases_are_claimed_again_until_the_last_attempt(queue):
+    enqueue(record, 'a')
+    lease = timedelta(seconds=queue.get_app().config.get('JOB_LEASE_SECONDS', 300) + 1)
+    assert claim()[3] == 1
+    assert claim(datetime.now() + lease)[3] == 2
+    # the worker of the last attempt died too: failed, not run a third time
+    assert claim(datetime.now() + 2 * lease) is None
+    stuck = Job.query.one()
+    assert (stuck.status, stuck.attempts, stuck.locked_until) == ('failed', 2, None)
+
+
+def test_scheduler_enqueues_once_per_period(queue):
+    scheduler = Scheduler({'prune_jobs': 60})
+    scheduler.tick(now=120)
+    scheduler.tick(now=150)
+    # another scheduler in the same period is refused by the unique key
+    Scheduler({'prune_jobs': 60}).tick(now=130)
+    scheduler.tick(now=180)
+    assert sorted(row.unique_key for row in Job.query) == ['prune_jobs:2', 'prune_jobs:3']
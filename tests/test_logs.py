@@ -0,0 +1,18 @@
+import logging
+from logging.handlers import RotatingFileHandler, WatchedFileHandler
+from logs import log_handlers
+
+
+def test_logs_go_to_stderr_by_default():
+    handlers = log_handlers({'LOG_FILE': None})
+    assert [type(handler) for handler in handlers] == [logging.StreamHandler]
+
+
+def test_log_file_is_reopened_rather_than_rotated(tmp_path):
+    path = tmp_path / 'logs' / 'fyyur.log'
+    handlers = log_handlers({'LOG_FILE': str(path), 'LOG_STDERR': True})
+    assert [type(handler) for handler in handlers] == [WatchedFileHandler, logging.StreamHandler]
+    # the file itself is only opened for the first record
+    assert path.parent.is_dir() and not path.exists()
+    handlers = log_handlers({'LOG_FILE': str(path), 'LOG_MAX_BYTES': 1024})
+    assert type(handlers[0]) is RotatingFileHandler
@@ -0,0 +1,59 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+from models import Venue
+from pagination import InvalidCursor, decode_cursor, encode_cursor
+from queries import VENUE_KEY, artist_list, venue_areas
+
+
+def names(areas):
+    return [venue['name'] for area in areas for venue in area['venues']]
+
+
+def test_cursor_round_trip():
+    token = encode_cursor(['CA', 'San Francisco', 'The Musical Hop', 1])
+    assert decode_cursor(token, VENUE_KEY) == ['CA', 'San Francisco', 'The Musical Hop', 1]
+    with pytest.raises(InvalidCursor):
+        decode_cursor('not a cursor', VENUE_KEY)
+
+
+def test_venue_pages_forward_and_back(app, make_venue):
+    app.config['LISTING_PAGE_SIZE'] = 2
+    for state, city in [('CA', 'San Francisco'), ('NY', 'New York'), ('CA', 'Oakland')]:
+        for i in range(2):
+            make_venue(name='Venue {}'.format(i), city=city, state=state)
+    expected = ['Venue 0', 'Venue 1'] * 3
+
+    seen, pages, after = [], [], None
+    while True:
+        areas, next_cursor, prev_cursor = venue_areas(after=after)
+        pages.append((after, prev_cursor))
+        seen += names(areas)
+        if next_cursor is None:
+            break
+        after = next_cursor
+    assert seen == expected
+    assert len(pages) == 3
+
+    # back from the last page
+    areas, _, _ = venue_areas(before=pages[-1][1])
+    assert [area['city'] for area in areas] == ['San Francisco']
+
+
+def test_artist_pages_do_not_skip_rows(app, make_artist):
+    app.config['LISTING_PAGE_SIZE'] = 3
+    for i in range(7):
+        make_artist(name='Artist {}'.format(i % 3))
+    seen, after = [], None
+    while True:
+        rows, after, _ = artist_list(after=after)
+        seen += [row['id'] for row in rows]
+        if after is None:
+            break
+    assert sorted(seen) == list(range(1, 8))
+
+
+def test_sort_keys_are_not_null(db):
+    db.session.add(Venue(name='No Area'))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import NullPool
+from pool import postgres_options
+
+
+class PostgresConnection(object):
+    # records what a transaction would send to PostgreSQL
+    dialect = SimpleNamespace(name='postgresql')
+
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement):
+        self.statements.append(statement)
+
+
+def test_pool_options_carry_the_statement_timeout():
+    options = postgres_options({'DB_POOL_SIZE': 3, 'DB_STATEMENT_TIMEOUT': 5000})
+    assert (options['pool_size'], options['pool_pre_ping']) == (3, True)
+    assert options['connect_args'] == {'options': '-c statement_timeout=5000'}
+
+
+def test_pgbouncer_leaves_pooling_and_startup_parameters_to_it():
+    options = postgres_options({'DB_PGBOUNCER': True, 'DB_STATEMENT_TIMEOUT': 5000})
+    assert options['poolclass'] is NullPool
+    assert 'connect_args' not in options
+    assert 'pool_size' not in options
+
+
+def test_pgbouncer_transactions_set_a_local_timeout(app, db):
+    app.config.update(DB_PGBOUNCER=True, DB_STATEMENT_TIMEOUT=5000)
+    session = db.session()
+    connection = PostgresConnection()
+    session.dispatch.after_begin(session, None, connection)
+    assert connection.statements == ['SET LOCAL statement_timeout = 5000']
+
+    app.config['DB_PGBOUNCER'] = False
+    connection = PostgresConnection()
+    session.dispatch.after_begin(session, None, connection)
+    assert connection.statements == []
+
+
+def test_health_reports_the_database_and_the_pool(client):
+    response = client.get('/_health')
+    assert response.status_code == 200
+    assert response.get_json()['database'] == 'ok'
+    assert 'class' in response.get_json()['pool']
+
+
+def test_health_is_503_when_the_database_is_down(client, db, monkeypatch):
+    def execute(*args, **kwargs):
+        raise OperationalError('SELECT 1', {}, Exception('server closed the connection'))
+    monkeypatch.setattr(db.session, 'execute', execute)
+    response = client.get('/_health')
+    assert response.status_code == 503
+    status = response.get_json()
+    assert status['database'] == 'unavailable'
+    assert status['pool']['class'] == type(db.engine.pool).__name__
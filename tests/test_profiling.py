@@ -0,0 +1,50 @@
+import pytest
+from flask import Flask
+from profiling import flame_boxes, init_profiling
+
+TOKEN = 'profile-token'
+
+
+def work():
+    return sum(i * i for i in range(200000))
+
+
+@pytest.fixture
+def profiled(tmp_path):
+    # the profiling hooks are added when the app is created, so they get an
+    # app of their own
+    app = Flask(__name__)
+    app.config.update(TESTING=True, PROFILING_ENABLED=True, PROFILING_TOKEN=TOKEN,
+                      PROFILING_DIR=str(tmp_path), PROFILING_SAMPLE_INTERVAL=0.001)
+
+    @app.route('/work')
+    def busy():
+        return str(work())
+    init_profiling(app)
+    return app.test_client()
+
+
+@pytest.mark.parametrize('mode', ['cprofile', 'sampling'])
+def test_profiles_need_the_token(profiled, mode):
+    assert 'X-Profile' not in profiled.get('/work?__profile=' + mode).headers
+    url = profiled.get('/work?__profile=' + mode,
+                       headers={'X-Profile-Token': TOKEN}).headers['X-Profile']
+    assert profiled.get('/_profiles').status_code == 404
+    assert profiled.get(url + '?format=collapsed').status_code == 404
+    assert profiled.get(url + '?format=collapsed',
+                        headers={'X-Profile-Token': 'wrong'}).status_code == 404
+
+    response = profiled.get(url + '?format=collapsed&__token=' + TOKEN)
+    assert response.mimetype == 'text/plain'
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines
+    for line in lines:
+        stack, count = line.rsplit(' ', 1)
+        assert stack.startswith('busy;') and int(count) > 0
+    if mode == 'cprofile':
+        assert any('work (test_profiling.py:' in line for line in lines)
+
+
+def test_flame_boxes_split_the_total():
+    boxes = flame_boxes({'a;b': 3, 'a;c': 1})
+    assert boxes == [(0, 0.0, 1.0, 'a'), (1, 0.0, 0.75, 'b'), (1, 0.75, 0.25, 'c')]
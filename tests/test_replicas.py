@@ -0,0 +1,68 @@
+import time
+import pytest
+from sqlalchemy import event
+import replicas
+from replicas import choose_replica, replica_lag
+from conftest import DATABASE
+
+
+@pytest.fixture
+def stand_ins(app, db):
+    # two "replicas" that are the test database itself, as on a laptop
+    uris = ['sqlite:///' + DATABASE] * 2
+    app.config.update(SQLALCHEMY_REPLICA_URIS=uris, REPLICA_SELECTION='round_robin',
+                      SQLALCHEMY_BINDS={'replica_0': uris[0], 'replica_1': uris[1]})
+    replicas.lags.clear()
+    yield ['replica_0', 'replica_1']
+    replicas.lags.clear()
+
+
+def lagging(name, lag):
+    replicas.lags[name] = (time.monotonic(), lag)
+
+
+def test_sqlite_stand_ins_are_never_behind(app, stand_ins):
+    assert replica_lag(app, 'replica_0') == 0.0
+    assert replicas.lags['replica_0'][1] == 0.0
+
+
+def test_round_robin_takes_turns(app, stand_ins):
+    assert set(choose_replica(app) for _ in range(4)) == set(stand_ins)
+
+
+@pytest.mark.parametrize('selection', ['round_robin', 'least_lag'])
+def test_lagging_and_unreachable_replicas_are_skipped(app, stand_ins, selection):
+    app.config['REPLICA_SELECTION'] = selection
+    lagging('replica_0', None)
+    assert set(choose_replica(app) for _ in range(4)) == {'replica_1'}
+    lagging('replica_1', app.config['REPLICA_MAX_LAG'] + 1)
+    assert choose_replica(app) is None
+
+
+def test_least_lag_picks_the_closest(app, stand_ins):
+    app.config['REPLICA_SELECTION'] = 'least_lag'
+    lagging('replica_0', 3)
+    lagging('replica_1', 1)
+    assert choose_replica(app) == 'replica_1'
+
+
+def test_reads_go_to_a_replica_until_the_client_writes(app, db, client, stand_ins, make_venue):
+    app.config['REPLICA_SELECTION'] = 'least_lag'
+    lagging('replica_0', 0)
+    lagging('replica_1', None)
+    venue_id = make_venue().id
+    statements = []
+
+    def before_cursor_execute(connection, cursor, statement, *args):
+        statements.append(statement)
+    replica = db.get_engine(app, bind='replica_0')
+    event.listen(replica, 'before_cursor_execute', before_cursor_execute)
+    try:
+        assert client.get('/api/v1/venues/{}'.format(venue_id)).status_code == 200
+        assert statements
+        del statements[:]
+        client.post('/venues/{}/edit'.format(venue_id), data={'name': 'The Musical Hop'})
+        assert client.get('/api/v1/venues/{}'.format(venue_id)).status_code == 200
+        assert statements == []
+    finally:
+        event.remove(replica, 'before_cursor_execute', before_cursor_execute)
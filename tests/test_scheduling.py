@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+from scheduling import IntervalIndex, booking_conflicts, find_conflict
+
+START = datetime(2030, 1, 1, 20)
+
+
+def hours(n):
+    return START + timedelta(hours=n)
+
+
+def test_interval_index_finds_the_overlapping_booking():
+    index = IntervalIndex()
+    # added out of order, as the seeding does
+    for start in (6, 0, 3, 9):
+        index.add('venue', hours(start), hours(start + 2), start)
+    assert index.find('venue', hours(4), hours(5))[2] == 3
+    assert index.find('venue', hours(-1), hours(0.5))[2] == 0
+    # touching intervals do not overlap
+    assert index.find('venue', hours(2), hours(3)) is None
+    assert index.find('venue', hours(11), hours(12)) is None
+    assert index.find('artist', hours(0), hours(1)) is None
+    assert [interval[2] for interval in index.intervals['venue']] == [0, 3, 6, 9]
+
+
+def test_stored_shows_conflict(make_venue, make_artist, make_show):
+    venue, artist = make_venue(), make_artist()
+    show = make_show(venue, artist, start_time=hours(0))
+    conflict = find_conflict(venue.id, make_artist(name='Other').id, hours(1), hours(4))
+    assert (conflict.field, conflict.show_id) == ('venue_id', show.id)
+    assert find_conflict(venue.id, artist.id, show.end_time, show.end_time + timedelta(hours=1)) is None
+
+
+def test_import_rows_conflict_with_each_other(make_venue, make_artist):
+    venue, artist = make_venue(), make_artist()
+    rows = [(line, {'venue_id': venue.id, 'artist_id': artist.id,
+                    'start_time': hours(start), 'end_time': hours(start + 2)})
+            for line, start in ((2, 0), (3, 1), (4, 2))]
+    assert [line for line, _ in booking_conflicts(rows)] == [3]